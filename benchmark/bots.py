@@ -0,0 +1,122 @@
+import selectors
+import socket
+import threading
+import time
+from benchmark.common import connect_raw_client
+
+# Client "bot" senza console per i test di carico: un gruppo di bot condivide un solo selettore,
+# così può girare in un thread del processo di benchmark oppure in un processo separato.
+# I mittenti inviano messaggi di dimensione fissa a una frequenza costante; ogni messaggio inizia con
+# l'istante di invio, da cui chi lo riceve ricava la latenza end-to-end (i processi sono sulla stessa macchina).
+
+# Messaggio di size caratteri che porta con sé l'istante di invio
+def timed_message(size):
+    stamp = f"{time.time():.6f} "
+    return stamp + "x" * max(0, size - len(stamp))
+
+def message_latency(message):
+    return time.time() - float(message.split(" ", 1)[0])
+
+class BotSwarm:
+    def __init__(self, host, port, names, senders=0, rate=10.0, size=100, duration=5.0):
+        self.host = host
+        self.port = port
+        self.names = names
+        self.senders_count = senders    # i primi bot del gruppo sono mittenti
+        self.rate = rate                # messaggi al secondo per mittente
+        self.size = size                # caratteri per messaggio
+        self.duration = duration        # secondi di invio
+        self.connections = []
+
+    # Esegue il join di tutti i bot uno dopo l'altro; restituisce la durata di ciascun join in secondi
+    def connect(self):
+        join_times = []
+        for name in self.names:
+            start = time.perf_counter()
+            self.connections.append(connect_raw_client(self.host, self.port, name))
+            join_times.append(time.perf_counter() - start)
+        return join_times
+
+    # Invia per duration secondi e riceve finché non arriva più nulla per idle secondi.
+    # Restituisce i messaggi inviati e ricevuti, le latenze (secondi) e l'istante dell'ultima consegna
+    def run(self, idle=1.0, timeout=60.0):
+        selector = selectors.DefaultSelector()
+        for connection in self.connections:
+            selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+        senders = self.connections[:self.senders_count]
+        interval = 1.0 / self.rate if self.rate else None
+        start = time.monotonic()
+        send_until = start + self.duration
+        next_send = [start + interval * i / max(1, len(senders)) for i in range(len(senders))] if interval else []
+        sent = received = 0
+        latencies = []
+        last_delivery = time.time()
+        last_activity = time.monotonic()
+
+        while True:
+            now = time.monotonic()
+            sending = interval is not None and now < send_until
+            if not sending and now - last_activity >= idle or now - start >= timeout:
+                break
+
+            # messaggi dovuti dai mittenti, senza recuperare gli invii persi se il bot è in ritardo
+            if sending:
+                for i, connection in enumerate(senders):
+                    if next_send[i] <= now:
+                        connection.send({'type': 'chat_message', 'message': timed_message(self.size)})
+                        sent += 1
+                        next_send[i] = max(next_send[i] + interval, now)
+                wait = max(0.0, min(next_send) - time.monotonic())
+            else:
+                wait = idle
+
+            for key, _ in selector.select(timeout=wait):
+                try:
+                    messages = key.data.receive()
+                except OSError:
+                    messages = None
+                if messages is None:
+                    selector.unregister(key.fileobj)
+                    continue
+                # solo i messaggi di chat contano come attività: gli heartbeat del server arrivano comunque
+                for message_data in messages:
+                    if message_data['type'] == 'chat_message':
+                        received += 1
+                        latencies.append(message_latency(message_data['message']))
+                        last_delivery = time.time()
+                        last_activity = time.monotonic()
+
+        selector.close()
+        return {'sent': sent, 'received': received, 'latencies': latencies, 'last_delivery': last_delivery}
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+# Corpo di un processo (o thread) di bot: join, barriera di partenza comune, invio e ricezione.
+# I risultati vengono consegnati sulla coda results
+def run_swarm(host, port, names, senders, rate, size, duration, barrier, results):
+    swarm = BotSwarm(host, port, names, senders, rate, size, duration)
+    try:
+        join_times = swarm.connect()
+    except Exception as e:
+        results.put({'error': f"{type(e).__name__}: {e}"})
+        barrier.abort()
+        return
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError: # un altro gruppo non è riuscito a collegarsi
+        results.put({'error': "partenza annullata"})
+        swarm.close()
+        return
+    start = time.time()
+    outcome = swarm.run()
+    outcome.update({'join_times': join_times, 'start': start, 'bots': len(names), 'senders': senders})
+    results.put(outcome)
+    barrier.wait() # i bot restano collegati finché tutti i gruppi hanno finito di ricevere
+    swarm.close()
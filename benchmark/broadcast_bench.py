@@ -0,0 +1,108 @@
+import json
+import socket
+import time
+import chat.chat_node
+from chat.chat_node import ChatNode
+from chat.connection import Connection
+from chat.outbound import OutboundQueue
+from benchmark.common import quiet
+
+# Microbenchmark del fan-out di un broadcast: confronta il percorso originale (json.dumps una volta,
+# encode e send per ogni destinatario) con quello attuale (serializzazione unica in buffer condivisi,
+# accodamento senza copie e scrittura vettoriale dei frame accodati per lo stesso socket).
+# Per 5, 100 e 1000 destinatari riporta i byte copiati in user space e le syscall per broadcast.
+# Eseguire dalla root del progetto con: python -m benchmark.broadcast_bench
+
+RECIPIENTS = (5, 100, 1000)
+BURST = 16          # broadcast accodati prima che i socket vengano svuotati (come sotto carico)
+ROUNDS = 20
+MESSAGE = {'type': 'chat_message', 'username': 'alice', 'message': 'ciao a tutti ' * 8, 'timestamp': '12:00:00'}
+
+# Svuota il lato ricevente dei socket per non riempire i buffer del kernel
+def drain_peers(peers):
+    for peer in peers:
+        try:
+            while peer.recv(1 << 20):
+                pass
+        except BlockingIOError:
+            pass
+
+def make_pairs(count):
+    pairs = [socket.socketpair() for _ in range(count)]
+    for local, peer in pairs:
+        local.setblocking(False)
+        peer.setblocking(False)
+    return [local for local, _ in pairs], [peer for _, peer in pairs]
+
+# Percorso originale di broadcast_to_clients, riprodotto per confronto
+def legacy(count):
+    sockets, peers = make_pairs(count)
+    copied = syscalls = 0
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for _ in range(BURST):
+            message = json.dumps(MESSAGE)
+            copied += len(message)
+            for sock in sockets:
+                data = message.encode('utf-8')
+                copied += len(data)
+                sock.send(data)
+                syscalls += 1
+        drain_peers(peers)
+    elapsed = time.perf_counter() - start
+    for sock in sockets + peers:
+        sock.close()
+    broadcasts = ROUNDS * BURST
+    return copied / broadcasts, syscalls / broadcasts, elapsed / broadcasts * 1e6
+
+# Percorso attuale: broadcast_to_clients di ChatNode con code in uscita svuotate come fa l'event loop
+def current(count):
+    sockets, peers = make_pairs(count)
+    with quiet():
+        node = ChatNode("bench-server")
+    node.is_server = True
+    node.replay.start_epoch() # numerazione degli eventi come in start_as_server
+    queues = []
+    for i, sock in enumerate(sockets):
+        connection = Connection(sock)
+        connection.outbound = OutboundQueue(high_watermark=1 << 30, low_watermark=1 << 29)
+        queues.append(connection.outbound)
+        node.add_client(sock, {'username': f"bot{i}", 'address': ('localhost', i),
+                               'connection_time': i, 'connection': connection, 'rooms': set()})
+
+    # conta i byte prodotti dalla serializzazione (le uniche copie del payload in user space)
+    copied = [0]
+    original_encode = chat.chat_node.encode_message
+    def counting_encode(message_data):
+        payload = original_encode(message_data)
+        copied[0] += len(payload) + 4 # payload + header del frame
+        return payload
+    chat.chat_node.encode_message = counting_encode
+
+    start = time.perf_counter()
+    try:
+        for _ in range(ROUNDS):
+            for _ in range(BURST):
+                node.broadcast_to_clients(MESSAGE)
+            for sock, outbound in zip(sockets, queues):
+                outbound.write_available(sock)
+            drain_peers(peers)
+    finally:
+        chat.chat_node.encode_message = original_encode
+    elapsed = time.perf_counter() - start
+
+    for sock in sockets + peers:
+        sock.close()
+    broadcasts = ROUNDS * BURST
+    syscalls = sum(outbound.syscalls for outbound in queues)
+    return copied[0] / broadcasts, syscalls / broadcasts, elapsed / broadcasts * 1e6
+
+def main():
+    print(f"{'destinatari':>11} {'percorso':>9} {'byte copiati':>13} {'syscall':>9} {'µs/broadcast':>13}")
+    for count in RECIPIENTS:
+        for name, run in (("originale", legacy), ("attuale", current)):
+            copied, syscalls, micros = run(count)
+            print(f"{count:>11} {name:>9} {copied:>13,.0f} {syscalls:>9.1f} {micros:>13.1f}")
+
+if __name__ == "__main__":
+    main()
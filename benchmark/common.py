@@ -0,0 +1,45 @@
+import contextlib
+import io
+import socket
+import time
+from chat.connection import Connection
+
+# Funzioni di supporto condivise dai benchmark.
+
+# Apre una connessione grezza verso il server ed esegue l'handshake di join come farebbe un client.
+# Restituisce la Connection già pronta (i messaggi arrivati dopo il join restano in coda).
+def connect_raw_client(host, port, username, **join_fields):
+    sock = socket.create_connection((host, port), timeout=10.0)
+    connection = Connection(sock)
+    handshake = {'type': 'join_request', 'username': username, 'connection_time': time.time()}
+    handshake.update(join_fields)
+    connection.send(handshake)
+    response = connection.receive_one()
+    if response['type'] != 'join_accepted':
+        sock.close()
+        raise ConnectionError(f"Join rifiutato per {username}: {response.get('message')}")
+    return connection
+
+# Svuota tutti i messaggi già arrivati su una connessione senza bloccare
+def drain(connection):
+    connection.sock.setblocking(False)
+    try:
+        while True:
+            if connection.receive() is None:
+                break
+    except (BlockingIOError, InterruptedError):
+        pass
+    finally:
+        connection.sock.setblocking(True)
+
+# Sopprime l'output a console dei nodi durante le misure
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+# Restituisce il percentile p (0-100) di una lista di valori
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
@@ -0,0 +1,84 @@
+import random
+import time
+import zlib
+from chat.compression import StreamCompressor
+from chat.compression import StreamDecompressor
+from chat.wire import BinaryCodec
+from chat.wire import InternTable
+from chat.wire import JsonCodec
+
+# Benchmark della compressione a flusso per connessione: per due tipi di traffico
+# (chat tipica server->client e ricambio di membership con peer list completa) confronta
+# i byte sul filo senza compressione, con zlib per singolo messaggio e con il contesto zlib condiviso
+# dall'intera connessione, riportando il costo CPU di compressione e decompressione per messaggio.
+# Eseguire dalla root del progetto con: python -m benchmark.compression_bench
+
+MESSAGES = 5000
+PEERS = 20
+WORDS = ("ciao", "come", "va", "bene", "grazie", "stasera", "partita", "andiamo", "ok", "sì",
+         "domani", "riunione", "alle", "otto", "chi", "viene", "pizza", "perfetto", "a", "dopo")
+USERS = [f"utente{i}" for i in range(PEERS)]
+START_TIME = 1_700_000_000.0   # orario fisso: la lunghezza dei timestamp serializzati non varia tra le esecuzioni
+
+def make_intern():
+    intern = InternTable()
+    for name in ["server"] + USERS:
+        intern.add(name)
+    return intern
+
+def chat_traffic(rng):
+    now = START_TIME
+    for i in range(MESSAGES):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+        yield {'type': 'chat_message', 'username': rng.choice(USERS), 'message': text, 'timestamp': now + i}
+
+def peer_list_churn(rng):
+    now = START_TIME
+    peers = [{'username': name, 'uid': uid, 'address': ['127.0.0.1', 40000 + uid], 'connection_time': now}
+             for uid, name in enumerate(USERS, start=1)]
+    for i in range(MESSAGES):
+        peer = rng.choice(peers)
+        event = 'user_joined' if i % 2 == 0 else 'user_left'
+        yield {'type': event, 'username': peer['username'], 'message': f"{peer['username']} è entrato nella chat",
+               'timestamp': now + i, 'peer_list': peers}
+
+def measure(codec, traffic, mode):
+    payloads = [codec.encode(message_data) for message_data in traffic]
+    raw = sum(len(payload) for payload in payloads)
+
+    start = time.perf_counter()
+    if mode == "nessuna":
+        wire = payloads
+    elif mode == "per messaggio":
+        wire = [zlib.compress(payload) for payload in payloads]
+    else:
+        compressor = StreamCompressor()
+        wire = [compressor.compress(payload) for payload in payloads]
+    compress_us = (time.perf_counter() - start) / len(payloads) * 1e6
+
+    start = time.perf_counter()
+    if mode == "per messaggio":
+        for data in wire:
+            zlib.decompress(data)
+    elif mode == "flusso":
+        decompressor = StreamDecompressor()
+        for data in wire:
+            decompressor.decompress(data)
+    decompress_us = (time.perf_counter() - start) / len(payloads) * 1e6
+
+    sent = sum(len(data) + 4 for data in wire) # payload + header del frame
+    return raw / len(payloads), sent / len(payloads), compress_us, decompress_us
+
+def main():
+    traffics = (("chat", chat_traffic), ("peer list", peer_list_churn))
+    print(f"{'traffico':>10} {'codec':>6} {'compressione':>14} {'byte/msg':>9} {'sul filo':>9} {'risparmio':>10} {'comp µs':>8} {'decomp µs':>10}")
+    for label, traffic in traffics:
+        for codec in (JsonCodec(), BinaryCodec(make_intern())):
+            for mode in ("nessuna", "per messaggio", "flusso"):
+                raw, sent, compress_us, decompress_us = measure(codec, traffic(random.Random(1)), mode)
+                saved = 1 - sent / (raw + 4)
+                print(f"{label:>10} {codec.name:>6} {mode:>14} {raw:>9.0f} {sent:>9.0f} {saved:>10.0%} "
+                      f"{compress_us:>8.2f} {decompress_us:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import fcntl
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from chat.chat_node import ChatNode
+from benchmark.federation_bench import load_process
+
+# Benchmark della console lenta: il server (in un sottoprocesso) ha lo standard output rediretto su una pipe
+# piccola (PIPE_SIZE byte) che questo processo svuota lentamente (READ_CHUNK byte ogni READ_INTERVAL secondi),
+# come un terminale remoto lento. Con la console "sync" ogni riga mostrata blocca il thread che inoltra i messaggi,
+# con "async" la scrittura avviene in un thread dedicato, con "quiet" le righe non vengono nemmeno formattate.
+# Misura le consegne al secondo ai CLIENTS client (SENDERS mittenti, carico da LOADS processi) con entrambi i motori.
+# Eseguire dalla root del progetto con: python -m benchmark.console_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 25600
+ENGINES = ("threaded", "selector")
+MODES = ("sync", "async", "quiet")
+CLIENTS = 40
+SENDERS = 4
+LOADS = 2
+MESSAGES = 500 # per mittente, come in federation_bench
+PIPE_SIZE = 4096
+READ_CHUNK = 512
+READ_INTERVAL = 0.02 # circa 25 KB/s
+
+# Server eseguito nel sottoprocesso: l'output va sulla pipe lenta, la segnalazione di avvio su stderr
+def serve(engine, mode, port):
+    node = ChatNode("bench-server", max_connections=CLIENTS + 1, server_engine=engine,
+                    outbound_high_watermark=64 * 1024 * 1024, outbound_low_watermark=32 * 1024 * 1024,
+                    heartbeat_interval=None, metrics=False, console=mode)
+    if not node.start_as_server(HOST, port):
+        sys.exit(1)
+    print("READY", file=sys.stderr, flush=True)
+    sys.stdin.read()
+    node.shutdown()
+
+# Svuota lentamente l'output del server; dopo la misura (fast impostato) lo svuota alla massima velocità
+def slow_reader(fd, fast):
+    while True:
+        data = os.read(fd, READ_CHUNK if not fast.is_set() else 65536)
+        if not data:
+            return
+        if not fast.is_set():
+            time.sleep(READ_INTERVAL)
+
+def run(engine, mode, port):
+    server = subprocess.Popen([sys.executable, "-m", "benchmark.console_bench", "--serve", engine, mode, str(port)],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    fcntl.fcntl(server.stdout.fileno(), fcntl.F_SETPIPE_SZ, PIPE_SIZE)
+    fast = threading.Event()
+    reader = threading.Thread(target=slow_reader, args=(server.stdout.fileno(), fast), daemon=True)
+    reader.start()
+    if server.stderr.readline().strip() != "READY":
+        raise RuntimeError("il server di benchmark non si è avviato")
+
+    barrier = multiprocessing.Barrier(LOADS)
+    results = multiprocessing.Queue()
+    loads = [multiprocessing.Process(target=load_process,
+                                     args=(i, port, CLIENTS // LOADS, SENDERS // LOADS, SENDERS * MESSAGES,
+                                           barrier, results))
+             for i in range(LOADS)]
+    for process in loads:
+        process.start()
+    outcomes = [results.get(timeout=300) for _ in loads]
+    for process in loads:
+        process.join()
+
+    fast.set()
+    server.stdin.close()
+    server.wait(30)
+    reader.join(5)
+
+    start = min(outcome[0] for outcome in outcomes)
+    end = max(outcome[1] for outcome in outcomes)
+    received = sum(outcome[2] for outcome in outcomes)
+    expected = sum(outcome[3] for outcome in outcomes)
+    return received, expected, end - start
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--serve":
+        serve(sys.argv[2], sys.argv[3], int(sys.argv[4]))
+        return
+
+    print(f"{CLIENTS} client, {SENDERS} mittenti x {MESSAGES} messaggi, stdout del server su una pipe da "
+          f"{PIPE_SIZE} byte letta a {READ_CHUNK / READ_INTERVAL / 1024:.0f} KB/s")
+    print(f"{'motore':>9} {'console':>8} {'consegne':>17} {'secondi':>8} {'consegne/s':>11}")
+    port = BASE_PORT
+    for engine in ENGINES:
+        for mode in MODES:
+            received, expected, elapsed = run(engine, mode, port)
+            port += 1
+            print(f"{engine:>9} {mode:>8} {received:>8}/{expected:<8} {elapsed:>8.2f} {received / elapsed:>11.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import selectors
+import sys
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import connect_raw_client
+from benchmark.common import drain
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Benchmark dei motori del server: confronta il motore a thread ("threaded") con l'event loop ("selector").
+# Per ciascun motore collega N client grezzi e misura:
+#   - la CPU consumata dal processo con tutti i client inattivi
+#   - la latenza di fan-out, cioè il tempo perché un messaggio arrivi a tutti gli altri client
+# Eseguire dalla root del progetto con: python -m benchmark.engine_bench [numero_client]
+
+HOST = "localhost"
+BASE_PORT = 23100
+IDLE_SECONDS = 5.0
+FANOUT_ROUNDS = 50
+
+# Attende che il messaggio arrivi a tutti i ricevitori e restituisce il tempo impiegato
+def wait_fanout(selector, receivers, start):
+    remaining = set(receivers)
+    while remaining:
+        for key, _ in selector.select(timeout=5.0):
+            connection = key.data
+            if connection in remaining and connection.receive():
+                remaining.discard(connection)
+    return time.perf_counter() - start
+
+def run(engine, clients_count, port):
+    with quiet():
+        server = ChatNode("bench-server", max_connections=clients_count + 1, server_engine=engine)
+        server.start_as_server(HOST, port)
+        clients = []
+        for i in range(clients_count):
+            clients.append(connect_raw_client(HOST, port, f"bot{i}"))
+            for connection in clients:
+                drain(connection) # evita che le notifiche di join riempiano i buffer dei socket
+        time.sleep(0.5)
+        for connection in clients:
+            drain(connection)
+
+    # CPU consumata dal processo (server compreso) mentre tutti i client sono inattivi
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    time.sleep(IDLE_SECONDS)
+    idle_cpu = (time.process_time() - cpu_start) / (time.perf_counter() - wall_start) * 100
+
+    # latenza di fan-out: un client scrive, si misura quando l'ultimo degli altri riceve il messaggio
+    sender, receivers = clients[0], clients[1:]
+    selector = selectors.DefaultSelector()
+    for connection in receivers:
+        selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+    latencies = []
+    with quiet():
+        for _ in range(FANOUT_ROUNDS):
+            start = time.perf_counter()
+            sender.send({'type': 'chat_message', 'message': 'ping'})
+            latencies.append(wait_fanout(selector, receivers, start))
+        selector.close()
+
+        for connection in clients:
+            connection.close()
+        server.shutdown()
+
+    return idle_cpu, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000
+
+def main():
+    clients_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{clients_count} client collegati")
+    print(f"{'motore':>10} {'CPU idle %':>11} {'fan-out p50 ms':>15} {'fan-out p99 ms':>15}")
+    for i, engine in enumerate(("threaded", "selector")):
+        idle_cpu, p50, p99 = run(engine, clients_count, BASE_PORT + i)
+        print(f"{engine:>10} {idle_cpu:>11.2f} {p50:>15.2f} {p99:>15.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import socket
+import sys
+import time
+from chat.chat_node import ChatNode
+from chat.replay import sequence_epoch
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Benchmark del failover: misura la finestra di interruzione della chat dalla caduta improvvisa del server
+# al primo messaggio consegnato attraverso il nuovo server, con e senza successore designato (hot standby).
+# Un client invia un messaggio ogni SEND_INTERVAL secondi; un altro client registra quando riceve il primo
+# messaggio numerato dal nuovo server (epoca di sequenza successiva a quella del server caduto).
+# Eseguire dalla root del progetto con: python -m benchmark.failover_bench [numero_client]
+
+HOST = "localhost"
+BASE_PORT = 23500
+ROUNDS = 3
+SEND_INTERVAL = 0.01
+TIMEOUT = 30.0
+
+# Caduta del server senza alcun avviso ai client: nessun server_shutdown, connessioni interrotte di colpo.
+# Si usa shutdown perché, a differenza di close, interrompe subito la connessione anche se un altro thread
+# del server è bloccato in lettura sul socket, come avviene alla terminazione del processo
+def crash(server):
+    server.server_running = False
+    server.running = False
+    if server.event_loop:
+        server.event_loop.close()
+    server.server_socket.close()
+    for client_socket in list(server.connected_clients):
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        client_socket.close()
+
+def run(hot_standby, clients_count, port):
+    delivered = {}
+    with quiet():
+        server = ChatNode("server", max_connections=clients_count + 1, hot_standby=hot_standby)
+        server.start_as_server(HOST, port)
+        clients = []
+        for i in range(clients_count):
+            client = ChatNode(f"client{i}", max_connections=clients_count + 1, hot_standby=hot_standby)
+            client.connect_as_client(HOST, port)
+            clients.append(client)
+            time.sleep(0.05) # tempi di connessione distinti: l'ordine di anzianità è quello di creazione
+        time.sleep(0.5)
+
+        # il mittente e il ricevitore sono gli ultimi client, così nessuno dei due viene promosso
+        sender, receiver = clients[-1], clients[-2]
+        old_epoch = sequence_epoch(receiver.replay.last_seq)
+        process = receiver.process_server_message
+
+        def record(message_data):
+            seq = message_data.get('seq')
+            if (message_data['type'] == 'chat_message' and seq and sequence_epoch(seq) > old_epoch
+                    and 'time' not in delivered):
+                delivered['time'] = time.monotonic()
+            return process(message_data)
+        receiver.process_server_message = record
+
+        crashed_at = time.monotonic()
+        crash(server)
+        deadline = crashed_at + TIMEOUT
+        count = 0
+        while 'time' not in delivered and time.monotonic() < deadline:
+            sender.send_message(f"messaggio {count}")
+            count += 1
+            time.sleep(SEND_INTERVAL)
+
+        # prima i client, poi il nodo promosso, così la chiusura non innesca altri failover
+        nodes = sorted(clients, key=lambda node: node.is_server)
+        for node in nodes:
+            node.shutdown()
+        server.shutdown()
+
+    if 'time' not in delivered:
+        return None
+    return delivered['time'] - crashed_at
+
+def main():
+    clients_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    print(f"{clients_count} client collegati, {ROUNDS} cadute del server per configurazione")
+    print(f"{'successore':>12} {'interruzione p50 ms':>20} {'max ms':>10}")
+    port = BASE_PORT
+    for hot_standby in (False, True):
+        outages = []
+        for _ in range(ROUNDS):
+            outage = run(hot_standby, clients_count, port)
+            port += 10 # il failover senza successore può occupare anche le porte successive
+            if outage is not None:
+                outages.append(outage * 1000)
+        label = "sì" if hot_standby else "no"
+        if outages:
+            print(f"{label:>12} {percentile(outages, 50):>20.1f} {max(outages):>10.1f}")
+        else:
+            print(f"{label:>12} {'nessun messaggio consegnato':>20}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import multiprocessing
+import os
+import selectors
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import connect_raw_client
+from benchmark.common import quiet
+
+# Benchmark della federazione: la stessa chat logica (CLIENTS client, SENDERS mittenti) servita da 1, 2 o 4 server,
+# ciascuno in un processo separato e collegato a tutti gli altri. I client sono ripartiti tra i server
+# e ogni server ha il proprio processo di carico, che invia i messaggi dei suoi mittenti e conta quelli ricevuti.
+# Misura le consegne complessive al secondo finché ogni client non ha ricevuto tutti i messaggi degli altri.
+# Con più server il lavoro di fan-out è diviso tra processi (quindi tra core), ma ogni messaggio attraversa anche
+# i link tra server: il guadagno dipende dai core disponibili, riportati nell'intestazione.
+# Il risultato ha senso solo su una macchina con più di un core: con un core solo tutti i server e i processi
+# di carico si contendono la stessa CPU, le consegne al secondo calano aggiungendo server e i numeri
+# non dicono nulla sulla scalabilità della federazione.
+# Eseguire dalla root del progetto con: python -m benchmark.federation_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 24300
+SERVER_COUNTS = (1, 2, 4)
+CLIENTS = 40
+SENDERS = 4
+MESSAGES = 500 # per mittente
+TIMEOUT = 120.0
+
+def server_process(index, port, peers, ready, stop):
+    with quiet():
+        node = ChatNode(f"server{index}", max_connections=CLIENTS + 1, server_engine="selector",
+                        outbound_high_watermark=64 * 1024 * 1024, outbound_low_watermark=32 * 1024 * 1024,
+                        heartbeat_interval=None)
+        node.start_as_server(HOST, port)
+        for peer_port in peers:
+            node.federation.link(HOST, peer_port)
+        while len(node.federation.links) < len(peers) and not stop.is_set():
+            time.sleep(0.01)
+        ready.set()
+        stop.wait()
+        node.shutdown()
+
+def load_process(index, port, clients_count, senders_count, expected_total, barrier, results):
+    clients = [connect_raw_client(HOST, port, f"s{index}-c{i}") for i in range(clients_count)]
+    senders = clients[:senders_count]
+    received = {connection: 0 for connection in clients}
+    expected = {connection: expected_total - (MESSAGES if connection in senders else 0) for connection in clients}
+    selector = selectors.DefaultSelector()
+    for connection in clients:
+        selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+    # attende che tutti i client di tutti i server siano collegati prima di iniziare
+    barrier.wait()
+    start = time.time()
+    pending = {connection for connection in clients if expected[connection] > 0}
+    sent = 0
+    while pending and time.time() - start < TIMEOUT:
+        if sent < MESSAGES:
+            for connection in senders:
+                connection.send({'type': 'chat_message', 'message': f"messaggio {sent}"})
+            sent += 1
+        for key, _ in selector.select(timeout=0 if sent < MESSAGES else 0.5):
+            connection = key.data
+            messages = connection.receive()
+            if messages is None:
+                pending.discard(connection)
+                selector.unregister(connection.sock)
+                continue
+            received[connection] += sum(1 for message_data in messages if message_data['type'] == 'chat_message')
+            if received[connection] >= expected[connection]:
+                pending.discard(connection)
+    end = time.time()
+    # attende che anche gli altri processi abbiano finito prima di disconnettersi
+    results.put((start, end, sum(received.values()), sum(expected.values())))
+    barrier.wait()
+    for connection in clients:
+        connection.close()
+
+def run(servers_count, base_port):
+    ports = [base_port + i for i in range(servers_count)]
+    stop = multiprocessing.Event()
+    readies = [multiprocessing.Event() for _ in ports]
+    servers = [multiprocessing.Process(target=server_process, args=(i, port, ports[:i], readies[i], stop))
+               for i, port in enumerate(ports)]
+    for process in servers:
+        process.start()
+    for ready in readies:
+        ready.wait(30)
+
+    barrier = multiprocessing.Barrier(servers_count)
+    results = multiprocessing.Queue()
+    expected_total = SENDERS * MESSAGES
+    loads = [multiprocessing.Process(target=load_process,
+                                     args=(i, port, CLIENTS // servers_count, SENDERS // servers_count,
+                                           expected_total, barrier, results))
+             for i, port in enumerate(ports)]
+    for process in loads:
+        process.start()
+    outcomes = [results.get(timeout=TIMEOUT + 30) for _ in loads]
+    for process in loads:
+        process.join()
+    stop.set()
+    for process in servers:
+        process.join(10)
+
+    start = min(outcome[0] for outcome in outcomes)
+    end = max(outcome[1] for outcome in outcomes)
+    received = sum(outcome[2] for outcome in outcomes)
+    expected = sum(outcome[3] for outcome in outcomes)
+    return received, expected, end - start
+
+def main():
+    print(f"{CLIENTS} client, {SENDERS} mittenti x {MESSAGES} messaggi, core disponibili: {os.cpu_count()}")
+    if (os.cpu_count() or 1) < 2:
+        print("attenzione: un solo core, i risultati non misurano la scalabilità tra server")
+    print(f"{'server':>7} {'consegne':>17} {'secondi':>8} {'consegne/s':>11}")
+    for i, servers_count in enumerate(SERVER_COUNTS):
+        received, expected, elapsed = run(servers_count, BASE_PORT + i * 10)
+        print(f"{servers_count:>7} {received:>8}/{expected:<8} {elapsed:>8.2f} {received / elapsed:>11.0f}")
+
+if __name__ == "__main__":
+    main()
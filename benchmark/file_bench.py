@@ -0,0 +1,128 @@
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import connect_raw_client
+from benchmark.common import drain
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Benchmark del trasferimento di file (/send) con entrambi i motori del server (in un processo separato):
+# un client invia un file casuale di FILE_SIZE byte a RECEIVERS client, che lo salvano su disco in una cartella
+# temporanea, mentre una coppia di client sonda misura la latenza dei messaggi di chat (uno ogni PROBE_INTERVAL
+# secondi, come una conversazione) prima e durante il trasferimento.
+# Riporta la velocità del trasferimento (dall'avvio di /send, impronta SHA-256 compresa, al salvataggio verificato
+# in tutti i destinatari), i file consegnati e la memoria massima (RSS) del server rispetto alla dimensione del file.
+# Eseguire dalla root del progetto con: python -m benchmark.file_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 25900
+ENGINES = ("threaded", "selector")
+FILE_SIZE = 64 * 1024 * 1024
+RECEIVERS = 2
+IDLE_PROBES = 200
+PROBE_INTERVAL = 0.01
+TIMEOUT = 120
+
+# Server di benchmark: riporta la memoria massima del processo prima e dopo il trasferimento
+def server_process(engine, port, ready, report, stop, stats):
+    with quiet():
+        node = ChatNode("bench-server", server_engine=engine, heartbeat_interval=None, metrics=False, console="quiet")
+        node.start_as_server(HOST, port)
+        stats.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        ready.set()
+        report.wait()
+        stats.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        stop.wait()
+        node.shutdown()
+
+# Latenza di un messaggio di chat dalla sonda al ricevente, attraverso il server
+def probe(sender, receiver, index):
+    start = time.perf_counter()
+    sender.send({'type': 'chat_message', 'message': f"sonda {index}"})
+    while not any(message_data['type'] == 'chat_message' for message_data in receiver.receive() or ()):
+        pass
+    latency = (time.perf_counter() - start) * 1000
+    drain(sender) # conferme del server
+    time.sleep(PROBE_INTERVAL)
+    return latency
+
+def delivered(directories, name):
+    return sum(1 for directory in directories if os.path.exists(os.path.join(directory, name)))
+
+def run(engine, port, path):
+    ready, report, stop = (multiprocessing.Event() for _ in range(3))
+    stats = multiprocessing.Queue()
+    server = multiprocessing.Process(target=server_process, args=(engine, port, ready, report, stop, stats))
+    server.start()
+    ready.wait(30)
+    rss_before = stats.get(timeout=30)
+
+    workdir = tempfile.mkdtemp(prefix="file_bench_")
+    with quiet():
+        origin = ChatNode("mittente", heartbeat_interval=None, metrics=False, console="quiet")
+        origin.connect_as_client(HOST, port)
+        receivers = []
+        for i in range(RECEIVERS):
+            receiver = ChatNode(f"ricevente{i}", heartbeat_interval=None, metrics=False, console="quiet")
+            receiver.connect_as_client(HOST, port)
+            receiver.files.directory = os.path.join(workdir, receiver.username)
+            receivers.append(receiver)
+    directories = [receiver.files.directory for receiver in receivers]
+    sender = connect_raw_client(HOST, port, "sonda")
+    listener = connect_raw_client(HOST, port, "ascolto")
+    drain(sender)
+    drain(listener)
+
+    idle = [probe(sender, listener, i) for i in range(IDLE_PROBES)]
+
+    start = time.perf_counter()
+    origin.send_file(path)
+    busy = []
+    name = os.path.basename(path)
+    while delivered(directories, name) < RECEIVERS and time.perf_counter() - start < TIMEOUT:
+        busy.append(probe(sender, listener, len(busy)))
+    elapsed = time.perf_counter() - start
+    count = delivered(directories, name)
+
+    report.set()
+    rss_after = stats.get(timeout=30)
+    sender.close()
+    listener.close()
+    with quiet():
+        for node in receivers + [origin]:
+            node.shutdown()
+    stop.set()
+    server.join(30)
+    shutil.rmtree(workdir, ignore_errors=True)
+    return idle, busy, elapsed, count, rss_before, rss_after
+
+def main():
+    path = os.path.join(tempfile.mkdtemp(prefix="file_bench_"), "casuale.bin")
+    with open(path, 'wb') as file:
+        for _ in range(FILE_SIZE // (1024 * 1024)):
+            file.write(os.urandom(1024 * 1024))
+    print(f"file di {FILE_SIZE // (1024 * 1024)} MB a {RECEIVERS} destinatari; sonde di chat ogni {PROBE_INTERVAL * 1000:.0f} ms")
+    print(f"{'motore':>9} {'fase':>14} {'sonde':>6} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'MB/s':>7} {'consegnati':>11} {'RSS server MB':>14}")
+    port = BASE_PORT
+    try:
+        for engine in ENGINES:
+            idle, busy, elapsed, count, rss_before, rss_after = run(engine, port, path)
+            port += 1
+            for phase, latencies in (("chat a riposo", idle), ("con file", busy)):
+                print(f"{engine:>9} {phase:>14} {len(latencies):>6} {percentile(latencies, 50):>8.3f} "
+                      f"{percentile(latencies, 99):>8.3f} {max(latencies, default=0):>8.2f}", end="")
+                if phase == "con file":
+                    print(f" {FILE_SIZE / elapsed / 1e6:>7.1f} {count:>5}/{RECEIVERS:<5} "
+                          f"{rss_before / 1024:>6.1f} -> {rss_after / 1024:.1f}")
+                else:
+                    print()
+    finally:
+        shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
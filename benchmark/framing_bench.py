@@ -0,0 +1,59 @@
+import socket
+import threading
+import time
+from chat.framing import FrameDecoder
+from chat.framing import encode_frame
+
+# Benchmark del codec dei frame: misura quanti messaggi al secondo attraversano una coppia di
+# socket locali con framing a lunghezza prefissata, per payload di 1, 64 e 4096 byte.
+# Eseguire dalla root del progetto con: python -m benchmark.framing_bench
+
+PAYLOAD_SIZES = (1, 64, 4096)
+BATCH = 256                 # frame accodati in un'unica sendall (simula un burst)
+DURATION = 2.0              # durata di ciascuna misura in secondi
+
+# Funzione eseguita dal thread mittente: invia burst di frame finché non scade il tempo
+def sender(sock, frame, stop_event):
+    burst = frame * BATCH
+    try:
+        while not stop_event.is_set():
+            sock.sendall(burst)
+    except OSError:
+        pass
+    finally:
+        sock.shutdown(socket.SHUT_WR)
+
+# Misura il throughput per una dimensione di payload e restituisce (messaggi/s, MB/s)
+def run(payload_size):
+    reader, writer = socket.socketpair()
+    frame = encode_frame(b'x' * payload_size)
+    stop_event = threading.Event()
+    thread = threading.Thread(target=sender, args=(writer, frame, stop_event), daemon=True)
+
+    decoder = FrameDecoder()
+    received = 0
+    start = time.perf_counter()
+    thread.start()
+
+    # il ricevente usa lo stesso percorso dei nodi: recv_into nel buffer riutilizzabile + estrazione frame
+    while True:
+        if time.perf_counter() - start >= DURATION:
+            stop_event.set()
+        if decoder.read_from(reader) == 0:
+            break
+        received += len(decoder.frames())
+
+    elapsed = time.perf_counter() - start
+    thread.join()
+    reader.close()
+    writer.close()
+    return received / elapsed, received * payload_size / elapsed / 1e6
+
+def main():
+    print(f"{'payload (B)':>12} {'messaggi/s':>14} {'MB/s':>10}")
+    for size in PAYLOAD_SIZES:
+        rate, throughput = run(size)
+        print(f"{size:>12} {rate:>14,.0f} {throughput:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import socket
+import threading
+import time
+from chat.chat_node import ChatNode
+from chat.connection import Connection
+from benchmark.common import connect_raw_client
+from benchmark.common import quiet
+
+# Benchmark del rilevamento dei guasti con heartbeat e rilevatore phi accrual.
+# Simula un peer "congelato" che smette di rispondere senza chiudere la connessione
+# (es. processo sospeso o rete interrotta), caso in cui TCP da solo non segnala nulla per ore:
+#   - lato server: un client grezzo completa il join, invia qualche heartbeat e poi tace;
+#     si misura il tempo dall'ultimo heartbeat alla sua rimozione dai client connessi
+#   - lato client: un finto server accetta il join, invia qualche heartbeat e poi tace;
+#     si misura il tempo dall'ultimo heartbeat all'avvio della procedura di elezione del client
+# Eseguire dalla root del progetto con: python -m benchmark.heartbeat_bench
+
+HOST = "localhost"
+BASE_PORT = 23400
+INTERVALS = (0.25, 0.5, 1.0)
+HEARTBEATS = 10     # heartbeat regolari inviati prima di congelarsi
+TIMEOUT = 30.0
+
+# Attende che condition diventi vera e restituisce l'istante in cui è successo
+def wait_until(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("peer congelato non rilevato")
+        time.sleep(0.005)
+    return time.monotonic()
+
+def frozen_client(engine, interval, port):
+    with quiet():
+        server = ChatNode("bench-server", server_engine=engine, heartbeat_interval=interval)
+        server.start_as_server(HOST, port)
+        connection = connect_raw_client(HOST, port, "congelato", heartbeat=interval)
+        wait_until(lambda: len(server.connected_clients) == 1)
+        for _ in range(HEARTBEATS):
+            time.sleep(interval)
+            connection.send({'type': 'heartbeat'})
+        frozen_at = time.monotonic()
+        detected_at = wait_until(lambda: not server.connected_clients)
+        connection.close()
+        server.shutdown()
+    return detected_at - frozen_at
+
+def frozen_server(interval, port):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((HOST, port))
+    listener.listen(1)
+    accepted = {}
+    heartbeats_sent = threading.Event()
+
+    # finto server: risponde al join, invia gli heartbeat e poi resta in silenzio con la connessione aperta
+    def serve():
+        sock, _ = listener.accept()
+        listener.close() # il client promosso a server non deve trovare la porta occupata
+        connection = Connection(sock)
+        connection.receive_one()
+        connection.send({'type': 'join_accepted', 'server_username': 'congelato', 'peer_list': [],
+                         'last_seq': 0, 'heartbeat': interval})
+        accepted['connection'] = connection
+        for _ in range(HEARTBEATS):
+            time.sleep(interval)
+            connection.send({'type': 'heartbeat'})
+        accepted['frozen_at'] = time.monotonic()
+        heartbeats_sent.set()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    with quiet():
+        client = ChatNode("bench-client", heartbeat_interval=interval)
+        client.connect_as_client(HOST, port)
+        heartbeats_sent.wait()
+        detected_at = wait_until(lambda: not client.connected_to_server)
+        client.shutdown()
+    thread.join()
+    accepted['connection'].close()
+    return detected_at - accepted['frozen_at']
+
+def main():
+    port = BASE_PORT
+    print(f"{'intervallo s':>12} {'server threaded s':>18} {'server selector s':>18} {'client s':>9}")
+    for interval in INTERVALS:
+        results = []
+        for engine in ("threaded", "selector"):
+            results.append(frozen_client(engine, interval, port))
+            port += 1
+        results.append(frozen_server(interval, port))
+        port += 1
+        print(f"{interval:>12.2f} {results[0]:>18.2f} {results[1]:>18.2f} {results[2]:>9.2f}")
+
+if __name__ == "__main__":
+    main()
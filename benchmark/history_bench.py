@@ -0,0 +1,64 @@
+import random
+import tempfile
+import time
+from chat.history import HistoryStore
+from benchmark.common import percentile
+
+# Benchmark dell'archivio della cronologia: costruisce un archivio con MESSAGES messaggi
+# (a gruppi, come fa il writer del log) e misura la latenza di una pagina di risultati
+# per le query più comuni: ultimi messaggi, pagina profonda, messaggi di un utente, ricerca per parola.
+# Eseguire dalla root del progetto con: python -m benchmark.history_bench
+
+MESSAGES = 1_000_000
+BATCH = 512
+USERS = [f"utente{i}" for i in range(200)]
+WORDS = ("ciao", "come", "va", "bene", "grazie", "stasera", "partita", "andiamo", "ok", "sì",
+         "domani", "riunione", "alle", "otto", "chi", "viene", "pizza", "perfetto", "a", "dopo")
+RARE_WORD = "zanzibar"      # compare in un messaggio ogni 10.000
+REPEAT = 200
+PAGE = 50
+
+def build(store, rng):
+    start = time.perf_counter()
+    now = time.time()
+    for batch_start in range(0, MESSAGES, BATCH):
+        batch = []
+        for seq in range(batch_start, min(batch_start + BATCH, MESSAGES)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(3, 12))]
+            if seq % 10_000 == 0:
+                words.append(RARE_WORD)
+            batch.append((now + seq * 0.01, 'chat_message', rng.choice(USERS), " ".join(words)))
+        store.append_batch(batch)
+    return time.perf_counter() - start
+
+def measure(query):
+    query() # la prima esecuzione mappa i file
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        page = query()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return page, timings
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        store = HistoryStore(directory)
+        elapsed = build(store, random.Random(1))
+        print(f"archivio: {len(store):,} messaggi costruiti in {elapsed:.1f} s ({elapsed / MESSAGES * 1e6:.1f} µs/messaggio)\n")
+
+        queries = {
+            "ultima pagina": lambda: store.query(limit=PAGE),
+            "pagina a metà": lambda: store.query(limit=PAGE, before=MESSAGES // 2),
+            "utente": lambda: store.query(limit=PAGE, username="utente7"),
+            "utente, a metà": lambda: store.query(limit=PAGE, username="utente7", before=MESSAGES // 2),
+            "parola comune": lambda: store.query(limit=PAGE, contains="pizza"),
+            "parola rara": lambda: store.query(limit=PAGE, contains=RARE_WORD),
+        }
+        print(f"{'query':>16} {'risultati':>10} {'p50 µs':>9} {'p99 µs':>9}")
+        for label, query in queries.items():
+            page, timings = measure(query)
+            print(f"{label:>16} {len(page['messages']):>10} {percentile(timings, 50):>9.1f} {percentile(timings, 99):>9.1f}")
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import multiprocessing
+import socket
+import threading
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import connect_raw_client
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Benchmark dei join simultanei (es. tutti i client che si riconnettono dopo un failover): CLIENTS client eseguono
+# il join con CONNECTORS thread in parallelo verso un server in un processo separato, con entrambi i motori.
+# Nella seconda misura STALLED connessioni "bloccate" (aprono il socket TCP ma non inviano la richiesta di join)
+# sono mescolate ai join: un handshake eseguito dal thread di accept le attenderebbe una alla volta fino alla scadenza.
+# Misura il tempo perché tutti i client completino il join e la durata dei singoli join.
+# Eseguire dalla root del progetto con: python -m benchmark.join_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 25700
+ENGINES = ("threaded", "selector")
+CLIENTS = 500
+CONNECTORS = 8
+STALLED = 5
+
+def server_process(engine, port, ready, stop):
+    with quiet():
+        node = ChatNode("bench-server", max_connections=CLIENTS + STALLED + 1, server_engine=engine,
+                        heartbeat_interval=None, metrics=False, console="quiet")
+        node.start_as_server(HOST, port)
+        ready.set()
+        stop.wait()
+        node.shutdown()
+
+# Join di una parte dei client; ogni (CLIENTS // STALLED)-esimo join è preceduto da una connessione bloccata
+def connector(port, indexes, stalled_every, connections, stalled, join_times, errors):
+    for i in indexes:
+        if stalled_every and i % stalled_every == 0:
+            stalled.append(socket.create_connection((HOST, port)))
+        start = time.perf_counter()
+        try:
+            connections.append(connect_raw_client(HOST, port, f"bot{i}"))
+            join_times.append(time.perf_counter() - start)
+        except (OSError, ConnectionError) as e:
+            errors.append(e)
+
+def run(engine, port, stalled_count):
+    stop = multiprocessing.Event()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=server_process, args=(engine, port, ready, stop))
+    server.start()
+    ready.wait(30)
+
+    connections, stalled, join_times, errors = [], [], [], []
+    stalled_every = CLIENTS // stalled_count if stalled_count else 0
+    threads = [threading.Thread(target=connector, args=(port, range(i, CLIENTS, CONNECTORS), stalled_every,
+                                                        connections, stalled, join_times, errors))
+               for i in range(CONNECTORS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    for sock in stalled + [connection.sock for connection in connections]:
+        sock.close()
+    stop.set()
+    server.join(30)
+    return elapsed, join_times, len(errors)
+
+def main():
+    print(f"{CLIENTS} join da {CONNECTORS} thread in parallelo")
+    print(f"{'motore':>9} {'bloccate':>9} {'secondi':>8} {'join/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errori':>7}")
+    port = BASE_PORT
+    for engine in ENGINES:
+        for stalled_count in (0, STALLED):
+            elapsed, join_times, errors = run(engine, port, stalled_count)
+            port += 1
+            times = [value * 1000 for value in join_times]
+            print(f"{engine:>9} {stalled_count:>9} {elapsed:>8.2f} {len(join_times) / elapsed:>8.0f} "
+                  f"{percentile(times, 50):>8.2f} {percentile(times, 99):>8.2f} {max(times, default=0):>8.1f} {errors:>7}")
+
+if __name__ == "__main__":
+    main()
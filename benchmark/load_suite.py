@@ -0,0 +1,268 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from chat.chat_node import ChatNode
+from chat.replay import sequence_epoch
+from benchmark.bots import run_swarm
+from benchmark.common import percentile
+from benchmark.common import quiet
+from benchmark.failover_bench import crash
+
+# Suite di carico senza console: avvia un server (nello stesso processo o in un sottoprocesso) e molti bot
+# (in thread o in processi separati) che inviano messaggi a frequenza e dimensione configurabili. Misura:
+#   - join: join al secondo e durata dei singoli join mentre tutti i bot si collegano
+#   - throughput: messaggi inviati e consegnati al secondo
+#   - latenza end-to-end (p50/p95/p99) dall'invio di un bot alla ricezione da parte degli altri
+#   - failover: interruzione della chat quando il processo del server viene terminato di colpo (SIGKILL)
+# I risultati vengono stampati e salvati in JSON (con il commit corrente) per confrontare esecuzioni diverse.
+# Eseguire dalla root del progetto con: python -m benchmark.load_suite [opzioni], vedi --help
+
+HOST = "127.0.0.1"
+RESULTS_DIRECTORY = "benchmark_results"
+FAILOVER_SEND_INTERVAL = 0.01
+FAILOVER_TIMEOUT = 30.0
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Suite di carico della chat")
+    parser.add_argument("--clients", type=int, default=20, help="bot collegati al server")
+    parser.add_argument("--senders", type=int, default=5, help="bot che inviano messaggi")
+    parser.add_argument("--rate", type=float, default=20.0, help="messaggi al secondo per mittente")
+    parser.add_argument("--size", type=int, default=100, help="caratteri per messaggio")
+    parser.add_argument("--duration", type=float, default=5.0, help="secondi di invio")
+    parser.add_argument("--bot-processes", type=int, default=2,
+                        help="processi tra cui dividere i bot (0 per eseguirli in un thread di questo processo)")
+    parser.add_argument("--server", choices=("subprocess", "inprocess"), default="subprocess",
+                        help="dove eseguire il server")
+    parser.add_argument("--engine", choices=("threaded", "selector"), default="selector", help="motore del server")
+    parser.add_argument("--workers", type=int, default=1, help="processi del server sulla stessa porta")
+    parser.add_argument("--failover-clients", type=int, default=4,
+                        help="client completi usati per misurare il failover (almeno 3, 0 per saltare la misura)")
+    parser.add_argument("--port", type=int, default=25000, help="porta del server (il failover usa le successive)")
+    parser.add_argument("--output", help=f"file JSON dei risultati (default in {RESULTS_DIRECTORY}/)")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS) # server senza console per il sottoprocesso
+    return parser.parse_args()
+
+# Server senza console eseguito nel sottoprocesso: resta attivo finché lo standard input non viene chiuso
+def serve(args):
+    with quiet():
+        node = ChatNode("bench-server", max_connections=args.clients + args.failover_clients + 1,
+                        server_engine=args.engine, workers=args.workers)
+        if not node.start_as_server(HOST, args.port):
+            sys.exit(1)
+        if node.worker_group:
+            node.worker_group.wait_ready(30)
+        print("READY", file=sys.__stdout__, flush=True)
+        sys.stdin.read()
+        node.shutdown()
+
+# Server usato da una misura: un sottoprocesso con --serve oppure un ChatNode in questo processo
+class BenchServer:
+    def __init__(self, args, port):
+        self.args = args
+        self.port = port
+        self.process = None
+        self.node = None
+
+    def start(self):
+        args = self.args
+        if args.server == "inprocess":
+            with quiet():
+                self.node = ChatNode("bench-server", max_connections=args.clients + args.failover_clients + 1,
+                                     server_engine=args.engine, workers=args.workers)
+                self.node.start_as_server(HOST, self.port)
+                if self.node.worker_group:
+                    self.node.worker_group.wait_ready(30)
+            return
+        command = [sys.executable, "-m", "benchmark.load_suite", "--serve", "--port", str(self.port),
+                   "--engine", args.engine, "--workers", str(args.workers),
+                   "--clients", str(args.clients), "--failover-clients", str(args.failover_clients)]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        if self.process.stdout.readline().strip() != "READY":
+            raise RuntimeError("il server di benchmark non si è avviato")
+
+    # Caduta improvvisa: SIGKILL del sottoprocesso o chiusura delle connessioni senza avviso
+    def kill(self):
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+        else:
+            crash(self.node)
+
+    def stop(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.stdin.close()
+                try:
+                    self.process.wait(10)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+        elif self.node is not None and self.node.running:
+            with quiet():
+                self.node.shutdown()
+
+# Join, throughput e latenza: i bot vengono divisi in gruppi che partono insieme da una barriera
+def run_load(args, port):
+    groups = max(1, args.bot_processes)
+    names = [[f"bot{i}" for i in range(args.clients) if i % groups == group] for group in range(groups)]
+    senders = [args.senders // groups + (1 if group < args.senders % groups else 0) for group in range(groups)]
+
+    server = BenchServer(args, port)
+    server.start()
+    with quiet(): # il server nello stesso processo stampa ingressi e uscite dei bot
+        try:
+            if args.bot_processes:
+                barrier = multiprocessing.Barrier(groups)
+                results = multiprocessing.Queue()
+                runners = [multiprocessing.Process(target=run_swarm, args=(HOST, port, names[group], senders[group], args.rate,
+                                                                           args.size, args.duration, barrier, results))
+                           for group in range(groups)]
+            else:
+                barrier = threading.Barrier(groups)
+                results = queue.Queue()
+                runners = [threading.Thread(target=run_swarm, args=(HOST, port, names[group], senders[group], args.rate,
+                                                                    args.size, args.duration, barrier, results))
+                           for group in range(groups)]
+            join_start = time.time()
+            for runner in runners:
+                runner.start()
+            outcomes = [results.get(timeout=args.duration + 120) for _ in runners]
+            for runner in runners:
+                runner.join()
+        finally:
+            server.stop()
+
+    errors = [outcome['error'] for outcome in outcomes if 'error' in outcome]
+    if errors:
+        raise RuntimeError(f"join dei bot non riuscito: {errors[0]}")
+
+    join_times = [value for outcome in outcomes for value in outcome['join_times']]
+    join_elapsed = min(outcome['start'] for outcome in outcomes) - join_start
+    start = min(outcome['start'] for outcome in outcomes)
+    end = max(outcome['last_delivery'] for outcome in outcomes)
+    sent = sum(outcome['sent'] for outcome in outcomes)
+    received = sum(outcome['received'] for outcome in outcomes)
+    latencies = [value * 1000 for outcome in outcomes for value in outcome['latencies']]
+    window = max(end - start, 1e-9)
+    return {
+        'join': {
+            'clients': args.clients,
+            'seconds': round(join_elapsed, 4),
+            'joins_per_second': round(args.clients / join_elapsed, 1),
+            'join_ms_p50': round(percentile([value * 1000 for value in join_times], 50), 3),
+            'join_ms_p99': round(percentile([value * 1000 for value in join_times], 99), 3)
+        },
+        'throughput': {
+            'sent': sent,
+            'delivered': received,
+            'expected': sent * (args.clients - 1),
+            'seconds': round(window, 4),
+            'messages_per_second': round(sent / window, 1),
+            'deliveries_per_second': round(received / window, 1)
+        },
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies, default=0.0), 3)
+        }
+    }
+
+# Failover: client completi (ChatNode) collegati al server, che viene terminato di colpo.
+# L'interruzione va dalla caduta al primo messaggio numerato dal nuovo server; la riconnessione
+# termina quando tutti i client sono collegati al nuovo server (o lo sono diventati)
+def run_failover(args, port):
+    server = BenchServer(args, port)
+    server.start()
+    delivered = {}
+    with quiet():
+        clients = []
+        for i in range(args.failover_clients):
+            client = ChatNode(f"client{i}", max_connections=args.failover_clients + 1)
+            client.connect_as_client(HOST, port)
+            clients.append(client)
+            time.sleep(0.05) # tempi di connessione distinti: l'ordine di anzianità è quello di creazione
+        time.sleep(1.0)
+
+        # il mittente e il ricevitore sono gli ultimi client, così nessuno dei due viene promosso
+        sender, receiver = clients[-1], clients[-2]
+        old_epoch = sequence_epoch(receiver.replay.last_seq)
+        process = receiver.process_server_message
+
+        def record(message_data):
+            seq = message_data.get('seq')
+            if (message_data['type'] == 'chat_message' and seq and sequence_epoch(seq) > old_epoch
+                    and 'outage' not in delivered):
+                delivered['outage'] = time.monotonic()
+            return process(message_data)
+        receiver.process_server_message = record
+
+        crashed_at = time.monotonic()
+        server.kill()
+        deadline = crashed_at + FAILOVER_TIMEOUT
+        count = 0
+        while time.monotonic() < deadline and ('outage' not in delivered or 'reconnect' not in delivered):
+            if 'reconnect' not in delivered and all(
+                    client.is_server or (client.connected_to_server and client.server_username != "bench-server")
+                    for client in clients):
+                delivered['reconnect'] = time.monotonic()
+            sender.send_message(f"messaggio {count}")
+            count += 1
+            time.sleep(FAILOVER_SEND_INTERVAL)
+
+        # prima i client, poi il nodo promosso, così la chiusura non innesca altri failover
+        for node in sorted(clients, key=lambda node: node.is_server):
+            node.shutdown()
+        server.stop()
+
+    return {
+        'clients': args.failover_clients,
+        'outage_ms': round((delivered['outage'] - crashed_at) * 1000, 1) if 'outage' in delivered else None,
+        'reconnect_ms': round((delivered['reconnect'] - crashed_at) * 1000, 1) if 'reconnect' in delivered else None
+    }
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    args = parse_args()
+    if args.serve:
+        serve(args)
+        return
+
+    config = {key: value for key, value in vars(args).items() if key not in ("serve", "output")}
+    report = {'commit': current_commit(), 'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"), 'config': config}
+    report.update(run_load(args, args.port))
+    if args.failover_clients >= 3:
+        report['failover'] = run_failover(args, args.port + 10)
+
+    join, throughput, latency = report['join'], report['throughput'], report['latency_ms']
+    print(f"join:       {join['joins_per_second']:.0f} join/s ({join['clients']} client in {join['seconds']:.2f} s), "
+          f"p50 {join['join_ms_p50']:.2f} ms, p99 {join['join_ms_p99']:.2f} ms")
+    print(f"throughput: {throughput['messages_per_second']:.0f} messaggi/s inviati, "
+          f"{throughput['deliveries_per_second']:.0f} consegne/s ({throughput['delivered']}/{throughput['expected']})")
+    print(f"latenza:    p50 {latency['p50']:.2f} ms, p95 {latency['p95']:.2f} ms, p99 {latency['p99']:.2f} ms, "
+          f"max {latency['max']:.2f} ms")
+    if 'failover' in report:
+        failover = report['failover']
+        print(f"failover:   interruzione {failover['outage_ms']} ms, tutti riconnessi dopo {failover['reconnect_ms']} ms")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+        output = os.path.join(RESULTS_DIRECTORY, f"load-{report['commit'] or 'nocommit'}-{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Risultati salvati in {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import tracemalloc
+from chat.log_writer import ChatLogWriter
+
+# Benchmark del log della chat: confronta la lista in memoria scritta solo allo shutdown
+# con il writer in streaming (coda limitata, scritture a gruppi, rotazione) per le diverse politiche di fsync,
+# sia con una raffica di voci senza pause (la coda limitata scarta l'eccesso) sia a ritmo sostenuto.
+# Riporta il costo per voce sul thread chiamante, il tempo totale fino al log completo su disco
+# e il picco di memoria Python allocata durante la sessione (misurato in un'esecuzione separata).
+# Eseguire dalla root del progetto con: python -m benchmark.log_bench
+
+ENTRIES = 100_000
+RATE = 50_000       # voci al secondo nello scenario a ritmo sostenuto (None: tutte di seguito)
+CHUNK = 500
+MESSAGE = "ciao a tutti, qualcuno ha visto la partita ieri sera?"
+
+# Percorso originale: lista in memoria riversata su file alla fine della sessione
+def in_memory(directory):
+    chat_log = []
+    start = time.perf_counter()
+    for i in range(ENTRIES):
+        chat_log.append({'timestamp': time.time(), 'type': 'chat_message', 'username': f"utente{i % 50}", 'message': MESSAGE})
+    append_s = time.perf_counter() - start
+    with open(os.path.join(directory, "chat_log_memoria.log"), 'w', encoding='utf-8') as f:
+        for entry in chat_log:
+            f.write(f"[{time.strftime('%H:%M:%S', time.localtime(entry['timestamp']))}] {entry['username']}: {entry['message']}\n")
+    return append_s, time.perf_counter() - start, 0
+
+def streaming(directory, fsync_policy, rate):
+    writer = ChatLogWriter(directory, "bench", fsync_policy=fsync_policy, rotate_bytes=2 * 1024 * 1024)
+    start = time.perf_counter()
+    append_s = 0.0
+    for chunk_start in range(0, ENTRIES, CHUNK):
+        chunk_time = time.perf_counter()
+        for i in range(chunk_start, chunk_start + CHUNK):
+            writer.append(time.time(), 'chat_message', f"utente{i % 50}", MESSAGE)
+        append_s += time.perf_counter() - chunk_time
+        if rate:
+            delay = start + (chunk_start + CHUNK) / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    files = writer.close(timeout=60)
+    return append_s, time.perf_counter() - start, len(files), writer.dropped
+
+def main():
+    runs = [("in memoria", in_memory)] + [
+        (f"{policy}/{'raffica' if rate is None else f'{rate // 1000}k/s'}",
+         lambda directory, policy=policy, rate=rate: streaming(directory, policy, rate))
+        for rate in (None, RATE) for policy in ("never", "interval", "always")
+    ]
+    print(f"{'percorso':>16} {'µs/voce':>8} {'totale s':>9} {'file':>5} {'scartate':>9} {'picco MiB':>10}")
+    for name, run in runs:
+        with tempfile.TemporaryDirectory() as directory:
+            result = run(directory)
+        # seconda esecuzione solo per la memoria: tracemalloc rallenta sensibilmente le misure di tempo
+        with tempfile.TemporaryDirectory() as directory:
+            tracemalloc.start()
+            run(directory)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        append_s, total_s, files = result[:3]
+        dropped = result[3] if len(result) > 3 else 0
+        print(f"{name:>16} {append_s / ENTRIES * 1e6:>8.2f} {total_s:>9.2f} {files or 1:>5} {dropped:>9} {peak / 2**20:>10.1f}")
+
+if __name__ == "__main__":
+    main()
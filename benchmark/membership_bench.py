@@ -0,0 +1,68 @@
+import time
+from chat.chat_node import ChatNode
+from chat.framing import encode_frame
+from chat.wire import BinaryCodec
+from chat.wire import JsonCodec
+from benchmark.common import quiet
+
+# Benchmark dei byte inviati dal server per gli aggiornamenti della membership mentre N client entrano uno dopo l'altro
+# (es. un'intera chat che si riconnette dopo un failover). Ogni nuovo client riceve la peer list completa nel join;
+# gli altri ricevono user_joined, che prima conteneva l'intera peer list (O(N) byte a ciascuno di N client, O(N²)
+# in totale) e ora solo il nuovo peer con la versione della membership.
+# I messaggi sono costruiti con gli stessi metodi del server e codificati con ciascun formato di trasporto.
+# Eseguire dalla root del progetto con: python -m benchmark.membership_bench
+
+SIZES = (10, 100, 1000)
+
+def frame_size(codec, message_data):
+    return len(encode_frame(codec.encode(message_data)))
+
+def measure(clients_count, codec):
+    with quiet():
+        server = ChatNode("bench-server", max_connections=clients_count + 1)
+    server.membership_epoch = 1
+    server.intern.add(server.username)
+    json_codec = JsonCodec()
+    start_time = time.time()
+    full_bytes = delta_bytes = 0
+
+    for i in range(clients_count):
+        username = f"utente{i}"
+        client_info = {
+            'username': username,
+            'uid': server.intern.add(username),
+            'address': ('10.0.0.1', 40000 + i),
+            'connection_time': start_time + i,
+            'connection': None,
+            'detector': None,
+            'rooms': set()
+        }
+        membership = server.next_membership_version()
+        peer_list = server.get_peer_list_for_client(extra_client=client_info)
+
+        # la conferma del join (sempre in JSON) contiene la lista completa in entrambi i casi
+        join_bytes = frame_size(json_codec, {'type': 'join_accepted', 'server_username': server.username,
+                                             'peer_list': peer_list, 'membership': membership})
+        server.add_client(i, client_info)
+
+        message = f'{username} si è unito alla chat'
+        full_event = {'type': 'user_joined', 'username': username, 'message': message,
+                      'peer_list': peer_list, 'seq': i + 1}
+        delta_event = server.membership_delta({'type': 'user_joined', 'username': username, 'message': message,
+                                               'member': server.peer_entry(client_info)}, membership)
+        delta_event['seq'] = i + 1
+
+        full_bytes += join_bytes + i * frame_size(codec, full_event)
+        delta_bytes += join_bytes + i * frame_size(codec, delta_event)
+
+    return full_bytes, delta_bytes
+
+def main():
+    print(f"{'client':>7} {'codec':>6} {'peer list completa':>19} {'variazioni':>12} {'riduzione':>10}")
+    for clients_count in SIZES:
+        for codec in (JsonCodec(), BinaryCodec()):
+            full_bytes, delta_bytes = measure(clients_count, codec)
+            print(f"{clients_count:>7} {codec.name:>6} {full_bytes:>19,} {delta_bytes:>12,} {full_bytes / delta_bytes:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import multiprocessing
+import statistics
+from chat.chat_node import ChatNode
+from benchmark.common import quiet
+from benchmark.federation_bench import load_process
+
+# Benchmark del costo delle metriche: la stessa chat (CLIENTS client, SENDERS mittenti) servita da un server
+# con il registro delle metriche attivo e disattivato, con entrambi i motori. Il carico è generato da LOADS processi
+# separati e si misurano le consegne al secondo finché ogni client non ha ricevuto tutti i messaggi degli altri.
+# Le configurazioni si alternano per ROUNDS giri e si riporta la mediana, per ridurre il rumore tra esecuzioni.
+# Eseguire dalla root del progetto con: python -m benchmark.metrics_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 25400
+ENGINES = ("selector", "threaded")
+CLIENTS = 40
+SENDERS = 4
+LOADS = 2
+MESSAGES = 500 # per mittente, come in federation_bench
+ROUNDS = 5
+
+def server_process(engine, metrics, port, ready, stop):
+    with quiet():
+        node = ChatNode("bench-server", max_connections=CLIENTS + 1, server_engine=engine,
+                        outbound_high_watermark=64 * 1024 * 1024, outbound_low_watermark=32 * 1024 * 1024,
+                        heartbeat_interval=None, metrics=metrics)
+        node.start_as_server(HOST, port)
+        ready.set()
+        stop.wait()
+        node.shutdown()
+
+def run(engine, metrics, port):
+    stop = multiprocessing.Event()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=server_process, args=(engine, metrics, port, ready, stop))
+    server.start()
+    ready.wait(60)
+
+    barrier = multiprocessing.Barrier(LOADS)
+    results = multiprocessing.Queue()
+    loads = [multiprocessing.Process(target=load_process,
+                                     args=(i, port, CLIENTS // LOADS, SENDERS // LOADS, SENDERS * MESSAGES,
+                                           barrier, results))
+             for i in range(LOADS)]
+    for process in loads:
+        process.start()
+    outcomes = [results.get(timeout=300) for _ in loads]
+    for process in loads:
+        process.join()
+    stop.set()
+    server.join(30)
+
+    elapsed = max(outcome[1] for outcome in outcomes) - min(outcome[0] for outcome in outcomes)
+    return sum(outcome[2] for outcome in outcomes) / elapsed
+
+def main():
+    print(f"{CLIENTS} client, {SENDERS} mittenti x {MESSAGES} messaggi, mediana di {ROUNDS} giri")
+    print(f"{'motore':>9} {'senza metriche':>15} {'con metriche':>13} {'differenza':>11}")
+    port = BASE_PORT
+    for engine in ENGINES:
+        rates = {False: [], True: []}
+        for _ in range(ROUNDS):
+            for metrics in (False, True):
+                rates[metrics].append(run(engine, metrics, port))
+                port += 1
+        without, with_metrics = statistics.median(rates[False]), statistics.median(rates[True])
+        print(f"{engine:>9} {without:>13.0f}/s {with_metrics:>11.0f}/s {(with_metrics / without - 1) * 100:>+10.1f}%")
+
+if __name__ == "__main__":
+    main()
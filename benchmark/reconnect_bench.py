@@ -0,0 +1,91 @@
+import socket
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Benchmark della ricerca del nuovo server dopo un failover (attempt_reconnection).
+# Le porte candidate (porta originale + 5 successive) vengono preparate in tre modi:
+#   - "rifiuta": nessuno in ascolto, la connessione viene rifiutata subito
+#   - "buco nero": socket in ascolto con la coda di connessioni piena, i SYN vengono scartati e il connect non termina
+#   - "server": il nuovo server della chat
+# Per ogni scenario confronta il vecchio approccio sequenziale (un connect alla volta con timeout di 10 s)
+# con la riconnessione attuale, che prova i candidati in parallelo con avvii sfasati.
+# Eseguire dalla root del progetto con: python -m benchmark.reconnect_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 23600
+ROUNDS = 5
+SEQUENTIAL_TIMEOUT = 10.0
+
+SCENARIOS = {
+    "server sulla 6a porta, altre rifiutano": ("rifiuta",) * 5 + ("server",),
+    "2 buchi neri prima del server": ("rifiuta", "buco nero", "rifiuta", "buco nero", "rifiuta", "server"),
+}
+
+# Socket in ascolto che non accetta mai: con la coda piena il kernel scarta i nuovi SYN
+def blackhole(port):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind((HOST, port))
+    listener.listen(0)
+    fillers = []
+    for _ in range(3):
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.setblocking(False)
+        filler.connect_ex((HOST, port))
+        fillers.append(filler)
+    time.sleep(0.05)
+    return [listener] + fillers
+
+# Vecchio comportamento: un connect bloccante alla volta, in ordine di porta
+def sequential(base_port):
+    start = time.monotonic()
+    for i in range(6):
+        try:
+            sock = socket.create_connection((HOST, base_port + i), timeout=SEQUENTIAL_TIMEOUT)
+            sock.close()
+            return time.monotonic() - start
+        except OSError:
+            continue
+    return None
+
+def parallel(base_port):
+    client = ChatNode("bench-client")
+    client.server_host = HOST
+    client.server_port = base_port
+    start = time.monotonic()
+    client.attempt_reconnection()
+    elapsed = time.monotonic() - start
+    connected = client.connected_to_server
+    client.shutdown()
+    return elapsed if connected else None
+
+def main():
+    print(f"{'scenario':<40} {'sequenziale ms':>15} {'parallelo p50 ms':>17} {'parallelo max ms':>17}")
+    base_port = BASE_PORT
+    for name, layout in SCENARIOS.items():
+        sockets = []
+        with quiet():
+            server = ChatNode("bench-server", max_connections=ROUNDS + 1)
+            for i, kind in enumerate(layout):
+                if kind == "buco nero":
+                    sockets.extend(blackhole(base_port + i))
+                elif kind == "server":
+                    server.start_as_server(HOST, base_port + i)
+
+            sequential_time = sequential(base_port)
+            times = []
+            for _ in range(ROUNDS):
+                elapsed = parallel(base_port)
+                if elapsed is not None:
+                    times.append(elapsed * 1000)
+            server.shutdown()
+        for sock in sockets:
+            sock.close()
+
+        sequential_ms = f"{sequential_time * 1000:.1f}" if sequential_time is not None else "fallito"
+        print(f"{name:<40} {sequential_ms:>15} {percentile(times, 50):>17.1f} {max(times, default=0):>17.1f}")
+        base_port += 10
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import time
+from chat.replay import ReplayBuffer
+from chat.wire import BinaryCodec
+from chat.wire import InternTable
+from chat.wire import JsonCodec
+
+# Benchmark del replay dopo una riconnessione: con il buffer pieno (REPLAY_BUFFER_SIZE eventi)
+# confronta il batch con i soli eventi mancanti (dall'ultima sequenza vista dal client)
+# con l'invio dell'intera cronologia conservata, in byte sul filo e tempo di costruzione lato server.
+# Eseguire dalla root del progetto con: python -m benchmark.replay_bench
+
+MISSED = (10, 100, 1000)
+USERS = [f"utente{i}" for i in range(20)]
+REPEAT = 200
+
+def fill(buffer):
+    buffer.start_epoch()
+    now = time.time()
+    for i in range(buffer.capacity):
+        buffer.stamp({'type': 'chat_message', 'username': USERS[i % len(USERS)],
+                      'message': f"messaggio numero {i} per tutta la chat", 'timestamp': now + i, 'cid': i})
+
+def measure(buffer, codec, last_seq):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        events, truncated = buffer.since(last_seq, exclude_username="ospite")
+        payload = codec.encode({'type': 'replay', 'events': events, 'truncated': truncated})
+    elapsed = (time.perf_counter() - start) / REPEAT * 1e6
+    return len(events), len(payload), elapsed
+
+def main():
+    buffer = ReplayBuffer()
+    fill(buffer)
+    intern = InternTable()
+    for name in USERS:
+        intern.add(name)
+    first_seq = buffer.events[0][0]
+
+    print(f"{'persi':>6} {'codec':>6} {'batch':>8} {'byte replay':>12} {'byte cronologia':>16} {'µs replay':>10}")
+    for codec in (JsonCodec(), BinaryCodec(intern)):
+        _, full_bytes, _ = measure(buffer, codec, first_seq - 1)
+        for missed in MISSED:
+            count, size, micros = measure(buffer, codec, buffer.last_seq - missed)
+            print(f"{missed:>6} {codec.name:>6} {count:>8} {size:>12,} {full_bytes:>16,} {micros:>10.1f}")
+
+if __name__ == "__main__":
+    main()
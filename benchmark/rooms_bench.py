@@ -0,0 +1,61 @@
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import connect_raw_client
+from benchmark.common import drain
+from benchmark.common import quiet
+
+# Benchmark del fan-out per stanze: una stanza "bersaglio" con ROOM_SIZE partecipanti e un numero crescente
+# di altre stanze, ciascuna con ROOM_SIZE client, che non ricevono i messaggi della stanza bersaglio.
+# Misura il costo lato server (broadcast_to_clients) di un messaggio inviato alla stanza bersaglio
+# e, per confronto, di un messaggio inviato a tutta la chat. Il primo deve restare costante al crescere delle stanze.
+# Eseguire dalla root del progetto con: python -m benchmark.rooms_bench
+
+HOST = "localhost"
+BASE_PORT = 23700
+ROOM_SIZE = 5
+OTHER_ROOMS = (0, 10, 50, 100)
+MESSAGES = 2000
+
+def measure(server, message_data, clients):
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        server.broadcast_to_clients(dict(message_data))
+    elapsed = (time.perf_counter() - start) / MESSAGES * 1e6
+    time.sleep(0.2)
+    for connection in clients:
+        drain(connection)
+    return elapsed
+
+def run(other_rooms, port):
+    clients_count = ROOM_SIZE * (other_rooms + 1)
+    with quiet():
+        server = ChatNode("bench-server", max_connections=clients_count + 1, server_engine="selector")
+        server.start_as_server(HOST, port)
+        clients = []
+        for room_index in range(other_rooms + 1):
+            room = "bersaglio" if room_index == 0 else f"stanza{room_index}"
+            for i in range(ROOM_SIZE):
+                connection = connect_raw_client(HOST, port, f"{room}-{i}", rooms=[room])
+                clients.append(connection)
+            for connection in clients:
+                drain(connection)
+        time.sleep(0.2)
+        for connection in clients:
+            drain(connection)
+
+        room_cost = measure(server, {'type': 'server_message', 'message': 'ping', 'room': 'bersaglio'}, clients)
+        global_cost = measure(server, {'type': 'server_message', 'message': 'ping'}, clients)
+
+        for connection in clients:
+            connection.close()
+        server.shutdown()
+    return clients_count, room_cost, global_cost
+
+def main():
+    print(f"{'altre stanze':>12} {'client':>7} {'µs per messaggio in stanza':>27} {'µs per messaggio a tutti':>25}")
+    for i, other_rooms in enumerate(OTHER_ROOMS):
+        clients_count, room_cost, global_cost = run(other_rooms, BASE_PORT + i)
+        print(f"{other_rooms:>12} {clients_count:>7} {room_cost:>27.1f} {global_cost:>25.1f}")
+
+if __name__ == "__main__":
+    main()
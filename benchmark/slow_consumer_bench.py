@@ -0,0 +1,97 @@
+import selectors
+import socket
+import threading
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import connect_raw_client
+from benchmark.common import drain
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Verifica delle code in uscita per client: un client che smette di leggere (lettore bloccato)
+# non deve rallentare la consegna ai client sani. Per ogni motore e politica si misura la latenza
+# dei client sani con e senza un lettore bloccato, e si riporta che fine ha fatto il client lento.
+# Eseguire dalla root del progetto con: python -m benchmark.slow_consumer_bench
+
+HOST = "localhost"
+BASE_PORT = 23200
+HEALTHY_CLIENTS = 5
+MESSAGES = 5000
+PAYLOAD = "x" * 4096
+SEND_INTERVAL = 0.0005      # ritmo del mittente: i client sani riescono a starci dietro, quello bloccato no
+HIGH_WATERMARK = 256 * 1024
+LOW_WATERMARK = 64 * 1024
+
+# Thread che legge dai client sani e registra la latenza di ogni messaggio (il testo contiene l'istante di invio)
+def collect(receivers, latencies, expected, done):
+    selector = selectors.DefaultSelector()
+    for connection in receivers:
+        selector.register(connection.sock, selectors.EVENT_READ, connection)
+    received = 0
+    while received < expected:
+        events = selector.select(timeout=5.0)
+        if not events:
+            break
+        for key, _ in events:
+            for message in key.data.receive() or []:
+                if message.get('type') == 'chat_message':
+                    latencies.append(time.perf_counter() - float(message['message'].split('|')[0]))
+                    received += 1
+    selector.close()
+    done.set()
+
+def run(engine, policy, with_stalled, port):
+    with quiet():
+        server = ChatNode("bench-server", max_connections=HEALTHY_CLIENTS + 2, server_engine=engine,
+                          slow_consumer_policy=policy,
+                          outbound_high_watermark=HIGH_WATERMARK,
+                          outbound_low_watermark=LOW_WATERMARK)
+        server.start_as_server(HOST, port)
+
+        stalled = None
+        if with_stalled:
+            # il lettore bloccato ha un buffer di ricezione minimo e non legge mai
+            stalled = connect_raw_client(HOST, port, "stalled")
+            stalled.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+
+        sender = connect_raw_client(HOST, port, "sender")
+        receivers = [connect_raw_client(HOST, port, f"healthy{i}") for i in range(HEALTHY_CLIENTS)]
+        time.sleep(0.3)
+        for connection in receivers + [sender]:
+            drain(connection)
+
+        latencies = []
+        done = threading.Event()
+        collector = threading.Thread(target=collect, args=(receivers, latencies, MESSAGES * HEALTHY_CLIENTS, done), daemon=True)
+        collector.start()
+
+        for _ in range(MESSAGES):
+            sender.send({'type': 'chat_message', 'message': f"{time.perf_counter()}|{PAYLOAD}"})
+            time.sleep(SEND_INTERVAL)
+        done.wait(30)
+
+        # stato finale del client lento: disconnesso oppure ancora connesso con frame scartati
+        outcome = "-"
+        if stalled:
+            info = next((info for info in server.connected_clients.values() if info['username'] == "stalled"), None)
+            outcome = "disconnesso" if info is None else f"{info['connection'].outbound.dropped_frames} frame scartati"
+
+        for connection in receivers + [sender] + ([stalled] if stalled else []):
+            connection.close()
+        server.shutdown()
+
+    delivered = len(latencies) / (MESSAGES * HEALTHY_CLIENTS) * 100
+    return percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000, delivered, outcome
+
+def main():
+    print(f"{'motore':>9} {'politica':>12} {'bloccato':>9} {'p50 ms':>8} {'p99 ms':>8} {'consegnati %':>13}  client lento")
+    port = BASE_PORT
+    for engine in ("threaded", "selector"):
+        for policy in ("disconnect", "drop_oldest"):
+            for with_stalled in (False, True):
+                p50, p99, delivered, outcome = run(engine, policy, with_stalled, port)
+                port += 1
+                print(f"{engine:>9} {policy:>12} {'si' if with_stalled else 'no':>9} {p50:>8.2f} {p99:>8.2f} {delivered:>13.1f}  {outcome}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import time
+from chat.chat_node import ChatNode
+from benchmark.common import quiet
+
+# Benchmark dell'istantanea immutabile dei client (chat/membership.py) rispetto ai dizionari condivisi precedenti.
+# Per CLIENTS client connessi (senza rete) misura in microsecondi:
+#   - destinatari: preparazione dei destinatari di un broadcast (copia del dizionario contro tupla dell'istantanea)
+#   - peer list: risposta a una membership_request (lista ricostruita a ogni richiesta contro lista della versione)
+#   - join: registrazione di un client (inserimento nei dizionari contro copia e pubblicazione di una nuova versione),
+#     il costo che l'istantanea paga per rendere gratuite le letture
+# Eseguire dalla root del progetto con: python -m benchmark.snapshot_bench
+
+CLIENTS = (10, 100, 1000)
+ROUNDS = 2000
+
+def make_node(count):
+    with quiet():
+        node = ChatNode("bench-server", hot_standby=True, metrics=False, console="quiet")
+    node.is_server = True
+    start_time = time.time()
+    infos = []
+    for i in range(count):
+        username = f"utente{i}"
+        infos.append({'username': username, 'uid': node.intern.add(username), 'address': ('10.0.0.1', 40000 + i),
+                      'connection_time': start_time + i, 'connection': None, 'detector': None, 'rooms': set()})
+    return node, infos
+
+def timed(function, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        function()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+def measure(count):
+    node, infos = make_node(count)
+    for i, info in enumerate(infos):
+        node.add_client(i, info)
+    rounds = max(20, ROUNDS * 10 // count)
+    clients = dict(node.connected_clients) # dizionario condiviso come prima dell'istantanea
+
+    recipients_old = timed(lambda: list(clients.items()), rounds)
+    recipients_new = timed(lambda: node.clients.entries, rounds)
+
+    # prima ogni richiesta ricostruiva la lista: si azzera la lista della versione prima di ogni chiamata
+    def rebuild():
+        node.clients.peer_list = None
+        return node.get_peer_list_for_client()
+    peers_old = timed(rebuild, rounds)
+    node.get_peer_list_for_client()
+    peers_new = timed(node.get_peer_list_for_client, rounds)
+
+    # join: ogni misura aggiunge e toglie lo stesso client in più
+    extra = dict(infos[0], username="nuovo", connection_time=time.time() + count)
+    def join_old():
+        clients["nuovo"] = extra
+        del clients["nuovo"]
+    def join_new():
+        node.add_client("nuovo", extra)
+        node.remove_client("nuovo")
+    join_before = timed(join_old, rounds) / 2
+    join_after = timed(join_new, rounds) / 2
+    return (recipients_old, recipients_new), (peers_old, peers_new), (join_before, join_after)
+
+def main():
+    print(f"{'client':>7} {'destinatari prima/dopo µs':>27} {'peer list prima/dopo µs':>25} {'join prima/dopo µs':>20}")
+    for count in CLIENTS:
+        recipients, peers, joins = measure(count)
+        print(f"{count:>7} {recipients[0]:>13.2f} {recipients[1]:>13.3f} {peers[0]:>12.1f} {peers[1]:>12.3f} "
+              f"{joins[0]:>9.2f} {joins[1]:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import multiprocessing
+import selectors
+import time
+from chat.chat_node import ChatNode
+from chat.transport import TRANSPORT_PROFILES
+from benchmark.common import connect_raw_client
+from benchmark.common import drain
+from benchmark.common import percentile
+from benchmark.common import quiet
+
+# Benchmark dei profili di trasporto su loopback, con entrambi i motori del server (in un processo separato):
+#   - latenza: un client invia PROBES messaggi uno alla volta e misura quando ciascuno arriva a un altro client
+#     (chat poco trafficata, ogni messaggio attraversa il server da solo)
+#   - throughput: SENDERS client inviano MESSAGES messaggi ciascuno il più velocemente possibile a CLIENTS client
+#     (da un processo di carico separato); si misurano le consegne al secondo e le sendmsg eseguite dal server
+#     per ogni frame consegnato, che mostrano quanti messaggi vengono uniti in una sola scrittura
+# Eseguire dalla root del progetto con: python -m benchmark.transport_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 25800
+ENGINES = ("threaded", "selector")
+PROBES = 300
+CLIENTS = 40
+SENDERS = 4
+MESSAGES = 500
+TIMEOUT = 120
+
+# Server di benchmark: a richiesta riporta le scritture eseguite verso i client ancora collegati
+def server_process(engine, profile, port, ready, report, stop, stats):
+    with quiet():
+        node = ChatNode("bench-server", max_connections=CLIENTS + 3, server_engine=engine, transport=profile,
+                        outbound_high_watermark=64 * 1024 * 1024, outbound_low_watermark=32 * 1024 * 1024,
+                        heartbeat_interval=None, metrics=False, console="quiet")
+        node.start_as_server(HOST, port)
+        ready.set()
+        report.wait()
+        queues = [info['connection'].outbound for _, info in node.clients.entries]
+        stats.put((sum(outbound.syscalls for outbound in queues), sum(outbound.bytes_sent for outbound in queues)))
+        stop.wait()
+        node.shutdown()
+
+# Latenza dal momento dell'invio alla ricezione da parte di un altro client, un messaggio alla volta
+def measure_latency(port):
+    sender = connect_raw_client(HOST, port, "sonda")
+    receiver = connect_raw_client(HOST, port, "ricevente")
+    drain(sender)
+    drain(receiver)
+    latencies = []
+    for i in range(PROBES):
+        start = time.perf_counter()
+        sender.send({'type': 'chat_message', 'message': f"sonda {i}"})
+        while not any(message_data['type'] == 'chat_message' for message_data in receiver.receive() or ()):
+            pass
+        latencies.append((time.perf_counter() - start) * 1000)
+        drain(sender) # conferme del server
+    sender.close()
+    receiver.close()
+    return latencies
+
+# Processo di carico: CLIENTS client, di cui SENDERS inviano; resta collegato finché il server non ha riportato
+def load_process(port, done, release, results):
+    clients = [connect_raw_client(HOST, port, f"c{i}") for i in range(CLIENTS)]
+    senders = clients[:SENDERS]
+    expected = {connection: SENDERS * MESSAGES - (MESSAGES if connection in senders else 0) for connection in clients}
+    received = dict.fromkeys(clients, 0)
+    selector = selectors.DefaultSelector()
+    for connection in clients:
+        selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+    start = time.perf_counter()
+    pending = set(clients)
+    sent = 0
+    while pending and time.perf_counter() - start < TIMEOUT:
+        if sent < MESSAGES:
+            for connection in senders:
+                connection.send({'type': 'chat_message', 'message': f"messaggio {sent}"})
+            sent += 1
+        for key, _ in selector.select(timeout=0 if sent < MESSAGES else 0.5):
+            connection = key.data
+            messages = connection.receive()
+            if messages is None:
+                pending.discard(connection)
+                selector.unregister(connection.sock)
+                continue
+            received[connection] += sum(1 for message_data in messages if message_data['type'] == 'chat_message')
+            if received[connection] >= expected[connection]:
+                pending.discard(connection)
+    results.put((time.perf_counter() - start, sum(received.values()), sum(expected.values())))
+    done.set()
+    release.wait(30)
+    for connection in clients:
+        connection.close()
+
+def run(engine, profile, port):
+    ready, report, stop, done, release = (multiprocessing.Event() for _ in range(5))
+    stats, results = multiprocessing.Queue(), multiprocessing.Queue()
+    server = multiprocessing.Process(target=server_process, args=(engine, profile, port, ready, report, stop, stats))
+    server.start()
+    ready.wait(30)
+
+    latencies = measure_latency(port)
+
+    load = multiprocessing.Process(target=load_process, args=(port, done, release, results))
+    load.start()
+    elapsed, received, expected = results.get(timeout=TIMEOUT + 30)
+    report.set()
+    syscalls, _ = stats.get(timeout=30)
+    release.set()
+    load.join(30)
+    stop.set()
+    server.join(30)
+    return latencies, elapsed, received, expected, syscalls
+
+def main():
+    print(f"latenza: {PROBES} messaggi uno alla volta; throughput: {CLIENTS} client, {SENDERS} mittenti x {MESSAGES} messaggi")
+    print(f"{'motore':>9} {'profilo':>12} {'p50 ms':>8} {'p99 ms':>8} {'consegne':>17} {'consegne/s':>11} {'frame/sendmsg':>14}")
+    port = BASE_PORT
+    for engine in ENGINES:
+        for profile in TRANSPORT_PROFILES:
+            latencies, elapsed, received, expected, syscalls = run(engine, profile, port)
+            port += 1
+            print(f"{engine:>9} {profile:>12} {percentile(latencies, 50):>8.3f} {percentile(latencies, 99):>8.3f} "
+                  f"{received:>8}/{expected:<8} {received / elapsed:>11.0f} {received / max(syscalls, 1):>14.1f}")
+
+if __name__ == "__main__":
+    main()
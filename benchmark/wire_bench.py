@@ -0,0 +1,47 @@
+import time
+from chat.wire import BinaryCodec
+from chat.wire import InternTable
+from chat.wire import JsonCodec
+
+# Benchmark dei formati di codifica: per i messaggi più frequenti confronta il JSON (con il timestamp
+# formattato come stringa, come si aspettano i peer JSON) con il formato binario "bin1"
+# (tag numerici, username come uid, timestamp epoch). Riporta byte sul filo e costo di encode/decode.
+# Eseguire dalla root del progetto con: python -m benchmark.wire_bench
+
+ITERATIONS = 100_000
+
+def make_intern():
+    intern = InternTable()
+    for name in ("server", "alice", "bob", "carol"):
+        intern.add(name)
+    return intern
+
+SAMPLES = {
+    "chat (server->client)": {'type': 'chat_message', 'username': 'alice', 'message': 'ciao, ci vediamo alle otto?', 'timestamp': time.time()},
+    "chat (client->server)": {'type': 'chat_message', 'message': 'ciao, ci vediamo alle otto?'},
+    "server_message": {'type': 'server_message', 'message': 'benvenuti nella chat', 'timestamp': time.time()},
+}
+
+def measure(codec, message_data):
+    payload = codec.encode(message_data)
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        codec.encode(message_data)
+    encode_us = (time.perf_counter() - start) / ITERATIONS * 1e6
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        codec.decode(payload)
+    decode_us = (time.perf_counter() - start) / ITERATIONS * 1e6
+    return len(payload), encode_us, decode_us
+
+def main():
+    codecs = (JsonCodec(), BinaryCodec(make_intern()))
+    print(f"{'messaggio':>22} {'codec':>6} {'byte':>6} {'encode µs':>10} {'decode µs':>10}")
+    for label, message_data in SAMPLES.items():
+        for codec in codecs:
+            size, encode_us, decode_us = measure(codec, message_data)
+            print(f"{label:>22} {codec.name:>6} {size:>6} {encode_us:>10.2f} {decode_us:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+from chat.chat_node import ChatNode
+from benchmark.common import quiet
+from benchmark.federation_bench import load_process
+
+# Benchmark del server multi-processo: la stessa chat (CLIENTS client, SENDERS mittenti) servita da un server
+# con 1, 2 o 4 processi worker sulla stessa porta (SO_REUSEPORT). Il kernel distribuisce i client tra i worker,
+# che si scambiano i messaggi sul bus locale. Il carico è generato da LOADS processi separati, ciascuno con una
+# parte dei client; misura i messaggi consegnati al secondo finché ogni client non ha ricevuto tutti quelli degli altri.
+# Il guadagno dipende dai core disponibili, riportati nell'intestazione.
+# Il risultato ha senso solo su una macchina con più di un core: con un core solo i worker e i processi di carico
+# si contendono la stessa CPU, le consegne al secondo calano aggiungendo worker e i numeri non dicono nulla
+# sulla scalabilità del server multi-processo.
+# Eseguire dalla root del progetto con: python -m benchmark.workers_bench
+
+HOST = "127.0.0.1"
+BASE_PORT = 24800
+WORKER_COUNTS = (1, 2, 4)
+CLIENTS = 40
+SENDERS = 4
+LOADS = 2
+MESSAGES = 500 # per mittente, come in federation_bench
+
+def server_process(workers, port, ready, stop):
+    with quiet():
+        node = ChatNode("bench-server", max_connections=CLIENTS + 1, server_engine="selector",
+                        outbound_high_watermark=64 * 1024 * 1024, outbound_low_watermark=32 * 1024 * 1024,
+                        heartbeat_interval=None, workers=workers)
+        node.start_as_server(HOST, port)
+        if node.worker_group:
+            node.worker_group.wait_ready(30)
+        ready.set()
+        stop.wait()
+        node.shutdown()
+
+def run(workers, port):
+    stop = multiprocessing.Event()
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=server_process, args=(workers, port, ready, stop))
+    server.start()
+    ready.wait(60)
+
+    barrier = multiprocessing.Barrier(LOADS)
+    results = multiprocessing.Queue()
+    loads = [multiprocessing.Process(target=load_process,
+                                     args=(i, port, CLIENTS // LOADS, SENDERS // LOADS, SENDERS * MESSAGES,
+                                           barrier, results))
+             for i in range(LOADS)]
+    for process in loads:
+        process.start()
+    outcomes = [results.get(timeout=300) for _ in loads]
+    for process in loads:
+        process.join()
+    stop.set()
+    server.join(30)
+
+    start = min(outcome[0] for outcome in outcomes)
+    end = max(outcome[1] for outcome in outcomes)
+    received = sum(outcome[2] for outcome in outcomes)
+    expected = sum(outcome[3] for outcome in outcomes)
+    return received, expected, end - start
+
+def main():
+    print(f"{CLIENTS} client, {SENDERS} mittenti x {MESSAGES} messaggi, core disponibili: {os.cpu_count()}")
+    if (os.cpu_count() or 1) < 2:
+        print("attenzione: un solo core, i risultati non misurano la scalabilità tra worker")
+    print(f"{'worker':>7} {'consegne':>17} {'secondi':>8} {'consegne/s':>11}")
+    for i, workers in enumerate(WORKER_COUNTS):
+        received, expected, elapsed = run(workers, BASE_PORT + i)
+        print(f"{workers:>7} {received:>8}/{expected:<8} {elapsed:>8.2f} {received / elapsed:>11.0f}")
+
+if __name__ == "__main__":
+    main()
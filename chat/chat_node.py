@@ -5,11 +5,66 @@ import time
 import signal
 import sys
 import os
-from datetime import datetime
-from utils.helpers import get_timestamp
-from constants.constants import BUFFER_SIZE
+import contextlib
+from collections import OrderedDict
+from utils.helpers import format_timestamp
+from chat.connection import Connection
+from chat.connection import encode_message
+from chat.dialer import race_connect
+from chat.compression import negotiate_compression
+from chat.console import ConsoleRenderer
+from chat.event_loop import EventLoopServer
+from chat.federation import Federation
+from chat.handshake import HandshakeStage
+from chat.workers import WorkerGroup
+from chat.heartbeat import PhiAccrualDetector
+from chat.history import HistoryStore
+from chat.membership import ClientSnapshot
+from chat.log_writer import ChatLogWriter
+from chat.metrics import ChatMetrics
+from chat.tracing import Tracer
+from chat.transfer import FileTransfers
+from chat.transfer import FILE_MESSAGE_TYPES
+from chat.transport import TRANSPORT_PROFILES
+from chat.outbound import OutboundQueue
+from chat.replay import REPLAYED_TYPES
+from chat.replay import ReplayBuffer
+from chat.replay import sequence_epoch
+from chat.wire import InternTable
+from chat.wire import make_codec
+from chat.wire import negotiate_codec
+from chat.framing import FrameError
+from chat.framing import encode_frame
+from chat.framing import encode_frame_parts
+from chat.framing import HEADER_SIZE
 from constants.constants import DEFAULT_PORT
 from constants.constants import DEFAULT_HOST
+from constants.constants import DEFAULT_SERVER_ENGINE
+from constants.constants import OUTBOUND_HIGH_WATERMARK
+from constants.constants import OUTBOUND_LOW_WATERMARK
+from constants.constants import SLOW_CONSUMER_POLICY
+from constants.constants import WIRE_CODECS
+from constants.constants import COMPRESSION
+from constants.constants import COMPRESSION_THRESHOLD
+from constants.constants import LOG_DIRECTORY
+from constants.constants import HISTORY_DIRECTORY
+from constants.constants import FILE_DIRECTORY
+from constants.constants import HISTORY_PAGE_SIZE
+from constants.constants import REPLAY_BUFFER_SIZE
+from constants.constants import HEARTBEAT_INTERVAL
+from constants.constants import HOT_STANDBY
+from constants.constants import STANDBY_RECONNECT_TIMEOUT
+from constants.constants import STANDBY_RETRY_INTERVAL
+from constants.constants import RECONNECT_TIMEOUT
+from constants.constants import RECONNECT_MAX_BACKOFF
+from constants.constants import SERVER_WORKERS
+from constants.constants import LISTEN_BACKLOG
+from constants.constants import METRICS_ENABLED
+from constants.constants import METRICS_HOST
+from constants.constants import TRACE_FILE
+from constants.constants import TRACE_SAMPLE_RATE
+from constants.constants import CONSOLE_MODE
+from constants.constants import TRANSPORT_PROFILE
 from termcolor import colored   # da installare con "pip install termcolor"
 import colorama                 # da installare con "pip install colorama"
 colorama.init(autoreset=True)   # Inizializza colorama
@@ -17,9 +72,67 @@ colorama.init(autoreset=True)   # Inizializza colorama
 class ChatNode:
     # Costruttore della classe ChatNode.
     # Inizializza le variabili di stato per distinguere tra client e server, gestire connessioni, thread, segnali e promozione.
-    def __init__(self, username, max_connections = 5):
+    def __init__(self, username, max_connections = 5, server_engine = DEFAULT_SERVER_ENGINE,
+                 slow_consumer_policy = SLOW_CONSUMER_POLICY,
+                 outbound_high_watermark = OUTBOUND_HIGH_WATERMARK,
+                 outbound_low_watermark = OUTBOUND_LOW_WATERMARK,
+                 wire_codecs = WIRE_CODECS,
+                 compression = COMPRESSION,
+                 compression_threshold = COMPRESSION_THRESHOLD,
+                 heartbeat_interval = HEARTBEAT_INTERVAL,
+                 hot_standby = HOT_STANDBY,
+                 workers = SERVER_WORKERS,
+                 metrics = METRICS_ENABLED,
+                 trace_file = TRACE_FILE,
+                 trace_sample_rate = TRACE_SAMPLE_RATE,
+                 console = CONSOLE_MODE,
+                 transport = TRANSPORT_PROFILE):
         self.username = username
         self.max_connections = max_connections
+        self.server_engine = server_engine # motore usato in modalità server: "threaded" (un thread per client) o "selector" (event loop)
+        self.transport = TRANSPORT_PROFILES[transport] # opzioni dei socket e unione delle scritture (vedi chat/transport.py)
+
+        # code in uscita verso i client: soglie (in byte) e politica per i client che restano oltre la soglia alta
+        self.slow_consumer_policy = slow_consumer_policy
+        self.outbound_high_watermark = outbound_high_watermark
+        self.outbound_low_watermark = outbound_low_watermark
+
+        # formati di codifica dei messaggi supportati (negoziati nell'handshake) e tabella username <-> uid
+        # usata dal formato binario: il server assegna gli uid, i client li imparano dalla peer list
+        self.wire_codecs = wire_codecs
+        self.intern = InternTable()
+
+        # compressione a flusso per connessione (None per disattivarla) e soglia minima in byte
+        self.compression = compression
+        self.compression_threshold = compression_threshold
+
+        # numerazione degli eventi e buffer di replay per recuperare i messaggi persi durante un failover.
+        # I messaggi inviati come client restano in unacked finché il server non conferma la sequenza assegnata
+        # e vengono reinviati alla riconnessione; sequence_lock rende atomici numerazione e accodamento dei broadcast
+        self.replay = ReplayBuffer()
+        self.sequence_lock = threading.RLock()
+        self.unacked = OrderedDict() # cid -> messaggio inviato e non ancora confermato
+        self.unacked_lock = threading.Lock()
+        self.next_cid = 1
+
+        # heartbeat applicativi in entrambe le direzioni (None per disattivarli): ogni peer stima con un rilevatore
+        # phi accrual se l'altro è ancora vivo, così anche una connessione mezza aperta viene chiusa in tempo limitato
+        self.heartbeat_interval = heartbeat_interval
+        self.server_detector = None # rilevatore del server (lato client)
+        self.next_heartbeat = 0.0   # istante (monotonic) del prossimo heartbeat del server verso i client
+
+        # failover a caldo: il server designa come successore il client più anziano, che tiene già in ascolto
+        # il socket del futuro server; alla caduta si promuove subito e gli altri client vi si collegano senza elezione
+        self.hot_standby = hot_standby
+        self.standby_socket = None # socket di ascolto pronto (solo sul successore)
+
+        # versione della membership: alla connessione il client riceve la peer list completa, poi solo le variazioni
+        # (user_joined/user_left) numerate con [epoca, versione]. L'epoca cambia a ogni nuovo server; un client che
+        # rileva un salto di versione chiede di nuovo la lista completa
+        self.membership_epoch = 0
+        self.membership_version = 0
+        self.membership = None              # [epoca, versione] dell'ultima peer list applicata (lato client)
+        self.membership_pending = False     # lista completa già richiesta al server (lato client)
         
         # modalità dell'utente
         self.is_server = False
@@ -27,17 +140,59 @@ class ChatNode:
         
         # dati per modalità server
         self.server_socket = None
-        self.connected_clients = {} # dizionario con i client connessi: {socket: info}
+        # istantanea immutabile dei client connessi, sostituita per intero a ogni variazione (vedi chat/membership.py):
+        # connected_clients ({socket: info}), clients_by_name (username -> socket, per controlli e messaggi privati
+        # in O(1)) e rooms (stanza -> socket iscritti, per inviare i messaggi solo al loro pubblico) sono sue viste
+        self.clients = ClientSnapshot()
+        self.clients_lock = threading.Lock() # serializza le sostituzioni dell'istantanea
         self.server_running = False # stato del ciclo di accettazione client
+        self.event_loop = None # event loop del server, presente solo con il motore "selector"
+        self.handshake_stage = None # fase di handshake dei client in arrivo, presente solo con il motore "threaded"
         
         # dati per modalità client  
         self.client_socket = None
+        self.server_connection = None # connessione (socket + decoder dei frame) verso il server
         self.connected_to_server = False
         self.server_username = ""
         self.server_host = ""
         self.server_port = 0
         self.peer_list = []
         self.connection_time = 0
+
+        # stanze a cui partecipa l'utente di questo nodo, in qualunque ruolo: un client le dichiara a ogni join,
+        # così dopo un failover il nuovo server ricostruisce l'indice delle stanze senza perdere iscrizioni
+        self.joined_rooms = set()
+        self.current_room = None # stanza in cui vengono inviati i messaggi digitati (None per tutta la chat)
+
+        # federazione con altri server (lato server): gli eventi dei propri client vengono inoltrati ai server collegati
+        # e quelli ricevuti distribuiti ai propri client. Da client si ricordano i server collegati a quello corrente,
+        # così dopo un failover il nuovo server si ricollega alla federazione
+        self.federation = Federation(self)
+        self.federation_endpoints = []
+
+        # trasferimenti di file (comando /send): i file ricevuti vengono salvati nella cartella dell'utente
+        self.files = FileTransfers(self, os.path.join(FILE_DIRECTORY, self.username))
+
+        # server multi-processo: il processo principale (worker 0) avvia altri workers - 1 processi sulla stessa porta
+        # (SO_REUSEPORT), collegati tra loro con il bus della federazione. Il successore designato è scelto dal
+        # processo principale: gli altri worker lo ricevono in shared_successor e lo annunciano ai propri client
+        self.workers = workers
+        self.worker_group = None
+        self.worker_index = 0
+        self.shared_successor = None
+
+        # metriche del nodo (None se disattivate): traffico per tipo, durata dei broadcast, latenza di inoltro,
+        # elezioni e riconnessioni. Backlog dei client e dimensione della membership sono letti solo alla richiesta
+        self.metrics = ChatMetrics(self) if metrics else None
+
+        # tracciamento a span (None se disattivato): una frazione dei messaggi di chat e tutte le elezioni, promozioni
+        # e riconnessioni, scritti in trace_file allo shutdown in formato Chrome trace / Perfetto
+        self.tracer = Tracer(username, trace_file, trace_sample_rate) if trace_file else None
+
+        # console del flusso della chat (messaggi, ingressi, uscite): "async" la scrive da un thread dedicato,
+        # "sync" direttamente dal thread che riceve, "quiet" non la mostra né la formatta (server senza console).
+        # Stato del nodo ed errori vengono sempre stampati
+        self.console = ConsoleRenderer(console) if console != "quiet" else None
         
         self.running = True
         self.promotion_in_progress = False
@@ -58,10 +213,13 @@ class ChatNode:
         signal.signal(signal.SIGINT, self.signal_handler) # gestione del segnale Ctrl+C (SIGINT)
         signal.signal(signal.SIGTERM, self.signal_handler) # estione della terminazione da sistema (SIGTERM)
         
-        # Sistema di logging
-        self.chat_log = []  # lista per memorizzare i messaggi
-        self.log_directory = "chat_logs"  # directory per i file di log
+        # Sistema di logging: le voci vengono scritte su disco in streaming da un thread dedicato
+        self.log_directory = LOG_DIRECTORY  # directory per i file di log
         self.ensure_log_directory()
+        # archivio indicizzato della cronologia, alimentato dal writer del log e interrogabile con query_history
+        self.history = HistoryStore(os.path.join(HISTORY_DIRECTORY, self.username))
+        self.log_writer = ChatLogWriter(self.log_directory, self.username, header_lines=self.log_header_lines,
+                                        history=self.history)
     
     # Funzione che crea la directory per i log se non esiste già
     def ensure_log_directory(self):
@@ -69,80 +227,55 @@ class ChatNode:
         if not os.path.exists(self.log_directory):
             os.makedirs(self.log_directory)
     
-    # Aggiunge un nuovo messaggio alla struttura interna di log
+    # Aggiunge un nuovo messaggio al log: la voce viene accodata al writer in background senza bloccare.
+    # Per i messaggi privati username è la coppia (mittente, destinatario)
     def add_to_log(self, message_type, username, message, timestamp=None):
-        # se non viene fornito un timestamp, genera uno nuovo
+        # se non viene fornito un timestamp, usa l'istante attuale (viene formattato solo quando il log viene scritto)
         if timestamp is None:
-            timestamp = get_timestamp()
-        
-        # creazione un dizionario con tutti i metadati del messaggio
-        log_entry = {
-            'timestamp': timestamp,
-            'type': message_type,
-            'username': username,
-            'message': message
-        }
-        
-        # aggiunge l'entry alla lista interna dei log
-        self.chat_log.append(log_entry)
+            timestamp = time.time()
+        self.log_writer.append(timestamp, message_type, username, message)
+
+    # Mostra una riga del flusso della chat; nei percorsi caldi si controlla self.console prima di formattare la riga,
+    # così in modalità silenziosa non si paga nemmeno la formattazione
+    def display(self, text):
+        if self.console is not None:
+            self.console.show(text)
+
+    # Span del tracciamento sul blocco with (un contesto vuoto se il tracciamento è disattivato).
+    # Senza trace_id lo span appartiene alla categoria "control" (elezioni, promozioni, riconnessioni)
+    def trace_span(self, name, category="control", trace_id=None, **args):
+        if self.tracer is None:
+            return contextlib.nullcontext(args)
+        return self.tracer.span(name, category, trace_id, **args)
+
+    # Registra uno span già misurato a partire da start (istante di time.perf_counter()) fino ad ora
+    def trace_since(self, name, start, category="control", trace_id=None, **args):
+        if self.tracer is not None:
+            self.tracer.record(name, category, start, time.perf_counter(), trace_id, **args)
+
+    # Restituisce una pagina della cronologia archiviata, dai messaggi più recenti.
+    # before è il cursore 'next_before' della pagina precedente; username e contains filtrano per autore e per parola.
+    def query_history(self, limit=HISTORY_PAGE_SIZE, before=None, username=None, contains=None):
+        return self.history.query(limit=limit, before=before, username=username, contains=contains)
+
+    # Righe dell'intestazione di ogni file di log, calcolate quando il file viene aperto
+    def log_header_lines(self):
+        lines = [f"Modalità: {'SERVER' if self.is_server else 'CLIENT'}"]
+        # se è un client, aggiunge le informazioni del server di connessione
+        if self.is_client:
+            lines.append(f"Server: {self.server_username} ({self.server_host}:{self.server_port})")
+        return lines
     
-    # Salva il log completo della chat in un file di testo. Il file viene creato nella directory di log con un nome univoco basato su
-    # username e intervallo temporale della sessione
+    # Completa il log della chat: scrive le voci ancora in coda, chiude il file corrente
+    # (aggiungendo l'orario di fine al nome) e riporta i file salvati durante la sessione
     def save_chat_log(self):
-        # controlla se ci sono messaggi da salvare
-        if not self.chat_log:
+        saved_files = self.log_writer.close()
+        if not saved_files:
             print("Nessun messaggio da salvare nel log.")
             return
-        
-        # Genera nome file con timestamp
-        now = datetime.now() # ottiene il timestamp corrente
-        session_start = datetime.fromtimestamp(self.connection_time if hasattr(self, 'connection_time') else time.time()) # determina l'inizio della sessione: usa connection_time se disponibile, altrimenti il momento attuale
-        
-        # costruisce il nome del file con pattern: chat_log_username_start_to_end.log
-        filename = f"chat_log_{self.username}_{session_start.strftime('%Y%m%d_%H%M%S')}_to_{now.strftime('%Y%m%d_%H%M%S')}.log"
-        # crea il percorso completo combinando directory e nome file
-        filepath = os.path.join(self.log_directory, filename)
-        
-        try:
-            # apre il file in modalità scrittura con codifica UTF-8
-            with open(filepath, 'w', encoding='utf-8') as f:
-                # intestazione del log
-                f.write("="*80 + "\n")
-                f.write(f"CHAT LOG - Utente: {self.username}\n")
-                f.write(f"Sessione: {session_start.strftime('%Y-%m-%d %H:%M:%S')} - {now.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Modalità: {'SERVER' if self.is_server else 'CLIENT'}\n")
-
-                # se è un client, aggiunge le informazioni del server di connessione
-                if self.is_client:
-                    f.write(f"Server: {self.server_username} ({self.server_host}:{self.server_port})\n")
-                f.write("="*80 + "\n\n")
-                
-                # itera attraverso tutti i messaggi nel log
-                for entry in self.chat_log:
-                    # estrae i campi dal dizionario dell'entry
-                    timestamp = entry['timestamp']
-                    msg_type = entry['type']
-                    username = entry['username']
-                    message = entry['message']
-                    
-                    # formatta il messaggio in base al tipo
-                    if msg_type == 'chat_message':
-                        f.write(f"[{timestamp}] {username}: {message}\n")  # messaggio di un client
-                    elif msg_type == 'server_message':
-                        f.write(f"[{timestamp}] {username} (SERVER): {message}\n") # messaggio del server con identificazione specifica
-                    elif msg_type == 'system':
-                        f.write(f"[{timestamp}] >>> {message}\n") # messaggio di sistema (connessioni, disconnessioni, etc.)
-                
-                # footer del log
-                f.write("\n" + "="*80 + "\n")
-                f.write("FINE LOG\n")
-            
+        for filepath in saved_files:
             print(f"Chat salvata in: {filepath}")
 
-        # cattura eventuali errori durante la scrittura    
-        except Exception as e:
-            print(f"Errore nel salvare il log: {e}")
-
     # Funzione che gestisce i segnali di terminazione del processo (es. Ctrl+C).
     # Avvia lo shutdown ordinato del nodo e termina il programma.
     def signal_handler(self, signum, frame):
@@ -170,20 +303,44 @@ class ChatNode:
     # Funzione che avvia il nodo in modalità server.
     # Crea il socket server, lo configura, lo mette in ascolto e avvia il thread per accettare connessioni dai client.
     # Restituisce True se il server viene avviato correttamente, False in caso di errore.
-    def start_as_server(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    # Se indicato, listen_socket è un socket già in ascolto (quello preparato dal successore) e viene usato così com'è.
+    def start_as_server(self, host=DEFAULT_HOST, port=DEFAULT_PORT, listen_socket=None):
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # crea il socket TCP per il server
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # permette il riutilizzo dell'indirizzo
+            if listen_socket is not None:
+                self.server_socket = listen_socket
+                host, port = listen_socket.getsockname()[:2]
+            else:
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # crea il socket TCP per il server
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # permette il riutilizzo dell'indirizzo
+                if self.workers > 1: # porta condivisa con i processi worker
+                    self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                self.server_socket.bind((host, port)) # collega il socket all'host e porta specificati
+                self.transport.apply_listener(self.server_socket) # prima di listen: i client accettati ereditano i buffer
+                # inizia ad ascoltare le connessioni in ingresso: la coda di ascolto deve contenere anche i client
+                # che si riconnettono tutti insieme dopo un failover, non solo max_connections
+                self.server_socket.listen(max(self.max_connections, LISTEN_BACKLOG))
+            if listen_socket is not None:
+                self.transport.apply_listener(self.server_socket)
             self.server_socket.settimeout(1.0) # imposta un timeout per l'accept non bloccante
-            self.server_socket.bind((host, port)) # collega il socket all'host e porta specificati
-            self.server_socket.listen(self.max_connections) # inizia ad ascoltare le connessioni in ingresso
 
             self.is_server = True
             self.is_client = False
             self.server_running = True
+
+            # da server gli uid vengono assegnati da questo nodo, a partire dal proprio username
+            self.intern.clear()
+            self.intern.add(self.username)
+            self.replay.start_epoch() # le sequenze assegnate da questo server seguono quelle già viste
+            self.membership_epoch = sequence_epoch(self.replay.next_seq)
+            self.membership_version = 0
             self.server_host = host
             self.server_port = port
 
+            # un client promosso a server si ricollega ai server federati con quello caduto
+            for endpoint in self.federation_endpoints:
+                if endpoint != (host, port):
+                    self.federation.link(*endpoint)
+
             print("SERVER AVVIATO")
             print(f"Server '{self.username}' in ascolto su {host}:{port}")
             print(f"Massimo {self.max_connections} client consentiti")
@@ -192,9 +349,32 @@ class ChatNode:
             print("Digita i tuoi messaggi per inviarli a tutti i client")
             print("=" * 60)
 
-            accept_thread = threading.Thread(target=self.accept_clients, name="AcceptThread") # crea un thread per accettare client
-            self.add_thread(accept_thread) # registra il thread nella lista gestita
-            accept_thread.start() # avvia il thread per la gestione delle connessioni in entrata
+            # con il motore "selector" un unico event loop gestisce accept, handshake e messaggi di tutti i client,
+            # altrimenti un thread accetta le connessioni, la fase di handshake attende le richieste di join di tutti
+            # i client in arrivo e per ogni client accettato vengono avviati i thread dedicati
+            if self.server_engine == "selector":
+                self.event_loop = EventLoopServer(self)
+                loop_thread = threading.Thread(target=self.event_loop.run, name="EventLoopThread")
+                self.add_thread(loop_thread)
+                loop_thread.start()
+            else:
+                self.handshake_stage = HandshakeStage(self)
+                self.handshake_stage.start()
+                accept_thread = threading.Thread(target=self.accept_clients, name="AcceptThread") # crea un thread per accettare client
+                self.add_thread(accept_thread) # registra il thread nella lista gestita
+                accept_thread.start() # avvia il thread per la gestione delle connessioni in entrata
+
+                # con l'event loop gli heartbeat sono gestiti dal loop stesso, altrimenti da un thread dedicato
+                if self.heartbeat_interval:
+                    heartbeat_thread = threading.Thread(target=self.server_heartbeat_loop, name="HeartbeatThread")
+                    self.add_thread(heartbeat_thread)
+                    heartbeat_thread.start()
+
+            # avvio degli altri processi worker sulla stessa porta
+            if self.workers > 1 and self.worker_index == 0 and self.worker_group is None:
+                self.worker_group = WorkerGroup(self, self.workers)
+                self.worker_group.start()
+                print(f"Avviati {self.workers - 1} processi worker aggiuntivi sulla porta {port}")
 
             return True
 
@@ -211,19 +391,22 @@ class ChatNode:
     # "username_taken" - Nome utente già in uso
     # "connection_failed" - Impossibile connettersi (server non disponibile/porta sbagliata)
     # "error" - Altri errori
-    def connect_as_client(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    # Se indicato, connected_socket è un socket già connesso a host:port (es. vincitore di race_connect).
+    def connect_as_client(self, host=DEFAULT_HOST, port=DEFAULT_PORT, connected_socket=None):
         try:
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Crea socket TCP
-            self.client_socket.settimeout(10.0)  # Imposta timeout per la connessione
-            
-            try:
-                self.client_socket.connect((host, port)) # Tenta la connessione al server
-            except (socket.error, ConnectionRefusedError, OSError) as e: # nel caso di fossero errori di connessione come server non disponibile, porta chiusa, etc. 
-                self.client_socket.close()
-                return "connection_failed"
-            
-            # Disattiva timeout dopo la connessione
-            self.client_socket.settimeout(None)
+            if connected_socket is not None:
+                self.client_socket = connected_socket
+                self.client_socket.settimeout(10.0) # timeout per l'handshake
+            else:
+                self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # Crea socket TCP
+                self.transport.apply(self.client_socket) # opzioni del profilo di trasporto, prima della connessione
+                self.client_socket.settimeout(10.0)  # Imposta timeout per la connessione
+                
+                try:
+                    self.client_socket.connect((host, port)) # Tenta la connessione al server
+                except (socket.error, ConnectionRefusedError, OSError) as e: # nel caso di fossero errori di connessione come server non disponibile, porta chiusa, etc. 
+                    self.client_socket.close()
+                    return "connection_failed"
             
             self.server_host = host
             self.server_port = port
@@ -231,26 +414,65 @@ class ChatNode:
             
             # creazione del messaggio di handshake
             # include il tipo di richiesta, il nome utente e il tempo di connessione
+            # e i formati di codifica supportati, tra cui il server sceglie quello da usare.
+            # Dopo un failover comunica anche l'ultima sequenza vista e i messaggi non ancora confermati
+            with self.unacked_lock:
+                resend = list(self.unacked.values())
             handshake = {
                 'type': 'join_request',
                 'username': self.username,
-                'connection_time': self.connection_time
+                'connection_time': self.connection_time,
+                'codecs': list(self.wire_codecs),
+                'compression': [self.compression] if self.compression else [],
+                'last_seq': self.replay.last_seq or None,
+                'resend': resend,
+                'heartbeat': self.heartbeat_interval,
+                'rooms': sorted(self.joined_rooms),
+                'files': True
             }
             
+            self.server_connection = Connection(self.client_socket)
+            self.server_connection.traffic = self.metrics
+            self.server_connection.timed = self.tracer is not None
+
             try:
-                self.client_socket.send(json.dumps(handshake).encode('utf-8')) # Invio del messaggio di handshake al server
-                response_data = self.client_socket.recv(BUFFER_SIZE).decode('utf-8') # Ricezione della risposta dal server
-                response = json.loads(response_data) # Decodifica della risposta JSON
-            except (socket.error, json.JSONDecodeError) as e: # caso di errore durante l'handshake
+                self.server_connection.send(handshake) # Invio del messaggio di handshake al server
+                response = self.server_connection.receive_one() # Ricezione e decodifica della risposta dal server
+            except (socket.error, ConnectionError, FrameError, json.JSONDecodeError) as e: # caso di errore durante l'handshake
                 self.client_socket.close()
                 return "connection_failed"
             
+            # Disattiva timeout dopo l'handshake: fino alla risposta vale ancora il limite di connessione,
+            # così un server che accetta la connessione ma non risponde (es. successore bloccato) non blocca il client
+            self.client_socket.settimeout(None)
+
             # se la risposta è di tipo 'join_accepted', allora la connessione è riuscita
             if response['type'] == 'join_accepted':
                 self.is_client = True
                 self.connected_to_server = True
                 self.server_username = response['server_username']
                 self.peer_list = response.get('peer_list', [])
+                self.membership = response.get('membership')
+                self.membership_pending = False
+                self.federation_endpoints = [tuple(endpoint) for endpoint in response.get('federation') or ()]
+
+                # da qui in poi i messaggi usano il formato scelto dal server (JSON se il server non ne indica uno)
+                self.intern.clear()
+                self.intern.learn(self.peer_list)
+                self.server_connection.codec = make_codec(response.get('codec', 'json'), self.intern)
+                if response.get('compression'):
+                    self.server_connection.enable_compression(self.compression_threshold)
+                self.update_standby()
+
+                # alla prima connessione gli eventi precedenti non vanno recuperati; se invece questo nodo
+                # ha visto eventi che il nuovo server non ha ricevuto, glieli inoltra perché li distribuisca
+                server_last_seq = response.get('last_seq') or 0
+                if not self.replay.last_seq:
+                    self.replay.set_baseline(server_last_seq)
+                elif self.replay.last_seq > server_last_seq:
+                    events, _ = self.replay.since(server_last_seq)
+                    if events:
+                        self.server_connection.send({'type': 'replay', 'events': events})
                 
                 print("CONNESSO AL SERVER")
                 print(f"Connesso al server '{self.server_username}' su {host}:{port}")
@@ -262,6 +484,15 @@ class ChatNode:
                 receive_thread = threading.Thread(target=self.receive_from_server, name="ReceiveThread") # Thread per ricevere messaggi dal server
                 self.add_thread(receive_thread) # Registra il thread nella lista gestita dal nodo
                 receive_thread.start() # Avvia il thread di ricezione
+
+                # heartbeat attivi solo se anche il server li supporta: il rilevatore usa l'intervallo del server
+                self.server_detector = None
+                if self.heartbeat_interval and response.get('heartbeat'):
+                    self.server_detector = PhiAccrualDetector(response['heartbeat'])
+                    heartbeat_thread = threading.Thread(target=self.client_heartbeat_loop,
+                                                        args=(self.server_connection,), name="HeartbeatThread")
+                    self.add_thread(heartbeat_thread)
+                    heartbeat_thread.start()
                 
                 return "success"
             
@@ -301,86 +532,187 @@ class ChatNode:
             else:
                 return "error"
 
-    # Funzione che gestisce l'accettazione e la registrazione di un nuovo client.
-    # Esegue l'handshake, controlla se l'username è disponibile, aggiorna lo stato del server e avvia il thread di gestione messaggi.
-    def handle_new_client(self, client_socket, client_address):
+    # Funzione che gestisce l'accettazione e la registrazione di un nuovo client (motore a thread).
+    # Riceve dalla fase di handshake la richiesta di join già letta, la fa elaborare da process_join_request e,
+    # se il client viene accettato, avvia il thread di gestione messaggi.
+    def handle_new_client(self, connection, client_address, join_request):
+        client_socket = connection.sock
         try:
-            client_socket.settimeout(10.0)  # timeout per la ricezione dell'handshake
-            join_data = client_socket.recv(BUFFER_SIZE).decode('utf-8') # riceve i dati di join dal client
-            join_request = json.loads(join_data) # decodifica i dati JSON ricevuti
-            client_socket.settimeout(None)  # rimuovi timeout dopo handshake
-            
-            # verifica che il messaggio sia effettivamente una richiesta di join altrimenti chiude la connessione
-            if join_request['type'] != 'join_request':
-                client_socket.close()
-                return
-            
-            client_username = join_request['username']
-            client_connection_time = join_request.get('connection_time', time.time())
-            
-            # verifica se l'username è già in uso
-            if self.is_username_taken(client_username):
-                self.send_to_client(client_socket, { # invia un messaggio di errore al client e chiudo la connessione
-                    'type': 'error',
-                    'message': 'Nome utente già in uso'
-                })
-                client_socket.close()
+            with self.trace_span("handshake", address=f"{client_address[0]}:{client_address[1]}",
+                                 username=join_request.get('username')):
+                # se il client non viene accettato il socket è già stato chiuso
+                accepted = self.process_join_request(connection, client_address, join_request)
+            if not accepted:
                 return
             
-            # registra il nuovo client nella lista dei connessi
-            self.connected_clients[client_socket] = {
-                'username': client_username,
-                'address': client_address,
-                'connection_time': client_connection_time
-            }
-            
-            print(f">>> {client_username} si è connesso ({client_address[0]}:{client_address[1]})")
-            self.show_client_count() # mostra il numero aggiornato di client connessi
-            
-            peer_list = self.get_peer_list_for_client() # recupera la lista dei peer da inviare al nuovo client
-            
-            # invia conferma di connessione al client
-            self.send_to_client(client_socket, {
-                'type': 'join_accepted',
-                'server_username': self.username,
-                'message': f'Client connessi: {len(self.connected_clients)}/{self.max_connections}',
-                'peer_list': peer_list
-            })
-            
-            # informa gli altri client della nuova connessione
-            self.broadcast_to_clients({
-                'type': 'user_joined',
-                'username': client_username,
-                'message': f'{client_username} si è unito alla chat',
-                'peer_list': peer_list
-            }, exclude_socket=client_socket)
-            
             # crea un thread per gestire i messaggi del nuovo client
             client_thread = threading.Thread(
                 target=self.handle_client_messages, 
                 args=(client_socket,),
-                name=f"Client-{client_username}"
+                name=f"Client-{join_request['username']}"
             )
             self.add_thread(client_thread) # registra il thread nella lista attiva
             client_thread.start() # vvvia il thread
 
+            # crea un thread che svuota la coda in uscita del client, così un client lento blocca solo questo thread
+            writer_thread = threading.Thread(
+                target=self.write_to_client,
+                args=(client_socket,),
+                name=f"Writer-{join_request['username']}"
+            )
+            self.add_thread(writer_thread)
+            writer_thread.start()
+
         except Exception as e:
             print(f"Errore nella gestione del nuovo client: {e}")
-            if client_socket in self.connected_clients: # controlla se il client è stato registrato nella lista dei connessi
-                del self.connected_clients[client_socket] # rimozione del riferimento del client per evitare memory leak o errori futuri
+            self.remove_client(client_socket) # rimozione del riferimento del client per evitare memory leak o errori futuri
             try:
                 client_socket.close() # tenta di chiudere il socket per liberare risorse
             except:
                 pass
 
-    # Funzione che costruisce e restituisce la lista dei peer attualmente connessi,
+    # Funzione che elabora la richiesta di join di un client, indipendentemente dal motore del server.
+    # Controlla se l'username è disponibile, registra il client, invia la conferma e notifica gli altri client.
+    # Restituisce True se il client è stato accettato, False altrimenti (in questo caso chiude il socket).
+    def process_join_request(self, connection, client_address, join_request):
+        client_socket = connection.sock
+
+        # un altro server della federazione apre un link: la connessione passa alla federazione
+        if join_request['type'] == 'federation_hello':
+            self.federation.accept(connection, join_request)
+            return False
+
+        # verifica che il messaggio sia effettivamente una richiesta di join altrimenti chiude la connessione
+        if join_request['type'] != 'join_request':
+            client_socket.close()
+            return False
+        
+        client_username = join_request['username']
+        client_connection_time = join_request.get('connection_time', time.time())
+        
+        # verifica se l'username è già in uso
+        if self.is_username_taken(client_username):
+            self.send_to_client(client_socket, { # invia un messaggio di errore al client e chiudo la connessione
+                'type': 'error',
+                'message': 'Nome utente già in uso'
+            })
+            client_socket.close()
+            return False
+        
+        # crea la coda in uscita del client: con l'event loop la scrittura parte quando il socket è scrivibile
+        on_data = None
+        if self.event_loop:
+            on_data = lambda: self.event_loop.want_write(client_socket)
+        # il socket accettato riceve le opzioni del profilo di trasporto; con l'event loop l'unione delle scritture
+        # è gestita dal loop stesso, con i thread dallo scrittore del client tramite la coda
+        self.transport.apply(client_socket)
+        connection.outbound = OutboundQueue(self.outbound_high_watermark, self.outbound_low_watermark,
+                                            self.slow_consumer_policy, on_data,
+                                            coalesce=0.0 if self.event_loop else self.transport.coalesce)
+        connection.traffic = self.metrics
+        connection.timed = self.tracer is not None
+
+        client_info = {
+            'username': client_username,
+            'uid': self.intern.add(client_username),
+            'address': client_address,
+            'connection_time': client_connection_time,
+            'connection': connection,
+            'detector': None,
+            'rooms': set(join_request.get('rooms') or ()),
+            'files': bool(join_request.get('files')) # il client riceve i file inviati con /send
+        }
+        # il client viene sorvegliato con gli heartbeat solo se li invia anche lui
+        if self.heartbeat_interval and join_request.get('heartbeat'):
+            client_info['detector'] = PhiAccrualDetector(join_request['heartbeat'])
+
+        codec_name = negotiate_codec(join_request.get('codecs'), self.wire_codecs)
+        compression = negotiate_compression(join_request.get('compression'), self.compression)
+        
+        # invia conferma di connessione al client (sempre in JSON) e solo dopo passa al formato negoziato.
+        # La conferma e l'eventuale replay vengono accodati prima di registrare il client e sotto sequence_lock,
+        # così nessun broadcast può precederli né cadere tra l'ultima sequenza comunicata e la registrazione
+        # Anche la nuova versione della membership e la sua notifica agli altri client avvengono sotto lo stesso lock,
+        # così le variazioni arrivano a tutti nello stesso ordine delle versioni
+        with self.sequence_lock:
+            # lista completa dei peer per il nuovo client, comprendendo il client stesso
+            membership = self.next_membership_version()
+            snapshot = self.clients
+            peer_list = self.get_peer_list_for_client(extra_client=client_info)
+            connection.send({
+                'type': 'join_accepted',
+                'server_username': self.username,
+                'message': f'Client connessi: {len(self.connected_clients) + 1}/{self.max_connections}',
+                'peer_list': peer_list,
+                'membership': membership,
+                'codec': codec_name,
+                'compression': compression,
+                'last_seq': self.replay.last_seq,
+                'heartbeat': self.heartbeat_interval if client_info['detector'] else None,
+                'federation': self.federation.known_endpoints()
+            })
+            connection.codec = make_codec(codec_name, self.intern)
+            if compression:
+                connection.enable_compression(self.compression_threshold)
+
+            # client che si riconnette dopo un failover: riceve in un unico batch gli eventi successivi
+            # all'ultima sequenza che ha visto (esclusi i propri messaggi, che conosce già)
+            if join_request.get('last_seq'):
+                events, truncated = self.replay.since(join_request['last_seq'], exclude_username=client_username,
+                                                      rooms=client_info['rooms'])
+                if events or truncated:
+                    connection.send({'type': 'replay', 'events': events, 'truncated': truncated})
+
+            # registra il nuovo client nella lista dei connessi, con le iscrizioni dichiarate (es. dopo un failover);
+            # la peer list appena inviata è già quella della nuova versione
+            self.add_client(client_socket, client_info, peer_list, snapshot)
+
+            # informa gli altri client della nuova connessione inviando solo il nuovo peer.
+            # Un join senza last_seq apre una nuova sessione del client, i cui cid ripartono da 1: l'evento lo segnala
+            # (fresh) perché ogni buffer di replay dimentichi i cid delle sessioni precedenti dello stesso utente
+            joined = {
+                'type': 'user_joined',
+                'username': client_username,
+                'message': f'{client_username} si è unito alla chat',
+                'member': self.peer_entry(client_info)
+            }
+            if not join_request.get('last_seq'):
+                joined['fresh'] = True
+            self.broadcast_to_clients(self.membership_delta(joined, membership), exclude_socket=client_socket)
+            self.federation.publish({
+                'type': 'user_joined',
+                'username': client_username,
+                'message': f'{client_username} si è unito alla chat'
+            })
+            if self.worker_group:
+                self.worker_group.announce_successor()
+        
+        self.display(f">>> {client_username} si è connesso ({client_address[0]}:{client_address[1]})")
+        self.show_client_count() # mostra il numero aggiornato di client connessi
+
+        # messaggi che il client aveva inviato senza ricevere conferma (es. al server caduto)
+        for entry in join_request.get('resend') or []:
+            self.handle_client_message(client_socket, client_username,
+                                       {'type': 'chat_message', 'message': entry['message'], 'cid': entry['cid'],
+                                        'room': entry.get('room')})
+        return True
+
+    # Funzione che restituisce la lista dei peer attualmente connessi,
     # ordinati per tempo di connessione. Include il server come primo elemento.
-    def get_peer_list_for_client(self):
+    # La lista viene costruita una sola volta per versione dell'istantanea dei client e poi condivisa:
+    # chi la riceve non deve modificarla.
+    # Se indicato, extra_client viene incluso anche se non è ancora registrato (client in fase di join).
+    def get_peer_list_for_client(self, extra_client=None):
+        snapshot = self.clients
+        if extra_client is None and snapshot.peer_list is not None:
+            return snapshot.peer_list
+
         peer_list = []
         
         # aggiunge il server come primo peer nella lista
         peer_list.append({
             'username': self.username,
+            'uid': self.intern.add(self.username),
             'is_server': True,
             'connection_time': 0,
             'host': self.server_host,
@@ -388,40 +720,80 @@ class ChatNode:
         })
         
         # ordina i client per tempo di connessione crescente
-        clients_sorted = sorted(
-            self.connected_clients.items(),
-            key=lambda x: x[1]['connection_time']
-        )
+        clients = [client_info for _, client_info in snapshot.entries]
+        if extra_client is not None:
+            clients.append(extra_client)
+        clients_sorted = sorted(clients, key=lambda info: info['connection_time'])
         
         # per ogni client connesso aggiunge le informazioni nella lista dei peer
-        for socket, info in clients_sorted:
-            peer_list.append({
-                'username': info['username'],
-                'is_server': False,
-                'connection_time': info['connection_time'],
-                'address': info['address']
-            })
-        
+        for info in clients_sorted:
+            peer_list.append(self.peer_entry(info))
+
+        # nei worker di un server multi-processo il successore è quello scelto dal processo principale
+        if self.hot_standby and self.shared_successor:
+            successor = dict(self.shared_successor, is_server=False, successor=True)
+            peer_list = [peer for peer in peer_list if peer['username'] != successor['username']] + [successor]
+
+        # il client più anziano (lo stesso che vincerebbe l'elezione) è il successore designato;
+        # la porta del suo socket di riserva è nota solo dopo che l'ha comunicata
+        elif self.hot_standby and len(peer_list) > 1:
+            successor = peer_list[1]
+            successor['successor'] = True
+            standby_port = clients_sorted[0].get('standby_port')
+            if standby_port:
+                successor['standby_host'] = clients_sorted[0]['address'][0]
+                successor['standby_port'] = standby_port
+
+        if extra_client is None:
+            snapshot.peer_list = peer_list
         return peer_list
 
+    # Voce della peer list che descrive un client connesso
+    def peer_entry(self, info):
+        return {
+            'username': info['username'],
+            'uid': info['uid'],
+            'is_server': False,
+            'connection_time': info['connection_time'],
+            'address': info['address']
+        }
+
+    # Passa alla versione successiva della membership e restituisce [epoca, versione] (da chiamare sotto sequence_lock)
+    def next_membership_version(self):
+        self.membership_version += 1
+        return [self.membership_epoch, self.membership_version]
+
+    # Completa un evento di variazione della membership con la sua versione e il successore designato
+    def membership_delta(self, event, membership):
+        event['membership'] = membership
+        if self.hot_standby:
+            successor = self.shared_successor or self.current_successor()
+            event['successor'] = successor['username'] if successor else None
+        return event
+
+    # Restituisce le informazioni sul client attualmente designato come successore (lato server)
+    def current_successor(self):
+        return self.clients.successor
+
     # Funzione eseguita in un thread dedicato per ricevere messaggi dal server.
     # Resta in ascolto finché il client è connesso e il sistema non è in shutdown.
     def receive_from_server(self):
         try:
+            self.client_socket.settimeout(1.0) # imposta una sola volta un timeout di 1 secondo per il socket
+
             # cicla finché la connessione è attiva
             while self.connected_to_server and self.running and not self.shutdown_event.is_set():
                 try:
-                    self.client_socket.settimeout(1.0) # imposta un timeout di 1 secondo per il socket
-                    data = self.client_socket.recv(BUFFER_SIZE).decode('utf-8') # riceve e decodifica i dati
-                    self.client_socket.settimeout(None) # rimuove il timeout dopo la ricezione
+                    messages = self.server_connection.receive() # riceve tutti i frame completi disponibili
                     
-                    # se non arriva nulla, il server si è probabilmente disconnesso
-                    if not data:
+                    # se il server ha chiuso la connessione, si è probabilmente disconnesso
+                    if messages is None:
                         print("\nServer disconnesso!")
                         break
                     
-                    message_data = json.loads(data) # converte il messaggio ricevuto in un dizionario
-                    self.process_server_message(message_data) # elabora il messaggio ricevuto dal server
+                    # elabora in ordine tutti i messaggi ricevuti dal server
+                    for message_data in messages:
+                        self.process_server_message(message_data)
                     
                 except socket.timeout:
                     continue  # Continua il loop
@@ -443,64 +815,190 @@ class ChatNode:
     # Funzione che gestisce i messaggi ricevuti dal server.
     # Analizza il tipo di messaggio e agisce di conseguenza: stampa messaggi, aggiorna peer o rileva disconnessione.
     def process_server_message(self, message_data):
+        # trasferimenti di file: blocchi e controllo di flusso non sono eventi numerati
+        if message_data['type'] in FILE_MESSAGE_TYPES:
+            self.files.handle_server_message(message_data)
+            return True
+
+        # evento numerato: viene conservato per un eventuale replay, i duplicati (già ricevuti prima di un failover) si ignorano
+        if 'seq' in message_data and not self.replay.add(message_data, origin=self.server_username):
+            return True
+
         # messaggio di chat da un altro utente quindi stampa il messaggio con timestamp e nome utente
+        if message_data['type'] in ('chat_message', 'server_message') and not self.is_room_visible(message_data.get('room')):
+            return True # messaggio di una stanza da cui l'utente è già uscito
+
         if message_data['type'] == 'chat_message':
-            timestamp = message_data.get('timestamp', get_timestamp())
+            delivered_at = time.perf_counter()
+            timestamp = message_data.get('timestamp') or time.time()
             username = message_data['username']
-            message = message_data['message']
+            message = self.room_label(message_data.get('room')) + message_data['message']
             
             # aggiunta messaggio alla struttura di log (per i client)
             self.add_to_log('chat_message', username, message, timestamp)
             
-            print(f"[{timestamp}] {colored(username, 'yellow')} ha scritto: {message}")
+            if self.console is not None:
+                self.console.show(f"[{format_timestamp(timestamp)}] {colored(username, 'yellow')} ha scritto: {message}")
+            if 'trace' in message_data:
+                self.trace_since("deliver", delivered_at, "message", message_data['trace'], seq=message_data.get('seq'))
         
         # messaggio del server
         elif message_data['type'] == 'server_message':
-            timestamp = message_data.get('timestamp', get_timestamp())
-            message = message_data['message']
+            timestamp = message_data.get('timestamp') or time.time()
+            message = self.room_label(message_data.get('room')) + message_data['message']
+            server_username = message_data.get('username', self.server_username) # nei replay può essere un server precedente
             
             # aggiunta messaggio alla struttura di log (per i server)
-            self.add_to_log('server_message', self.server_username, message, timestamp)
+            self.add_to_log('server_message', server_username, message, timestamp)
             
-            print(f"[{timestamp}] {colored(self.server_username, 'yellow')} ha scritto: {message}")
+            if self.console is not None:
+                self.console.show(f"[{format_timestamp(timestamp)}] {colored(server_username, 'yellow')} ha scritto: {message}")
+
+        # un utente è entrato o uscito da una stanza a cui partecipa anche questo utente
+        elif message_data['type'] == 'room_update':
+            action = "è entrato in" if message_data['action'] == 'join' else "è uscito da"
+            self.display(f">>> {message_data['username']} {action} #{message_data['room']}")
+
+        # messaggio rifiutato per una stanza a cui il server non risulta iscritto questo client: non va reinviato
+        elif message_data['type'] == 'room_error':
+            with self.unacked_lock:
+                self.unacked.pop(message_data.get('cid'), None)
+            self.display(f">>> {message_data['message']}")
         
         # notifica che un nuovo utente si è unito
         elif message_data['type'] == 'user_joined':
-            timestamp = get_timestamp()
+            timestamp = time.time()
             message = message_data['message']
             
             # aggiunta messaggio alla struttura di log (messaggio di sistema)
             self.add_to_log('system', 'SYSTEM', message, timestamp)
             
-            print(f">>> {message}")
-            if 'peer_list' in message_data:
-                self.peer_list = message_data['peer_list']
+            self.display(f">>> {message}")
+            self.apply_membership(message_data)
 
         # notifica che un utente ha lasciato la chat
         elif message_data['type'] == 'user_left':
-            timestamp = get_timestamp()
+            timestamp = time.time()
             message = message_data['message']
             
             # aggiunta messaggio alla struttura di log (messaggio di sistema)
             self.add_to_log('system', 'SYSTEM', message, timestamp)
             
-            print(f">>> {message}")
-            if 'peer_list' in message_data:
-                self.peer_list = message_data['peer_list']
+            self.display(f">>> {message}")
+            self.apply_membership(message_data)
         
         # il server sta chiudendo la chat
         elif message_data['type'] == 'server_shutdown':
-            timestamp = get_timestamp()
+            timestamp = time.time()
             message = message_data['message']
             
             # aggiunta messaggio alla struttura di log (messaggio di sistema)
             self.add_to_log('system', 'SYSTEM', message, timestamp)
             
-            print(f">>> {message}")
+            self.display(f">>> {message}")
             return False
+
+        # messaggio privato da un altro utente (o dal server)
+        elif message_data['type'] == 'direct_message':
+            timestamp = message_data.get('timestamp') or time.time()
+            username = message_data['username']
+            message = message_data['message']
+            self.add_to_log('direct_message', (username, self.username), message, timestamp)
+            if self.console is not None:
+                self.console.show(f"[{format_timestamp(timestamp)}] {colored(username, 'magenta')} (privato): {message}")
+
+        # messaggio privato non consegnato perché il destinatario non è connesso
+        elif message_data['type'] == 'direct_message_failed':
+            self.display(f">>> {message_data['message']}")
+
+        # lista completa dei peer richiesta dopo un salto di versione della membership
+        elif message_data['type'] == 'membership':
+            self.apply_membership(message_data)
+
+        # il successore ha preparato il socket di riserva: si annota dove collegarsi in caso di failover
+        # Con un server multi-processo il successore può essere collegato a un altro processo e mancare dalla peer list
+        elif message_data['type'] == 'successor':
+            entry = None
+            for peer in self.peer_list:
+                if peer['username'] == message_data['username']:
+                    entry = peer
+                peer.pop('successor', None)
+            if entry is None:
+                entry = {'username': message_data['username'], 'is_server': False,
+                         'connection_time': message_data.get('connection_time', 0)}
+                self.peer_list.append(entry)
+            entry['successor'] = True
+            entry['standby_host'] = message_data['standby_host']
+            entry['standby_port'] = message_data['standby_port']
+            self.update_standby()
+
+        # heartbeat del server: aggiorna il rilevatore di guasti
+        elif message_data['type'] == 'heartbeat':
+            if self.server_detector:
+                self.server_detector.heartbeat()
+
+        # conferma di un proprio messaggio: il server gli ha assegnato una sequenza, non serve più reinviarlo
+        elif message_data['type'] == 'ack':
+            with self.unacked_lock:
+                entry = self.unacked.pop(message_data['cid'], None)
+            if entry is not None:
+                self.replay.add({'type': 'chat_message', 'username': self.username, 'message': entry['message'],
+                                 'timestamp': entry['timestamp'], 'cid': entry['cid'], 'seq': message_data['seq']})
+
+        # eventi persi durante una disconnessione, ricevuti in un unico batch alla riconnessione
+        elif message_data['type'] == 'replay':
+            if message_data.get('truncated'):
+                print(">>> Alcuni messaggi inviati durante la disconnessione non sono più disponibili")
+            for event in message_data.get('events', []):
+                self.process_server_message(event)
         
         return True
 
+    # Aggiorna la copia locale della peer list con una lista completa (peer_list) o con una variazione
+    # (user_joined/user_left con la versione della membership). Le variazioni si applicano solo in ordine:
+    # quelle già note si ignorano, un salto di versione fa richiedere al server la lista completa.
+    # Gli eventi ricevuti nei replay non portano la versione e non modificano la peer list.
+    def apply_membership(self, message_data):
+        membership = message_data.get('membership')
+        if 'peer_list' in message_data:
+            self.peer_list = message_data['peer_list']
+            self.intern.learn(self.peer_list)
+            self.membership = membership
+            self.membership_pending = False
+            self.update_standby()
+            return
+        if membership is None:
+            return
+
+        current = self.membership
+        if current is not None and membership[0] == current[0] and membership[1] <= current[1]:
+            return # variazione già inclusa nella peer list
+        if current is None or membership[0] != current[0] or membership[1] != current[1] + 1:
+            if not self.membership_pending:
+                self.membership_pending = True
+                try:
+                    self.server_connection.send({'type': 'membership_request'})
+                except Exception:
+                    pass # la caduta del server verrà gestita dal thread di ricezione
+            return
+
+        username = message_data['username']
+        self.peer_list = [peer for peer in self.peer_list if peer['username'] != username]
+        if message_data['type'] == 'user_joined':
+            member = message_data['member']
+            self.peer_list.append(member)
+            self.intern.learn([member])
+        self.membership = membership
+
+        # il successore designato può cambiare a ogni variazione (es. uscita del client più anziano)
+        if 'successor' in message_data:
+            for peer in self.peer_list:
+                if peer['username'] == message_data['successor']:
+                    peer['successor'] = True
+                else:
+                    peer.pop('successor', None)
+        self.update_standby()
+
     # Funzione chiamata dal client quando rileva che il server si è disconnesso.
     # Avvia la procedura di elezione deterministica tra i client per promuovere un nuovo server.
     def handle_server_disconnect(self):
@@ -508,8 +1006,11 @@ class ChatNode:
             return
         
         print("Server disconnesso, avvio procedura di elezione...")
+        if self.tracer is not None:
+            self.tracer.instant("server_lost", "control", server=self.server_username)
         
         self.connected_to_server = False
+        self.files.connection_lost() # i trasferimenti in corso non proseguono con il nuovo server
         
         # se esiste ancora il socket client tenta di chiuderlo
         if self.client_socket:
@@ -518,9 +1019,110 @@ class ChatNode:
             except:
                 pass # ignora eventuali errori nella chiusura
             self.client_socket = None # rimozione del riferimento al socket client
+
+        # con un successore pronto non serve l'elezione: il successore si promuove subito, gli altri vi si collegano
+        if self.failover_to_successor():
+            return
         
         self.start_leader_election() # avvia la procedura di elezione deterministica per trovare un nuovo server
 
+    # Successore designato nella peer list, se ha già comunicato il proprio socket di riserva
+    def get_successor(self):
+        for peer in self.peer_list:
+            if peer.get('successor') and peer.get('standby_port'):
+                return peer
+        return None
+
+    # Failover senza elezione verso il successore designato. Restituisce False se non c'è un successore pronto
+    # e serve quindi l'elezione classica.
+    def failover_to_successor(self):
+        successor = self.get_successor()
+        if not successor:
+            return False
+
+        if successor['username'] == self.username:
+            if self.standby_socket is None:
+                return False
+            print("Sono il successore designato, promozione immediata a server")
+            if self.tracer is not None:
+                self.tracer.instant("failover", "control", successor=self.username)
+            with self.promotion_lock:
+                if self.promotion_in_progress:
+                    return True
+                self.promotion_in_progress = True
+            self.promote_to_server()
+            return True
+
+        print(f"Collegamento al successore designato {successor['username']}...")
+        if self.tracer is not None:
+            self.tracer.instant("failover", "control", successor=successor['username'])
+        reconnect_thread = threading.Thread(target=self.reconnect_to_successor, args=(successor,), name="ReconnectThread")
+        self.add_thread(reconnect_thread)
+        reconnect_thread.start()
+        return True
+
+    # Si collega al socket di riserva del successore. La connessione viene accettata dal sistema operativo
+    # anche prima che il successore si accorga della caduta del server: il join viene elaborato appena si promuove.
+    # Se il successore non risponde entro STANDBY_RECONNECT_TIMEOUT si ricorre all'elezione classica.
+    def reconnect_to_successor(self, successor):
+        host = successor.get('standby_host') or self.server_host
+        deadline = time.monotonic() + STANDBY_RECONNECT_TIMEOUT
+        while time.monotonic() < deadline and not self.shutdown_event.is_set():
+            if self.metrics is not None:
+                self.metrics.reconnect_attempts.inc()
+            with self.trace_span("reconnect_successor", successor=successor['username']) as span:
+                span['result'] = self.connect_as_client(host, successor['standby_port'])
+            if span['result'] == "success":
+                print(f"Riconnesso al nuovo server {successor['username']}")
+                return
+            time.sleep(STANDBY_RETRY_INTERVAL)
+
+        if not self.shutdown_event.is_set():
+            print("Il successore non risponde, avvio procedura di elezione...")
+            self.peer_list = [peer for peer in self.peer_list if peer['username'] != successor['username']]
+            self.start_leader_election()
+
+    # Chiamata a ogni aggiornamento della peer list: se questo client è il successore designato
+    # prepara il socket di riserva e ne comunica la porta al server, altrimenti chiude quello eventualmente aperto
+    def update_standby(self):
+        entry = None
+        for peer in self.peer_list:
+            if peer.get('successor'):
+                entry = peer
+                break
+
+        if not self.hot_standby or entry is None or entry['username'] != self.username:
+            self.close_standby()
+            return
+
+        if self.standby_socket is None:
+            try:
+                # porta scelta dal sistema sull'interfaccia usata per raggiungere il server: viene annunciata agli altri client
+                standby_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                standby_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                standby_socket.bind((self.client_socket.getsockname()[0], 0))
+                self.transport.apply_listener(standby_socket)
+                standby_socket.listen(max(self.max_connections, LISTEN_BACKLOG))
+                self.standby_socket = standby_socket
+            except OSError as e:
+                print(f"Impossibile preparare il socket di riserva: {e}")
+                return
+
+        port = self.standby_socket.getsockname()[1]
+        if entry.get('standby_port') != port:
+            try:
+                self.server_connection.send({'type': 'standby', 'port': port})
+            except Exception:
+                pass # la caduta del server verrà gestita dal thread di ricezione
+
+    def close_standby(self):
+        if self.standby_socket is not None:
+            try:
+                self.standby_socket.close()
+            except OSError:
+                pass
+            self.standby_socket = None
+
     # Funzione che avvia un'elezione deterministica per scegliere un nuovo server dopo la disconnessione.
     # Ogni client calcola un ID e attende un tempo proporzionale: chi ha l'ID più basso parte per primo.
     def start_leader_election(self):
@@ -531,6 +1133,10 @@ class ChatNode:
             
             self.election_in_progress = True # segnala che un'elezione è in corso
             self.election_start_time = time.time()
+            if self.metrics is not None:
+                self.metrics.elections_started.inc()
+            if self.tracer is not None:
+                self.tracer.instant("election_started", "control")
             
             # genera un ID di elezione basato su dati deterministici,
             # questo assicura che tutti i client arrivino alla stessa conclusione
@@ -603,13 +1209,15 @@ class ChatNode:
     # Se lo è, avvia la procedura di promozione. Altrimenti attende che un altro nodo venga promosso
     # e tenta successivamente la riconnessione.
     def conduct_election(self, delay):
+        started = time.perf_counter()
         try:
             # attende il tempo specificato in modo frazionato (0.1s x 10 step = 1s)
             # per poter uscire in anticipo se il sistema è in spegnimento o l'elezione è stata annullata
-            for _ in range(int(delay * 10)):
-                if self.shutdown_event.is_set() or not self.election_in_progress:
-                    return
-                time.sleep(0.1)
+            with self.trace_span("election_wait", delay=round(delay, 3)):
+                for _ in range(int(delay * 10)):
+                    if self.shutdown_event.is_set() or not self.election_in_progress:
+                        return
+                    time.sleep(0.1)
             
             # recupera il nodo che ha la priorità per diventare server
             next_server = self.get_next_server()
@@ -617,6 +1225,8 @@ class ChatNode:
             # se questo nodo è il candidato con priorità più alta, si promuove a server
             if next_server and next_server['username'] == self.username:
                 print("Sono stato eletto come nuovo server!")
+                if self.metrics is not None:
+                    self.metrics.elections_won.inc()
                 with self.promotion_lock:
                     if not self.promotion_in_progress:
                         self.promotion_in_progress = True
@@ -626,8 +1236,7 @@ class ChatNode:
                 if next_server:
                     print(f"{next_server['username']} è stato eletto come nuovo server")
                 print("Aspetto che il nuovo server si avvii...")
-                time.sleep(3) # aspetta un po' di più prima di tentare la riconnessione
-                self.attempt_reconnection()
+                self.attempt_reconnection() # i tentativi su porte ancora chiuse falliscono subito e vengono ripetuti
         
         # in caso di errore durante l'elezione, mostra l'eccezione
         except Exception as e:
@@ -635,6 +1244,7 @@ class ChatNode:
         finally: # indipendentemente dall'esito, termina lo stato di elezione
             with self.election_lock:
                 self.election_in_progress = False
+            self.trace_since("election", started, election_id=self.my_election_id)
 
     # Determina chi dovrebbe diventare il prossimo server
     def get_next_server(self):
@@ -655,14 +1265,27 @@ class ChatNode:
 
     # Funzione che promuove il nodo corrente a server
     def promote_to_server(self):
+        started = time.perf_counter()
         try:
             print("Avvio promozione a server...")
 
             self.is_client = False
             self.connected_to_server = False
 
+            # successore designato: il socket è già in ascolto e i client vi si stanno già collegando
+            if self.standby_socket is not None:
+                standby_socket, self.standby_socket = self.standby_socket, None
+                with self.trace_span("start_server", standby=True) as span:
+                    span['success'] = self.start_as_server(listen_socket=standby_socket)
+                if span['success']:
+                    print(f"Promozione completata! Server avviato su porta {self.server_port}")
+                    self.publish_unacked()
+                    return
+                print("Socket di riserva non utilizzabile, provo le porte note")
+
             # attende un momento per evitare conflitti con altri peer in fase di elezione
-            time.sleep(2)
+            with self.trace_span("promotion_wait"):
+                time.sleep(2)
 
             # genera una lista di porte da provare, partendo dalla porta attuale
             ports_to_try = [self.server_port] + [self.server_port + i for i in range(1, 6)]
@@ -673,9 +1296,11 @@ class ChatNode:
             # di errore e interrompe l'esecuzione del nodo
             for port in ports_to_try:
                 try:
-                    success = self.start_as_server(self.server_host, port)
+                    with self.trace_span("start_server", port=port) as span:
+                        span['success'] = success = self.start_as_server(self.server_host, port)
                     if success:
                         print(f"Promozione completata! Server avviato su porta {port}")
+                        self.publish_unacked()
                         return
                     else:
                         print(f"Fallito su porta {port}")
@@ -696,77 +1321,155 @@ class ChatNode:
                 self.promotion_in_progress = False
             with self.election_lock:
                 self.election_in_progress = False
+            self.trace_since("promotion", started, port=self.server_port if self.is_server else None)
+
+    # Dopo la promozione i propri messaggi non confermati dal server caduto vengono numerati e distribuiti da questo nodo;
+    # i client che si riconnettono li ricevono con il replay
+    def publish_unacked(self):
+        with self.unacked_lock:
+            pending = list(self.unacked.values())
+            self.unacked.clear()
+        for entry in pending:
+            if self.replay.find_origin(self.username, entry['cid']) is None:
+                event = {
+                    'type': 'chat_message',
+                    'username': self.username,
+                    'message': entry['message'],
+                    'timestamp': entry['timestamp'],
+                    'cid': entry['cid']
+                }
+                if entry.get('room'):
+                    event['room'] = entry['room']
+                self.broadcast_to_clients(event)
+                self.federation.publish(event)
 
     # Tenta di riconnettersi a un nuovo server dopo la disconnessione.
-    # Vengono definiti un numero massimo di tentativi (8) e un tempo di attesa iniziale (2s),
-    # per ogni tentativo il nodo verifica: 
-    #   - se deve uscire dal ciclo e stampa il numero di tentativi
-    #   - se riesce a connettersi (su un set di porte ossia quella originale + 5 successive) allora imposta
-    #   - il flag di elezione a False e termina
-    #   - se tutti i tentativi falliscono, attende un tempo cosi da poter reagire in caso di eventuali eventi di shutdown
-    #   - dopo ogni tentativo fallito aumento questo tempo del 20% cosi da evitare di sovraccaricare la rete o il nuovo server
+    # Il nuovo server può trovarsi sulla porta originale o su una delle 5 successive (vedi promote_to_server):
+    # a ogni giro tutti i candidati vengono provati in parallelo con race_connect, a partire dal successore
+    # designato se noto, e si esegue il join sul primo che accetta la connessione.
+    # Se nessuno risponde si riprova dopo un'attesa che parte da 0.1s e cresce del 50% fino a RECONNECT_MAX_BACKOFF,
+    # finché non trascorrono RECONNECT_TIMEOUT secondi; a quel punto il nodo interrompe l'esecuzione.
     def attempt_reconnection(self):
-        max_attempts = 8    # numero massimo di tentativi di riconnessione
-        base_wait = 2       # tempo di attesa iniziale (in secondi) tra i tentativi
-        
-        for attempt in range(max_attempts):
+        deadline = time.monotonic() + RECONNECT_TIMEOUT
+        wait = 0.1
+        attempt = 0
+
+        while time.monotonic() < deadline:
             if (self.shutdown_event.is_set() or 
                 self.promotion_in_progress or 
                 self.connected_to_server):
                 return
-                
-            print(f"Tentativo riconnessione {attempt + 1}/{max_attempts}")
-            
-            # genera una lista di porte da provare per la riconnessione (porta originale + 5 successive)
-            ports_to_try = [self.server_port] + [self.server_port + i for i in range(1, 6)]
-            
-            for port in ports_to_try:
-                try:
-                    # tenta la connessione a ciascuna porta disponibile
-                    if self.connect_as_client(self.server_host, port):
-                        print(f"Riconnesso al server sulla porta {port}!")
-                        with self.election_lock:
-                            self.election_in_progress = False # disattiva lo stato di elezione una volta connesso
-                        return
-                except:
-                    continue
+
+            attempt += 1
+            if self.metrics is not None:
+                self.metrics.reconnect_attempts.inc()
+            endpoints = [(self.server_host, self.server_port + i) for i in range(6)]
+            successor = self.get_successor()
+            if successor and successor['username'] != self.username:
+                endpoints.insert(0, (successor.get('standby_host') or self.server_host, successor['standby_port']))
+
+            with self.trace_span("reconnect_attempt", attempt=attempt, endpoints=len(endpoints)) as span:
+                sock, endpoint = race_connect(endpoints, prepare=self.transport.apply)
+                span['result'] = "no_endpoint"
+                if sock is not None:
+                    span['port'] = endpoint[1]
+                    span['result'] = self.connect_as_client(endpoint[0], endpoint[1], connected_socket=sock)
+            if sock is not None:
+                if span['result'] == "success":
+                    print(f"Riconnesso al server sulla porta {endpoint[1]} (tentativo {attempt})")
+                    with self.election_lock:
+                        self.election_in_progress = False # disattiva lo stato di elezione una volta connesso
+                    return
             
-            # attende prima del prossimo tentativo, verificando lo stato ogni 100ms
-            for _ in range(int(base_wait * 10)):
+            # attende prima del prossimo giro, verificando lo stato ogni 50ms
+            resume = time.monotonic() + wait
+            while time.monotonic() < resume:
                 if (self.shutdown_event.is_set() or 
                     self.promotion_in_progress or 
                     self.connected_to_server):
                     return
-                time.sleep(0.1)
-            
-            # aumenta progressivamente il tempo di attesa tra i tentativi, fino a un massimo di 8s
-            base_wait = min(base_wait * 1.2, 8)
+                time.sleep(0.05)
+            wait = min(wait * 1.5, RECONNECT_MAX_BACKOFF)
         
         # se tutti i tentativi falliscono, interrompe l'esecuzione del nodo
         print("Impossibile riconnettersi dopo tutti i tentativi")
         self.running = False
 
+    # Intervallo tra due controlli dei rilevatori: abbastanza frequente da non ritardare il rilevamento
+    def heartbeat_check_interval(self):
+        return min(0.25, self.heartbeat_interval / 4)
+
+    # Ciclo del client: invia un heartbeat al server a ogni intervallo e controlla che il server sia ancora vivo.
+    # Se il server non risponde chiude il socket: il thread di ricezione rileva la chiusura e avvia l'elezione.
+    # Termina quando la connessione sorvegliata non è più quella attuale (es. dopo una riconnessione).
+    def client_heartbeat_loop(self, connection):
+        detector = self.server_detector
+        next_heartbeat = 0.0
+        while (self.connected_to_server and self.server_connection is connection
+               and not self.shutdown_event.wait(self.heartbeat_check_interval())):
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                next_heartbeat = now + self.heartbeat_interval
+                try:
+                    connection.send({'type': 'heartbeat'})
+                except Exception:
+                    pass # l'errore verrà rilevato dal thread di ricezione
+
+            if not detector.is_available(now):
+                print(f"\nIl server non risponde da {detector.silence(now):.1f} secondi")
+                try:
+                    connection.sock.shutdown(socket.SHUT_RDWR) # sblocca il thread di ricezione
+                except OSError:
+                    pass
+                return
+
+    # Ciclo degli heartbeat del server con il motore a thread
+    def server_heartbeat_loop(self):
+        while self.server_running and not self.shutdown_event.wait(self.heartbeat_check_interval()):
+            self.server_heartbeat_tick()
+
+    # Invia l'heartbeat a tutti i client quando è il momento e disconnette quelli che non ne inviano più.
+    # Chiamata periodicamente dal thread degli heartbeat o dall'event loop.
+    def server_heartbeat_tick(self):
+        now = time.monotonic()
+        if now >= self.next_heartbeat:
+            self.next_heartbeat = now + self.heartbeat_interval
+            self.broadcast_to_clients({'type': 'heartbeat'})
+
+        for client_socket, client_info in self.clients.entries:
+            detector = client_info.get('detector')
+            if detector and not detector.is_available(now):
+                print(f">>> {client_info['username']} non risponde da {detector.silence(now):.1f} secondi")
+                self.disconnect_client(client_socket)
+
     # Funzione eseguita in un thread separato per accettare connessioni dai client.
     # Rimane in ascolto fino a quando il server è attivo e non è stato avviato lo shutdown
     def accept_clients(self):
+        stage = self.handshake_stage
         # cicla finché il server è attivo e non è in fase di spegnimento
         while self.server_running and self.running and not self.shutdown_event.is_set():
+            # la fase di handshake è piena: le nuove connessioni attendono nella coda di ascolto
+            if not stage.reserve(timeout=1.0):
+                continue
             try:
                 client_socket, client_address = self.server_socket.accept() # Accetta una nuova connessione da un client
-
-                # se è stato raggiunto il numero massimo di connessioni rifiuta la connessione altrimenti gestisce il nuovo client
-                if len(self.connected_clients) >= self.max_connections: 
-                    self.reject_client(client_socket, client_address)
-                else:
-                    self.handle_new_client(client_socket, client_address)
-
             except socket.timeout:
+                stage.release()
                 continue  # timeout scaduto, continua il ciclo per accettare nuovi client
             except Exception as e:
+                stage.release()
                 if not self.shutdown_event.is_set(): # evita di stampare l'errore se il server sta chiudendo normalmente
                     print(f"Errore accettazione client: {e}")
                 break
 
+            # se è stato raggiunto il numero massimo di connessioni rifiuta la connessione,
+            # altrimenti la passa alla fase di handshake senza attendere la richiesta di join
+            if len(self.connected_clients) + stage.pending() >= self.max_connections:
+                stage.release()
+                self.reject_client(client_socket, client_address)
+            else:
+                stage.submit(client_socket, client_address)
+
     # Funzione (eseguita dal server) che gestisce la ricezione e la redistribuzione dei messaggi da parte di un singolo client.
     # Resta in ascolto fino a quando il server è attivo, il client è connesso, e non è in corso uno shutdown.
     def handle_client_messages(self, client_socket):
@@ -777,40 +1480,26 @@ class ChatNode:
             return
         
         client_username = client_info['username']
+        connection = client_info['connection']
         
         try:
+            # timeout impostato una sola volta: evita che il recv() blocchi il thread per sempre se il client smette di inviare,
+            # senza pagare due chiamate settimeout per ogni ricezione
+            client_socket.settimeout(1.0)
+
             # ciclo finché il server e il client sono attivi. Mantiene il thread in ascolto continuo finché server e client sono attivi
             while (self.server_running and self.running and 
                    client_socket in self.connected_clients and 
                    not self.shutdown_event.is_set()):
                 
                 try:
-                    client_socket.settimeout(1.0) # imposta timeout per evitare blocchi lunghi, evita che il recv() blocchi il thread per sempre se il client smette di inviare
-                    data = client_socket.recv(BUFFER_SIZE).decode('utf-8') # riceve e decodifica i dati
-                    client_socket.settimeout(None) # rimuove il timeout dopo la ricezione
+                    messages = connection.receive() # riceve tutti i frame completi disponibili
                     
-                    if not data: # se non arriva nulla, il client è disconnesso quindi in pratica rileva la disconnessione del client
+                    if messages is None: # il client ha chiuso la connessione quindi in pratica rileva la disconnessione del client
                         break
                     
-                    message_data = json.loads(data) # decodifica il messaggio inviato dal client
-                    
-                    # gestisce solo i messaggi di tipo "chat_message"
-                    if message_data['type'] == 'chat_message':
-                        timestamp = get_timestamp()
-                        message_text = message_data['message']
-
-                        # aggiunge il messaggio alla struttura di log (dal server per i client)
-                        self.add_to_log('chat_message', client_username, message_text, timestamp)
-                        
-                        print(f"[{timestamp}] {colored(client_username, 'yellow')} ha scritto: {message_text}")
-                        
-                        # invia il messaggio a tutti gli altri client
-                        self.broadcast_to_clients({
-                            'type': 'chat_message',
-                            'username': client_username,
-                            'message': message_text,
-                            'timestamp': timestamp
-                        }, exclude_socket=client_socket)
+                    for message_data in messages:
+                        self.handle_client_message(client_socket, client_username, message_data)
                 
                 except socket.timeout:
                     continue # timeout scattato ma nessun dato ricevuto in 1 secondo, ma la connessione è ancora valida. Continua il ciclo
@@ -828,34 +1517,203 @@ class ChatNode:
             # rimuove il client dalla lista quando si disconnette
             self.disconnect_client(client_socket)
 
+    # Funzione (eseguita dal server con il motore a thread) che svuota la coda in uscita di un singolo client.
+    # Se la scrittura fallisce il client viene disconnesso.
+    def write_to_client(self, client_socket):
+        client_info = self.connected_clients.get(client_socket)
+        if not client_info:
+            return
+        outbound = client_info['connection'].outbound
+
+        try:
+            while (self.server_running and self.running and
+                   client_socket in self.connected_clients and
+                   not outbound.closed):
+                outbound.write_blocking(client_socket)
+        except Exception:
+            pass # errore di scrittura: il client viene trattato come disconnesso
+        finally:
+            self.disconnect_client(client_socket)
+
+    # Funzione che elabora un singolo messaggio ricevuto da un client, condivisa da entrambi i motori del server.
+    def handle_client_message(self, client_socket, client_username, message_data):
+        # gestisce solo i messaggi di tipo "chat_message"
+        if message_data['type'] == 'chat_message':
+            received_at = time.perf_counter()
+            trace_id = None
+            if self.tracer is not None: # traccia scelta dal mittente, oppure campionata qui per i client che non tracciano
+                trace_id = message_data.get('trace') or self.tracer.sample()
+            cid = message_data.get('cid')
+
+            # messaggio reinviato dopo un failover ma già numerato: basta confermarlo di nuovo
+            if cid is not None:
+                seq = self.replay.find_origin(client_username, cid)
+                if seq is not None:
+                    self.send_to_client(client_socket, {'type': 'ack', 'cid': cid, 'seq': seq})
+                    return
+
+            # un messaggio di una stanza è accettato solo da un suo iscritto
+            room = message_data.get('room')
+            if room is not None and client_socket not in self.rooms.get(room, ()):
+                self.send_to_client(client_socket, {
+                    'type': 'room_error',
+                    'room': room,
+                    'cid': cid,
+                    'message': f"Non partecipi a #{room}: usa /join {room}"
+                })
+                return
+
+            timestamp = time.time()
+            message_text = message_data['message']
+
+            # il server mostra e registra il messaggio solo se il suo utente partecipa alla stanza
+            if self.is_room_visible(room):
+                # aggiunge il messaggio alla struttura di log (dal server per i client)
+                self.add_to_log('chat_message', client_username, self.room_label(room) + message_text, timestamp)
+                
+                if self.console is not None:
+                    self.console.show(f"[{format_timestamp(timestamp)}] {colored(client_username, 'yellow')} ha scritto: "
+                                      f"{self.room_label(room)}{message_text}")
+            if trace_id is not None:
+                self.trace_since("log", received_at, "message", trace_id)
+            
+            # invia il messaggio a tutti gli altri client (o ai soli iscritti della stanza)
+            event = {
+                'type': 'chat_message',
+                'username': client_username,
+                'message': message_text,
+                'timestamp': timestamp
+            }
+            if cid is not None:
+                event['cid'] = cid
+            if room is not None:
+                event['room'] = room
+            if trace_id is not None:
+                event['trace'] = trace_id
+            self.broadcast_to_clients(event, exclude_socket=client_socket)
+            if trace_id is not None:
+                broadcast_at = time.perf_counter()
+            self.federation.publish(event)
+            if self.metrics is not None:
+                self.metrics.relay_latency.observe(time.perf_counter() - received_at)
+            if trace_id is not None:
+                self.trace_relay(client_socket, trace_id, received_at, broadcast_at, seq=event['seq'])
+
+            # conferma al mittente la sequenza assegnata
+            if cid is not None:
+                self.send_to_client(client_socket, {'type': 'ack', 'cid': cid, 'seq': event['seq']})
+
+        # trasferimenti di file: offerte, blocchi da inoltrare e avanzamento dei destinatari
+        elif message_data['type'] in FILE_MESSAGE_TYPES:
+            self.files.handle_client_message(client_socket, client_username, message_data)
+
+        # iscrizione o uscita da una stanza
+        elif message_data['type'] == 'join_room':
+            self.add_room_member(client_socket, message_data['room'])
+        elif message_data['type'] == 'leave_room':
+            self.remove_room_member(client_socket, message_data['room'])
+
+        # messaggio privato: viene inoltrato solo al destinatario
+        elif message_data['type'] == 'direct_message':
+            self.route_direct_message(client_socket, client_username, message_data['to'], message_data['message'])
+
+        # il client ha perso una variazione della membership: riceve la lista completa con la versione attuale
+        elif message_data['type'] == 'membership_request':
+            with self.sequence_lock:
+                self.send_to_client(client_socket, {
+                    'type': 'membership',
+                    'peer_list': self.get_peer_list_for_client(),
+                    'membership': [self.membership_epoch, self.membership_version]
+                })
+
+        # il successore comunica la porta del proprio socket di riserva, che viene annunciata a tutti i client
+        elif message_data['type'] == 'standby':
+            client_info = self.connected_clients.get(client_socket)
+            if client_info:
+                client_info['standby_port'] = message_data['port']
+                self.refresh_clients() # la porta compare nella peer list
+                if self.current_successor() is client_info:
+                    self.broadcast_to_clients({
+                        'type': 'successor',
+                        'username': client_username,
+                        'standby_host': client_info['address'][0],
+                        'standby_port': message_data['port']
+                    })
+                    if self.worker_group:
+                        self.worker_group.announce_successor()
+
+        # heartbeat del client: aggiorna il suo rilevatore di guasti
+        elif message_data['type'] == 'heartbeat':
+            client_info = self.connected_clients.get(client_socket)
+            if client_info and client_info['detector']:
+                client_info['detector'].heartbeat()
+
+        # eventi del server precedente che questo nodo non aveva ricevuto, inoltrati da un client riconnesso
+        elif message_data['type'] == 'replay':
+            for event in message_data.get('events', []):
+                if self.replay.contains(event['seq']):
+                    continue
+                self.process_server_message(event)
+                self.broadcast_to_clients(event, exclude_socket=client_socket)
+
+    # Span di un messaggio di chat tracciato sul server: lettura dal socket e decodifica (dell'intero gruppo di frame
+    # arrivati con la stessa lettura), inoltro ai server federati e l'intero percorso dalla ricezione all'inoltro.
+    # La lettura si misura solo con l'event loop, dove il socket è già leggibile: con i thread includerebbe l'attesa
+    def trace_relay(self, client_socket, trace_id, received_at, broadcast_at, **args):
+        client_info = self.connected_clients.get(client_socket)
+        read_times = client_info['connection'].read_times if client_info else None
+        if read_times is not None and read_times[2] <= received_at:
+            started, read, decoded, batch = read_times
+            if self.event_loop is not None:
+                self.tracer.record("recv", "message", started, read, trace_id, batch=batch)
+            self.tracer.record("decode", "message", read, decoded, trace_id, batch=batch)
+        if self.federation.links:
+            self.trace_since("federation", broadcast_at, "message", trace_id)
+        self.trace_since("relay", received_at, "message", trace_id, **args)
+
     # Gestisce la disconnessione di un client dal server
     def disconnect_client(self, client_socket):
-        # controlla se il socket è effettivamente presente nella lista dei client connessi
-        if client_socket in self.connected_clients:
-            client_info = self.connected_clients[client_socket]
+        # rimuove il client dalla lista dei connessi, se è effettivamente presente: la rimozione è atomica,
+        # quindi se più thread rilevano la stessa disconnessione solo uno la annuncia
+        client_info = self.remove_client(client_socket)
+        if client_info is not None:
             client_username = client_info['username']
 
-            # rimuove il client dalla lista dei connessi
-            del self.connected_clients[client_socket]
+            # chiude la coda in uscita del client
+            if client_info['connection'].outbound:
+                client_info['connection'].outbound.close()
+
+            # con il motore a event loop il socket va rimosso dal selettore prima di essere chiuso
+            if self.event_loop:
+                self.event_loop.unregister(client_socket)
+
+            # i file che stava inviando vengono annullati, quelli che stava ricevendo non gli vengono più inoltrati
+            self.files.client_disconnected(client_socket)
 
             # controllo per vedere se il server non è in fase di shutdown
             if not self.shutdown_event.is_set():
                 self.add_to_log('system', 'SYSTEM', f'{client_username} ha lasciato la chat')
 
                 # se non è in corso lo shutdown, stampa un messaggio di disconnessione e mostro il numero aggiornato di client connessi
-                print(f">>> {client_username} si è disconnesso")
+                self.display(f">>> {client_username} si è disconnesso")
                 self.show_client_count()
                 
-                # aggiorna la peer list da inviare agli altri client
-                peer_list = self.get_peer_list_for_client()
-                
-                # invia un messaggio di broadcast a tutti i peer per notificare la disconnessione
-                self.broadcast_to_clients({
-                    'type': 'user_left',
-                    'username': client_username,
-                    'message': f'{client_username} ha lasciato la chat',
-                    'peer_list': peer_list
-                })
+                # invia un messaggio di broadcast a tutti i peer per notificare la disconnessione:
+                # basta il nome del client uscito, ognuno aggiorna la propria copia della peer list
+                with self.sequence_lock:
+                    membership = self.next_membership_version()
+                    self.broadcast_to_clients(self.membership_delta({
+                        'type': 'user_left',
+                        'username': client_username,
+                        'message': f'{client_username} ha lasciato la chat'
+                    }, membership))
+                    self.federation.publish({
+                        'type': 'user_left',
+                        'username': client_username,
+                        'message': f'{client_username} ha lasciato la chat'
+                    })
+                    if self.worker_group:
+                        self.worker_group.announce_successor()
         
         try:
             client_socket.close() # chiude il socket del client in modo sicuro
@@ -889,49 +1747,279 @@ class ChatNode:
         
         # se chi ha invocato questa funzione è il server, allora invia il messaggio a tutti i client
         if self.is_server:
-            # se non ci sono client connessi non invia il messaggio e segnala che non ci sono client connessi
-            if not self.connected_clients:
+            # se non ci sono client connessi (né server federati) non invia il messaggio e lo segnala
+            if not self.connected_clients and not self.federation.links:
                 print("Nessun client connesso!")
                 return False
             
-            timestamp = get_timestamp()
+            timestamp = time.time()
 
             # registra nel log locale del server il messaggio inviato
-            self.add_to_log('server_message', self.username, message, timestamp)
+            self.add_to_log('server_message', self.username, self.room_label(self.current_room) + message, timestamp)
 
-            # messaggio da inviare a tutti i client
-            self.broadcast_to_clients({
+            # messaggio da inviare a tutti i client (o agli iscritti della stanza corrente)
+            event = {
                 'type': 'server_message',
                 'message': message,
                 'timestamp': timestamp
-            })
-            print(f"{colored('Hai scritto', 'blue')}: {message}")
+            }
+            if self.current_room is not None:
+                event['room'] = self.current_room
+            trace_id = self.tracer.sample() if self.tracer is not None else None
+            if trace_id is not None:
+                event['trace'] = trace_id
+            self.broadcast_to_clients(event)
+            self.federation.publish(dict(event, username=self.username))
+            self.display(f"{colored('Hai scritto', 'blue')}: {self.room_label(self.current_room)}{message}")
             return True
         
-        # se chi ha invocato questa funzione è il client ed è connesso al server, allora invia il messaggio al server
-        elif self.is_client and self.connected_to_server:
-            try:
-                timestamp = get_timestamp()
-                # registra nel log locale del client il messaggio che sta per inviare
-                self.add_to_log('chat_message', self.username, message, timestamp)
+        # se chi ha invocato questa funzione è il client, invia il messaggio al server. Il messaggio resta tra quelli
+        # non confermati finché il server non ne conferma la sequenza: se il server cade viene reinviato alla riconnessione
+        elif self.is_client:
+            timestamp = time.time()
+            room = self.current_room
+            # registra nel log locale del client il messaggio che sta per inviare
+            self.add_to_log('chat_message', self.username, self.room_label(room) + message, timestamp)
+
+            with self.unacked_lock:
+                cid = self.next_cid
+                self.next_cid += 1
+                self.unacked[cid] = {'cid': cid, 'message': message, 'timestamp': timestamp}
+                if room is not None:
+                    self.unacked[cid]['room'] = room
+                if len(self.unacked) > REPLAY_BUFFER_SIZE:
+                    self.unacked.popitem(last=False)
 
+            # durante un failover il messaggio verrà inviato al nuovo server
+            if not self.connected_to_server:
+                self.display(f"{colored('Hai scritto', 'blue')}: {self.room_label(room)}{message} (verrà inviato alla riconnessione)")
+                return True
+            try:
                 # crea il messaggio da inviare al server
                 message_data = {
                     'type': 'chat_message',
-                    'message': message
+                    'message': message,
+                    'cid': cid
                 }
-                self.client_socket.send(json.dumps(message_data).encode('utf-8')) # invia il messaggio al server
-                print(f"{colored('Hai scritto', 'blue')}: {message}")
+                if room is not None:
+                    message_data['room'] = room
+                trace_id = self.tracer.sample() if self.tracer is not None else None
+                if trace_id is not None:
+                    message_data['trace'] = trace_id
+                sent_at = time.perf_counter()
+                self.server_connection.send(message_data) # invia il messaggio al server
+                if trace_id is not None:
+                    self.trace_since("send", sent_at, "message", trace_id, cid=cid)
+                self.display(f"{colored('Hai scritto', 'blue')}: {self.room_label(room)}{message}")
                 return True
             # se c'è un errore nell'invio del messaggio, stampa l'errore
             except Exception as e:
-                print(f"Errore nell'invio del messaggio: {e}")
+                print(f"Errore nell'invio del messaggio (verrà reinviato alla riconnessione): {e}")
                 return False
         # se il nodo non è né server né client connesso
         else:
             print("Non connesso a nessuna chat!")
             return False
 
+    # Invia un file (comando /send) ai partecipanti della stanza corrente, o a tutta la chat, in background:
+    # la chat resta utilizzabile durante il trasferimento
+    def send_file(self, path):
+        if self.shutdown_event.is_set():
+            return False
+        return self.files.send(path, self.current_room)
+
+    # Etichetta mostrata davanti ai messaggi di una stanza
+    def room_label(self, room):
+        return f"[#{room}] " if room else ""
+
+    # I messaggi senza stanza sono per tutta la chat; quelli di una stanza solo per chi vi partecipa
+    def is_room_visible(self, room):
+        return room is None or room in self.joined_rooms
+
+    # Entra in una stanza (comando /join), che diventa quella in cui vengono inviati i messaggi digitati.
+    # Un client lo comunica al server se connesso; in ogni caso la stanza viene dichiarata al prossimo join.
+    def join_room(self, room):
+        room = room.lstrip('#')
+        if not room:
+            return False
+        self.current_room = room
+        if room in self.joined_rooms:
+            print(f"Messaggi inviati in #{room}")
+            return True
+        self.joined_rooms.add(room)
+        print(f"Sei entrato in #{room}: i tuoi messaggi verranno inviati solo ai partecipanti")
+
+        if self.is_server:
+            self.broadcast_to_clients({'type': 'room_update', 'room': room, 'username': self.username, 'action': 'join'})
+        elif self.is_client and self.connected_to_server:
+            try:
+                self.server_connection.send({'type': 'join_room', 'room': room})
+            except Exception:
+                pass # la stanza verrà dichiarata alla riconnessione
+        return True
+
+    # Esce da una stanza (comando /leave), per default quella corrente; i messaggi tornano a tutta la chat
+    def leave_room(self, room=None):
+        room = (room or self.current_room or '').lstrip('#')
+        if room not in self.joined_rooms:
+            print("Non partecipi a nessuna stanza con questo nome")
+            return False
+        self.joined_rooms.discard(room)
+        if self.current_room == room:
+            self.current_room = None
+        print(f"Sei uscito da #{room}")
+
+        if self.is_server:
+            self.broadcast_to_clients({'type': 'room_update', 'room': room, 'username': self.username, 'action': 'leave'})
+        elif self.is_client and self.connected_to_server:
+            try:
+                self.server_connection.send({'type': 'leave_room', 'room': room})
+            except Exception:
+                pass
+        return True
+
+    # Iscrive un client a una stanza nell'indice del server e lo notifica ai partecipanti (lui compreso).
+    # Modifiche all'indice e invii avvengono sotto sequence_lock, come i broadcast che lo leggono.
+    def add_room_member(self, client_socket, room):
+        with self.sequence_lock:
+            client_info = self.connected_clients.get(client_socket)
+            if client_info is None or room in client_info['rooms']:
+                return
+            client_info['rooms'].add(room)
+            self.add_room_index(room, client_socket)
+            self.broadcast_to_clients({'type': 'room_update', 'room': room,
+                                       'username': client_info['username'], 'action': 'join'})
+        if room in self.joined_rooms:
+            self.display(f">>> {client_info['username']} è entrato in #{room}")
+
+    def remove_room_member(self, client_socket, room):
+        with self.sequence_lock:
+            client_info = self.connected_clients.get(client_socket)
+            if client_info is None or room not in client_info['rooms']:
+                return
+            client_info['rooms'].discard(room)
+            self.discard_room_member(room, client_socket)
+            self.broadcast_to_clients({'type': 'room_update', 'room': room,
+                                       'username': client_info['username'], 'action': 'leave'})
+        if room in self.joined_rooms:
+            self.display(f">>> {client_info['username']} è uscito da #{room}")
+
+    # Funzione che invia un messaggio privato a un solo utente (comando /msg).
+    # Il server lo consegna direttamente al socket del destinatario, un client lo invia al server che lo inoltra.
+    # I messaggi privati non vengono numerati né conservati per il replay: durante un failover non vengono reinviati.
+    def send_direct_message(self, recipient, message):
+        if self.shutdown_event.is_set():
+            return False
+        if recipient == self.username:
+            print("Non puoi inviare un messaggio privato a te stesso")
+            return False
+
+        timestamp = time.time()
+        if self.is_server:
+            client_socket = self.clients_by_name.get(recipient)
+            if client_socket is not None:
+                self.send_to_client(client_socket, {
+                    'type': 'direct_message',
+                    'username': self.username,
+                    'message': message,
+                    'timestamp': timestamp
+                })
+            elif recipient in self.federation.remote_members: # utente di un altro server della federazione
+                self.federation.publish({
+                    'type': 'direct_message',
+                    'username': self.username,
+                    'to': recipient,
+                    'message': message,
+                    'timestamp': timestamp
+                })
+            else:
+                print(f"{recipient} non è connesso")
+                return False
+
+        elif self.is_client and self.connected_to_server:
+            try:
+                self.server_connection.send({'type': 'direct_message', 'to': recipient, 'message': message})
+            except Exception as e:
+                print(f"Errore nell'invio del messaggio privato: {e}")
+                return False
+
+        else:
+            print("Non connesso a nessuna chat!")
+            return False
+
+        self.add_to_log('direct_message', (self.username, recipient), message, timestamp)
+        self.display(f"{colored(f'Hai scritto a {recipient}', 'blue')}: {message}")
+        return True
+
+    # Inoltra (lato server) un messaggio privato al destinatario cercandone il socket nell'indice dei nomi,
+    # senza passare dal broadcast; un destinatario collegato a un altro server viene raggiunto tramite la federazione.
+    # Se il destinatario non è connesso lo segnala al mittente
+    def route_direct_message(self, sender_socket, sender, recipient, message):
+        timestamp = time.time()
+        if recipient == self.username:
+            self.add_to_log('direct_message', (sender, recipient), message, timestamp)
+            self.display(f"[{format_timestamp(timestamp)}] {colored(sender, 'magenta')} (privato): {message}")
+            return
+
+        client_socket = self.clients_by_name.get(recipient)
+        if client_socket is None and recipient in self.federation.remote_members:
+            self.federation.publish({
+                'type': 'direct_message',
+                'username': sender,
+                'to': recipient,
+                'message': message,
+                'timestamp': timestamp
+            })
+            return
+        if client_socket is None:
+            self.send_to_client(sender_socket, {
+                'type': 'direct_message_failed',
+                'to': recipient,
+                'message': f"{recipient} non è connesso"
+            })
+            return
+
+        self.send_to_client(client_socket, {
+            'type': 'direct_message',
+            'username': sender,
+            'message': message,
+            'timestamp': timestamp
+        })
+
+    # Consegna ai client di questo server un evento ricevuto da un altro server della federazione.
+    # L'evento viene mostrato anche all'utente del server e numerato con le sequenze locali dal broadcast.
+    # Un messaggio privato va solo al destinatario, se è collegato qui; restituisce True se è stato consegnato
+    def deliver_remote_event(self, event):
+        # successore designato dal processo principale di un server multi-processo (solo sul bus)
+        if event['type'] == 'successor':
+            self.shared_successor = event['designated']
+            self.refresh_clients()
+            if self.shared_successor:
+                self.broadcast_to_clients(dict(self.shared_successor, type='successor'))
+            return True
+
+        if event['type'] == 'direct_message':
+            recipient = event['to']
+            if recipient == self.username:
+                self.add_to_log('direct_message', (event['username'], recipient), event['message'], event['timestamp'])
+                self.display(f"[{format_timestamp(event['timestamp'])}] {colored(event['username'], 'magenta')} (privato): "
+                             f"{event['message']}")
+                return True
+            client_socket = self.clients_by_name.get(recipient)
+            if client_socket is None:
+                return False
+            self.send_to_client(client_socket, {
+                'type': 'direct_message',
+                'username': event['username'],
+                'message': event['message'],
+                'timestamp': event['timestamp']
+            })
+            return True
+
+        self.process_server_message(event)
+        self.broadcast_to_clients(dict(event))
+        return False
+
     # Funzione che invia un messaggio a tutti i client connessi.
     # Se specificato, può escludere un socket (utile ad esempio per non reinviare il messaggio al mittente).
     def broadcast_to_clients(self, message_data, exclude_socket=None):
@@ -939,27 +2027,66 @@ class ChatNode:
         if not self.is_server:
             return
         
-        message = json.dumps(message_data) # serializza il dizionario in formato JSON
+        # serializza il dizionario una sola volta per ciascun formato in uso: header e payload sono buffer immutabili
+        # condivisi da tutti i destinatari con lo stesso codec, che li accodano senza copiarli;
+        # la scrittura vettoriale li invia poi insieme agli altri frame in coda
+        frames = {}
         disconnected_clients = [] # lista per tenere traccia dei client disconnessi
-        
-        # itera sui socket dei client connessi
-        for client_socket in list(self.connected_clients.keys()):
-            if client_socket != exclude_socket: # esclude eventualmente un socket specifico (es. mittente)
-                try:
-                    client_socket.send(message.encode('utf-8')) # invio del messaggio codificato in UTF-8
-                except:
-                    disconnected_clients.append(client_socket) # registra client da disconnettere in caso di errore
+        started = time.perf_counter()
+        delivered = sent_bytes = 0
+
+        # numerazione e accodamento avvengono sotto lo stesso lock: ogni client riceve gli eventi in ordine di sequenza
+        with self.sequence_lock:
+            if message_data['type'] in REPLAYED_TYPES and 'seq' not in message_data:
+                self.replay.stamp(message_data, origin=self.username)
+
+            # un messaggio di una stanza raggiunge solo i suoi iscritti: il costo dipende dal pubblico, non dai client connessi
+            # l'istantanea dei client non cambia durante l'iterazione: nessuna copia
+            snapshot = self.clients
+            room = message_data.get('room')
+            if room is None:
+                recipients = snapshot.entries
+            else:
+                clients = snapshot.clients
+                recipients = [(client_socket, clients[client_socket]) for client_socket in snapshot.rooms.get(room, ())]
+
+            # itera sui destinatari
+            for client_socket, client_info in recipients:
+                if client_socket != exclude_socket: # esclude eventualmente un socket specifico (es. mittente)
+                    try:
+                        connection = client_info['connection']
+                        encoded = frames.get(connection.codec.name)
+                        if encoded is None:
+                            payload = connection.codec.encode(message_data)
+                            encoded = frames[connection.codec.name] = (payload, encode_frame_parts(payload))
+                        connection.send_shared(*encoded) # accodamento del frame condiviso (o compresso per questa connessione)
+                        delivered += 1
+                        sent_bytes += len(encoded[0])
+                    except:
+                        disconnected_clients.append(client_socket) # registra client da disconnettere in caso di errore
+
+        if self.metrics is not None:
+            self.metrics.broadcast_duration.observe(time.perf_counter() - started)
+            if delivered:
+                self.metrics.sent(message_data['type'], sent_bytes + delivered * HEADER_SIZE, delivered)
+        if self.tracer is not None and 'trace' in message_data:
+            self.trace_since("broadcast", started, "message", message_data['trace'], recipients=delivered,
+                             seq=message_data.get('seq'))
 
         # Itera sui client disconnessi  e li rimuove dalla lista dei client connessi
         for client_socket in disconnected_clients:
             self.disconnect_client(client_socket)
 
     # Funzione che invia un messaggio a un singolo client tramite il socket specificato.
-    # Il messaggio viene convertito in JSON e inviato come stringa codificata.
+    # Il messaggio viene convertito in JSON e inviato come frame; se il client è già registrato
+    # si usa la sua connessione, così l'invio è serializzato con gli altri thread.
     def send_to_client(self, client_socket, message_data):
         try:
-            message = json.dumps(message_data)
-            client_socket.send(message.encode('utf-8'))
+            client_info = self.connected_clients.get(client_socket)
+            if client_info:
+                client_info['connection'].send(message_data)
+            else:
+                client_socket.sendall(encode_frame(encode_message(message_data)))
         except Exception as e:
             print(f"Errore nell'invio al client: {e}")
 
@@ -968,17 +2095,111 @@ class ChatNode:
     def is_username_taken(self, username):
         if username == self.username: # controllo per verificare se il nome utente corrisponde a quello del server
             return True
-        
-        # itera sulle informazioni di tutti i client connessi
-        for client_info in self.connected_clients.values():
-            if client_info['username'] == username:
-                return True
-        return False
+        # ricerca diretta nell'indice dei nomi e tra gli utenti degli altri server della federazione
+        return username in self.clients_by_name or username in self.federation.remote_members
+
+    # Usernames dei client collegati a questo server, compreso il server stesso (comunicati agli altri server federati)
+    def local_usernames(self):
+        return [self.username, *self.clients_by_name]
+
+    # Utenti nella chat visti da questo nodo (metrica chat_membership_size)
+    def membership_size(self):
+        if self.is_server:
+            return 1 + len(self.connected_clients) + len(self.federation.remote_members)
+        return len(self.peer_list)
+
+    # Byte in coda verso ciascun client (metrica chat_client_outbound_backlog_bytes)
+    def outbound_backlog(self):
+        backlog = {}
+        for _, client_info in self.clients.entries:
+            outbound = client_info['connection'].outbound
+            backlog[client_info['username']] = outbound.queued_bytes if outbound else 0
+        return backlog
+
+    # Avvia l'endpoint locale delle metriche in formato Prometheus; restituisce la porta o None se non disponibile
+    def serve_metrics(self, port, host=METRICS_HOST):
+        if self.metrics is None:
+            return None
+        try:
+            port = self.metrics.serve(host, port)
+        except OSError as e:
+            print(f"Endpoint delle metriche non avviato sulla porta {port}: {e}")
+            return None
+        print(f"Metriche disponibili su http://{host}:{port}/metrics")
+        return port
+
+    # Scrive la traccia raccolta finora (comando trace e shutdown)
+    def export_trace(self):
+        if self.tracer is None:
+            print("Tracciamento disattivato")
+            return None
+        try:
+            path = self.tracer.export()
+        except OSError as e:
+            print(f"Impossibile scrivere la traccia: {e}")
+            return None
+        print(f"Traccia salvata in {path}")
+        return path
+
+    # Comando stats: riepilogo delle metriche a console
+    def show_stats(self):
+        if self.metrics is None:
+            print("Metriche disattivate")
+            return
+        for line in self.metrics.summary():
+            print(f"  {line}")
+
+    # Viste in sola lettura dell'istantanea corrente dei client (vedi ClientSnapshot)
+    @property
+    def connected_clients(self):
+        return self.clients.clients
+
+    @property
+    def clients_by_name(self):
+        return self.clients.by_name
+
+    @property
+    def rooms(self):
+        return self.clients.rooms
+
+    # Registra un client e pubblica la nuova istantanea. Se indicata, peer_list è la lista già costruita per il
+    # nuovo client a partire dall'istantanea base: diventa quella della nuova versione se nel frattempo non è cambiata
+    def add_client(self, client_socket, client_info, peer_list=None, base=None):
+        with self.clients_lock:
+            snapshot = self.clients.with_client(client_socket, client_info)
+            if peer_list is not None and base is self.clients:
+                snapshot.peer_list = peer_list
+            self.clients = snapshot
+
+    # Rimuove un client dalla lista dei connessi e dagli indici; restituisce le sue informazioni (o None)
+    def remove_client(self, client_socket):
+        with self.clients_lock:
+            client_info = self.clients.clients.get(client_socket)
+            self.clients = self.clients.without_client(client_socket)
+        return client_info
+
+    def add_room_index(self, room, client_socket):
+        with self.clients_lock:
+            if client_socket in self.clients.clients:
+                self.clients = self.clients.with_room_member(room, client_socket)
+
+    def discard_room_member(self, room, client_socket):
+        with self.clients_lock:
+            self.clients = self.clients.without_room_member(room, client_socket)
+
+    # Nuova versione dell'istantanea con gli stessi client (invalida la peer list condivisa)
+    def refresh_clients(self):
+        with self.clients_lock:
+            self.clients = self.clients.refreshed()
+
+    def clear_clients(self):
+        with self.clients_lock:
+            self.clients = ClientSnapshot(version=self.clients.version + 1)
 
     # Funzione che mostra il numero di client attualmente connessi al server.
     def show_client_count(self):
         if self.is_server:
-            print(f"Client connessi: {len(self.connected_clients)}/{self.max_connections}")
+            self.display(f"Client connessi: {len(self.connected_clients)}/{self.max_connections}")
 
     def list_connected_users(self):
         if self.is_server:
@@ -988,9 +2209,30 @@ class ChatNode:
                 print("Client connessi:")
                 for client_info in self.connected_clients.values():
                     print(f"  • {client_info['username']} ({client_info['address'][0]}:{client_info['address'][1]})")
+            for username, server_id in sorted(self.federation.remote_members.items()):
+                print(f"  • {username} (server {server_id})")
         elif self.is_client:
             print(f"Connesso al server: {self.server_username}")
 
+    # Chiusura improvvisa del server (es. caduta di un processo worker): i client non vengono avvisati
+    # e avviano il failover come per un crash, poi il nodo termina
+    def abort_server(self):
+        self.server_running = False
+        for client_socket, _ in self.clients.entries:
+            self.remove_client(client_socket)
+            try:
+                client_socket.shutdown(socket.SHUT_RDWR)
+                client_socket.close()
+            except OSError:
+                pass
+        self.federation.close()
+        if self.server_socket:
+            try:
+                self.server_socket.close()
+            except OSError:
+                pass
+        self.running = False
+
     # Funzione che gestisce lo spegnimento ordinato del nodo, sia esso server o client.
     # Chiude connessioni, ferma i thread attivi e libera le risorse.
     def shutdown(self):
@@ -1022,13 +2264,25 @@ class ChatNode:
                 except:
                     pass
             
-            # chiude tutte le connessioni client
-            for client_socket in list(self.connected_clients.keys()):
+            # chiude tutte le connessioni client, dopo aver provato a consegnare quanto resta nelle code in uscita
+            for client_socket, client_info in self.clients.entries:
+                try:
+                    outbound = client_info['connection'].outbound
+                    if outbound:
+                        outbound.close()
+                        outbound.flush(client_socket)
+                except:
+                    pass
                 try:
                     client_socket.close()
                 except:
                     pass
-            self.connected_clients.clear()  # svuota il dizionario dei client connessi
+            self.clear_clients() # svuota la lista dei client connessi e gli indici
+
+            # gli eventuali processi worker avvisano a loro volta i propri client e terminano
+            if self.worker_group:
+                self.worker_group.stop()
+            self.federation.close()
             
             # se il socket del server esiste chiude il socket del server
             if self.server_socket:
@@ -1045,8 +2299,17 @@ class ChatNode:
                     self.client_socket.close()
                 except:
                     pass
+            self.close_standby()
         
+        self.files.close() # ferma gli invii ed elimina i file ricevuti solo in parte
+        if self.metrics is not None:
+            self.metrics.close() # ferma l'endpoint delle metriche, se avviato
+        if self.tracer is not None:
+            self.export_trace()
+
         # pulisce e termina tutti i thread attivi
         self.cleanup_threads()
+        if self.console is not None:
+            self.console.close() # scrive le ultime righe ancora in coda
         
         print("Disconnesso.")
\ No newline at end of file
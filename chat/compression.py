@@ -0,0 +1,51 @@
+import zlib
+from constants.constants import COMPRESSION_LEVEL
+from constants.constants import COMPRESSION_THRESHOLD
+
+# Compressione a flusso per connessione, negoziata nell'handshake (campo 'compression').
+# Ogni direzione della connessione usa un unico contesto zlib che resta vivo per tutta la sessione:
+# chiavi ripetute, nomi utente e peer list già visti vengono compressi come riferimenti ai messaggi precedenti.
+# Ogni payload è preceduto da un byte che indica se è compresso; i messaggi sotto la soglia
+# viaggiano in chiaro e non toccano il contesto.
+
+ALGORITHM = "zlib"
+
+RAW = b'\x00'
+DEFLATED = b'\x01'
+SYNC_TAIL = b'\x00\x00\xff\xff' # coda fissa prodotta da Z_SYNC_FLUSH: non viene trasmessa e si ricostruisce in ricezione
+
+# Lato invio: comprime i payload mantenendo il dizionario tra un messaggio e l'altro
+class StreamCompressor:
+    def __init__(self, threshold=COMPRESSION_THRESHOLD, level=COMPRESSION_LEVEL):
+        self.threshold = threshold
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def compress(self, payload):
+        self.bytes_in += len(payload)
+        if len(payload) < self.threshold:
+            data = RAW + payload
+        else:
+            compressed = self.compressor.compress(payload) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+            if compressed.endswith(SYNC_TAIL):
+                compressed = compressed[:-len(SYNC_TAIL)]
+            data = DEFLATED + compressed
+        self.bytes_out += len(data)
+        return data
+
+# Lato ricezione: i payload devono essere decompressi nello stesso ordine in cui sono stati compressi
+class StreamDecompressor:
+    def __init__(self):
+        self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def decompress(self, data):
+        if data[:1] == RAW:
+            return data[1:]
+        return self.decompressor.decompress(data[1:] + SYNC_TAIL)
+
+# Sceglie (lato server) l'algoritmo di compressione, solo se entrambe le parti lo abilitano
+def negotiate_compression(offered, supported):
+    if supported and offered and supported in offered:
+        return supported
+    return None
@@ -0,0 +1,204 @@
+import socket
+import threading
+import time
+from collections import deque
+from chat.framing import FrameDecoder
+from chat.compression import StreamCompressor
+from chat.compression import StreamDecompressor
+from chat.framing import encode_frame_parts
+from chat.framing import encode_data_frame_parts
+from chat.framing import encode_data_frame_header
+from chat.framing import CHUNK_HEADER
+from chat.framing import HEADER_SIZE
+from chat.outbound import SlowConsumerError
+from chat.outbound import POLICY_DISCONNECT
+from chat.wire import JSON_CODEC
+
+# Funzione che serializza un messaggio (dizionario) nel payload JSON da inserire in un frame
+def encode_message(message_data):
+    return JSON_CODEC.encode(message_data)
+
+# Funzione che ricostruisce il messaggio (dizionario) a partire dal payload JSON di un frame
+def decode_message(payload):
+    return JSON_CODEC.decode(payload)
+
+# Classe che rappresenta una connessione TCP con un peer (server o client).
+# Incapsula il socket, il decoder dei frame in ricezione e il lock che serializza gli invii,
+# così che più thread possano scrivere sullo stesso socket senza mescolare i frame.
+# Il codec (JSON o binario) e l'eventuale compressione sono negoziati durante l'handshake
+# e valgono per entrambe le direzioni.
+class Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.pending = deque()              # payload già ricevuti ma non ancora consegnati (decodificati alla consegna)
+        self.codec = JSON_CODEC             # formato dei messaggi; l'handshake avviene sempre in JSON
+        self.compressor = None              # contesti di compressione (uno per direzione), se negoziata
+        self.decompressor = None
+        self.send_lock = threading.RLock()
+        self.outbound = None                # coda in uscita (OutboundQueue), usata dal server per i client registrati
+        self.traffic = None                 # metriche (ChatMetrics) in cui contare messaggi e byte per tipo, se attive
+        self.timed = False                  # misura lettura e decodifica di ogni receive() (tracciamento attivo)
+        self.read_times = None              # (inizio lettura, fine lettura, fine decodifica, messaggi) dell'ultima receive()
+
+    # Invia un frame già costruito (bytes oppure tupla header/payload) in modo completo.
+    # Se la connessione ha una coda in uscita il frame viene solo accodato e il chiamante non si blocca mai sul socket.
+    def send_frame(self, frame):
+        if self.outbound is not None:
+            if not self.outbound.put(frame):
+                raise SlowConsumerError("Client troppo lento: coda in uscita oltre la soglia")
+            return
+        if isinstance(frame, tuple):
+            frame = b''.join(frame)
+        with self.send_lock:
+            self.sock.sendall(frame)
+
+    # Invia un frame di dati (blocco di un file) già costruito; con la coda in uscita viene accodato con priorità
+    # inferiore ai messaggi, così la chat non attende dietro ai blocchi
+    def send_data(self, payload):
+        frame = encode_data_frame_parts(payload)
+        if self.traffic is not None:
+            self.traffic.sent('file_data', len(payload) + HEADER_SIZE)
+        if self.outbound is not None:
+            self.outbound.put_bulk(frame)
+            return
+        with self.send_lock:
+            self.sock.sendall(frame[0])
+            self.sock.sendall(payload)
+
+    # Invia length byte di un file a partire da offset come frame di dati: i byte passano dal file al socket
+    # con sendfile, senza essere letti in memoria. Solo per connessioni senza coda in uscita (lato client).
+    # Il lock viene tenuto per un solo blocco: i messaggi di chat si inseriscono tra un blocco e l'altro
+    def send_file_chunk(self, file, transfer_id, offset, length):
+        if self.traffic is not None:
+            self.traffic.sent('file_data', CHUNK_HEADER.size + length + HEADER_SIZE)
+        with self.send_lock:
+            self.sock.sendall(encode_data_frame_header(transfer_id, offset, length))
+            file.seek(offset)
+            end = offset + length
+            while file.tell() < end:
+                position = file.tell()
+                try:
+                    sent = self.sock.sendfile(file, position, end - position)
+                except socket.timeout:
+                    continue # socket con timeout (thread di ricezione): sendfile lascia il file dopo i byte inviati
+                if not sent:
+                    # file accorciato durante l'invio: il frame viene completato con zeri per non rompere lo stream,
+                    # i destinatari lo scarteranno al controllo di integrità
+                    self.sock.sendall(bytes(end - position))
+                    break
+
+    # Attiva la compressione a flusso su entrambe le direzioni della connessione
+    # I frame vengono compressi prima di essere accodati con un unico contesto zlib: scartarne uno dalla coda
+    # renderebbe illeggibili tutti i successivi, quindi un client lento viene disconnesso anche con "drop_oldest"
+    def enable_compression(self, threshold):
+        self.compressor = StreamCompressor(threshold)
+        self.decompressor = StreamDecompressor()
+        if self.outbound is not None:
+            self.outbound.policy = POLICY_DISCONNECT
+
+    # Serializza con il codec della connessione e invia un messaggio
+    def send(self, message_data):
+        payload = self.codec.encode(message_data)
+        if self.traffic is not None:
+            self.traffic.sent(message_data['type'], len(payload) + HEADER_SIZE)
+        self.send_payload(payload)
+
+    # Invia un payload già serializzato. Con la compressione attiva, compressione e accodamento
+    # avvengono sotto lo stesso lock: il contesto zlib richiede che i frame partano nell'ordine di compressione.
+    def send_payload(self, payload):
+        if self.compressor is None:
+            self.send_frame(encode_frame_parts(payload))
+            return
+        with self.send_lock:
+            self.send_frame(encode_frame_parts(self.compressor.compress(payload)))
+
+    # Invia un payload condiviso tra più destinatari (broadcast): senza compressione si riusa il frame
+    # già costruito, altrimenti il payload viene compresso con il contesto di questa connessione
+    def send_shared(self, payload, frame):
+        if self.compressor is None:
+            self.send_frame(frame)
+        else:
+            self.send_payload(payload)
+
+    # Decodifica un payload ricevuto, decomprimendolo prima se necessario
+    def decode(self, payload):
+        if self.decompressor is not None:
+            payload = self.decompressor.decompress(payload)
+        return self.codec.decode(payload)
+
+    # Messaggio che rappresenta un frame di dati; il blocco del file è payload[CHUNK_HEADER.size:]
+    def decode_data(self, payload):
+        transfer_id, offset = CHUNK_HEADER.unpack_from(payload)
+        if self.traffic is not None:
+            self.traffic.received('file_data', len(payload) + HEADER_SIZE)
+        return {'type': 'file_data', 'transfer': transfer_id, 'offset': offset, 'payload': payload}
+
+    # Decodifica i payload di una lettura: i frame di dati non passano dal codec
+    def decode_all(self, payloads, decode):
+        return [decode(payload) if payload.__class__ is bytes else self.decode_data(payload) for payload in payloads]
+
+    # Come decode, ma conta il messaggio nelle metriche della connessione
+    def decode_counted(self, payload):
+        if self.decompressor is not None:
+            payload = self.decompressor.decompress(payload)
+        message_data = self.codec.decode(payload)
+        self.traffic.received(message_data['type'], len(payload) + HEADER_SIZE)
+        return message_data
+
+    # Esegue una lettura dal socket e restituisce la lista dei messaggi completi ricevuti
+    # (eventualmente vuota se è arrivata solo una parte di un frame).
+    # Restituisce None se il peer ha chiuso la connessione.
+    def receive(self):
+        if self.traffic is not None:
+            decode = self.decode_counted
+        else:
+            decode = self.codec.decode if self.decompressor is None else self.decode
+        if self.pending:
+            payloads = list(self.pending)
+            self.pending.clear()
+            self.read_times = None
+            return self.decode_all(payloads, decode)
+
+        if self.timed:
+            return self.receive_timed(decode)
+        if self.decoder.read_from(self.sock) == 0:
+            return None
+        return self.decode_all(self.decoder.frames(), decode)
+
+    # Variante di receive che registra in read_times la durata della lettura e quella della decodifica
+    def receive_timed(self, decode):
+        started = time.perf_counter()
+        if self.decoder.read_from(self.sock) == 0:
+            return None
+        read = time.perf_counter()
+        messages = self.decode_all(self.decoder.frames(), decode)
+        self.read_times = (started, read, time.perf_counter(), len(messages))
+        return messages
+
+    # Attende e restituisce un singolo messaggio (usato durante l'handshake).
+    # Gli eventuali frame successivi arrivati nella stessa lettura restano in coda non decodificati,
+    # così vengono interpretati con il codec scelto dall'handshake alla prossima chiamata a receive().
+    def receive_one(self):
+        while not self.pending:
+            if self.decoder.read_from(self.sock) == 0:
+                raise ConnectionError("Connessione chiusa dal peer")
+            self.pending.extend(self.decoder.frames())
+        return self.decode(self.pending.popleft())
+
+    # Variante di receive_one per l'event loop: esegue al massimo una lettura e restituisce
+    # il primo messaggio se è già completo, altrimenti None
+    def try_receive_one(self):
+        if not self.pending:
+            if self.decoder.read_from(self.sock) == 0:
+                raise ConnectionError("Connessione chiusa dal peer")
+            self.pending.extend(self.decoder.frames())
+        if not self.pending:
+            return None
+        return self.decode(self.pending.popleft())
+
+    def close(self):
+        try:
+            self.sock.close()
+        except:
+            pass
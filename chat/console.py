@@ -0,0 +1,67 @@
+import sys
+import threading
+from collections import deque
+from constants.constants import CONSOLE_QUEUE_SIZE
+
+# Console della chat separata dal percorso di rete.
+# Le righe da mostrare (messaggi, ingressi e uscite) vengono solo accodate: un thread dedicato le scrive, unendo
+# tutte quelle arrivate nel frattempo in un'unica write, così un terminale lento o una pipe piena rallentano
+# soltanto la console e non l'inoltro dei messaggi agli altri client.
+# La coda è limitata: quando la console resta indietro le righe in eccesso vengono scartate e sostituite
+# da un riepilogo con il loro numero.
+# Con mode "sync" le righe vengono scritte subito dal thread chiamante (comportamento precedente).
+class ConsoleRenderer:
+    def __init__(self, mode="async", max_pending=CONSOLE_QUEUE_SIZE, stream=None):
+        self.max_pending = max_pending
+        self.stream = stream    # None per sys.stdout al momento della scrittura (es. anche se reindirizzato)
+        self.lines = deque()
+        self.dropped = 0        # righe scartate dall'ultima scrittura
+        self.total_dropped = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.thread = None
+        if mode == "async":
+            self.thread = threading.Thread(target=self.run, name="ConsoleRenderer", daemon=True)
+            self.thread.start()
+
+    def show(self, text):
+        if self.thread is None or self.closed:
+            print(text, file=self.stream or sys.stdout)
+            return
+        with self.condition:
+            if len(self.lines) >= self.max_pending:
+                self.dropped += 1
+                self.total_dropped += 1
+                return
+            self.lines.append(text)
+            if len(self.lines) == 1:
+                self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.lines and not self.closed:
+                    self.condition.wait()
+                if not self.lines and self.closed:
+                    return
+                lines, self.lines = self.lines, deque()
+                dropped, self.dropped = self.dropped, 0
+            if dropped:
+                lines.append(f"... {dropped} righe non mostrate: la console non teneva il passo")
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except (OSError, ValueError):
+                pass # console chiusa o non più scrivibile: la chat continua comunque
+
+    # Scrive le righe ancora in coda e ferma il thread (attendendo al più timeout secondi);
+    # le righe mostrate dopo la chiusura vengono scritte direttamente
+    def close(self, timeout=1.0):
+        if self.thread is None:
+            return
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join(timeout)
+        self.thread = None
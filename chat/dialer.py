@@ -0,0 +1,78 @@
+import errno
+import selectors
+import socket
+import time
+from constants.constants import RECONNECT_ATTEMPT_TIMEOUT
+from constants.constants import RECONNECT_STAGGER
+
+# Connessione "happy eyeballs" (RFC 8305) verso più endpoint candidati.
+# Invece di provarli uno alla volta, ciascuno con un timeout lungo, avvia un tentativo non bloccante
+# ogni RECONNECT_STAGGER secondi (o subito, se il tentativo precedente è già fallito) e tiene aperti
+# in parallelo tutti quelli in corso: vince la prima connessione completata, le altre vengono chiuse.
+# Un endpoint che rifiuta costa quindi un solo RTT e uno che non risponde (pacchetti scartati)
+# non blocca gli altri, ma viene abbandonato dopo RECONNECT_ATTEMPT_TIMEOUT secondi.
+# Se indicata, prepare viene chiamata su ogni socket prima della connect (es. opzioni del profilo di trasporto).
+# Restituisce (socket connesso e bloccante, endpoint) oppure (None, None) se nessun candidato risponde.
+def race_connect(endpoints, stagger=RECONNECT_STAGGER, attempt_timeout=RECONNECT_ATTEMPT_TIMEOUT, prepare=None):
+    selector = selectors.DefaultSelector()
+    pending = {}    # socket -> (endpoint, scadenza) dei tentativi in corso
+    remaining = list(endpoints)
+    next_start = time.monotonic()
+    winner = None
+
+    try:
+        while winner is None and (remaining or pending):
+            now = time.monotonic()
+
+            # avvia il prossimo tentativo se è trascorso lo sfasamento o se non ce n'è nessuno in corso
+            if remaining and (now >= next_start or not pending):
+                endpoint = remaining.pop(0)
+                next_start = now + stagger
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                if prepare is not None:
+                    prepare(sock)
+                sock.setblocking(False)
+                result = sock.connect_ex(endpoint)
+                if result == 0:
+                    winner = (sock, endpoint)
+                    break
+                if result in (errno.EINPROGRESS, errno.EWOULDBLOCK):
+                    pending[sock] = (endpoint, now + attempt_timeout)
+                    selector.register(sock, selectors.EVENT_WRITE)
+                else:
+                    sock.close()
+                    next_start = now # fallito subito (es. porta chiusa): si passa al candidato successivo
+                continue
+
+            # attende il completamento di una connessione, al massimo fino al prossimo avvio o alla prossima scadenza
+            wakeup = min(deadline for _, deadline in pending.values())
+            if remaining:
+                wakeup = min(wakeup, next_start)
+            for key, _ in selector.select(timeout=max(0.0, wakeup - now)):
+                sock = key.fileobj
+                endpoint, _ = pending.pop(sock)
+                selector.unregister(sock)
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    winner = (sock, endpoint)
+                    break
+                sock.close()
+                next_start = time.monotonic()
+
+            # abbandona i tentativi che non hanno risposto in tempo
+            now = time.monotonic()
+            for sock, (endpoint, deadline) in list(pending.items()):
+                if deadline <= now:
+                    del pending[sock]
+                    selector.unregister(sock)
+                    sock.close()
+    finally:
+        # i tentativi ancora in corso vengono annullati
+        for sock in pending:
+            sock.close()
+        selector.close()
+
+    if winner is None:
+        return None, None
+    sock, endpoint = winner
+    sock.setblocking(True)
+    return sock, endpoint
@@ -0,0 +1,225 @@
+import selectors
+import threading
+import time
+from chat.connection import Connection
+from constants.constants import HANDSHAKE_TIMEOUT
+
+SELECT_TIMEOUT = 1.0        # intervallo massimo tra due controlli dello stato del nodo
+
+# Motore del server basato su un unico event loop (epoll tramite il modulo selectors).
+# Un solo thread gestisce accept, handshake e ricezione dei messaggi di tutti i client:
+# i socket vengono letti solo quando il sistema operativo li segnala come pronti,
+# quindi con migliaia di client inattivi il costo resta quello di una sola select al secondo.
+# La logica applicativa (join, broadcast, disconnessioni) resta quella di ChatNode.
+# Con un profilo di trasporto che unisce le scritture (coalesce > 0) la richiesta di scrittura di un client
+# fatta dal loop stesso viene rinviata di coalesce secondi, così i frame accodati nel frattempo partono insieme.
+class EventLoopServer:
+    def __init__(self, node):
+        self.node = node
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()    # protegge il selettore da modifiche concorrenti (es. disconnect_client da altri thread)
+        self.handshakes = {}            # socket -> (connessione, indirizzo, scadenza) dei client in attesa di join
+        self.coalesce = node.transport.coalesce
+        self.deferred = {}              # socket -> istante da cui chiedere la scrittura (solo con coalesce > 0)
+        self.thread_id = None
+
+    # Ciclo principale: attende eventi sui socket registrati e li smista alle callback associate
+    def run(self):
+        node = self.node
+        self.thread_id = threading.get_ident()
+        node.server_socket.setblocking(False) # l'accept non blocca: a ogni evento si svuota tutta la coda di connessioni
+        with self.lock:
+            self.selector.register(node.server_socket, selectors.EVENT_READ, self.accept)
+
+        try:
+            # con gli heartbeat attivi il loop si risveglia abbastanza spesso da inviarli e controllare i rilevatori
+            timeout = SELECT_TIMEOUT
+            if node.heartbeat_interval:
+                timeout = min(timeout, node.heartbeat_check_interval())
+
+            while node.server_running and node.running and not node.shutdown_event.is_set():
+                wait = timeout
+                if self.deferred:
+                    wait = max(0.0, min(timeout, min(self.deferred.values()) - time.monotonic()))
+                for key, mask in self.selector.select(timeout=wait):
+                    if mask & selectors.EVENT_WRITE:
+                        self.write_client(key.fileobj)
+                    if mask & selectors.EVENT_READ:
+                        key.data(key.fileobj)
+                if self.deferred:
+                    self.start_deferred_writes()
+                self.expire_handshakes()
+                if node.heartbeat_interval:
+                    node.server_heartbeat_tick()
+        except Exception as e:
+            if not node.shutdown_event.is_set(): # evita di stampare l'errore se il server sta chiudendo normalmente
+                print(f"Errore nell'event loop del server: {e}")
+        finally:
+            self.close()
+
+    # Accetta tutte le connessioni in attesa e le registra per la lettura dell'handshake
+    def accept(self, server_socket):
+        node = self.node
+        while True:
+            try:
+                client_socket, client_address = server_socket.accept()
+            except BlockingIOError:
+                return
+            except OSError:
+                return # socket del server chiuso durante lo shutdown
+
+            # se è stato raggiunto il numero massimo di connessioni rifiuta la connessione
+            if len(node.connected_clients) + len(self.handshakes) >= node.max_connections:
+                node.reject_client(client_socket, client_address)
+                continue
+
+            client_socket.settimeout(None)
+            connection = Connection(client_socket)
+            self.handshakes[client_socket] = (connection, client_address, time.monotonic() + HANDSHAKE_TIMEOUT)
+            self.register(client_socket, self.read_handshake)
+
+    # Legge la richiesta di join di un client appena connesso e la fa elaborare al nodo
+    def read_handshake(self, client_socket):
+        connection, client_address, _ = self.handshakes[client_socket]
+        try:
+            join_request = connection.try_receive_one()
+        except Exception:
+            self.drop_handshake(client_socket)
+            return
+        if join_request is None:
+            return # frame di join non ancora completo
+
+        # l'handshake è concluso: il socket viene tolto dal selettore mentre il nodo decide se accettarlo
+        del self.handshakes[client_socket]
+        self.unregister(client_socket)
+
+        try:
+            with self.node.trace_span("handshake", address=f"{client_address[0]}:{client_address[1]}",
+                                      username=join_request.get('username')):
+                accepted = self.node.process_join_request(connection, client_address, join_request)
+        except Exception as e:
+            print(f"Errore nella gestione del nuovo client: {e}")
+            self.node.disconnect_client(client_socket)
+            return
+
+        if accepted:
+            # da qui in poi il socket non blocca mai: letture e scritture avvengono solo quando è pronto
+            client_socket.setblocking(False)
+            self.register(client_socket, self.read_client, connection.outbound)
+            if connection.pending: # eventuali messaggi arrivati insieme al join
+                self.read_client(client_socket)
+
+    # Legge i messaggi disponibili da un client registrato e li passa al nodo
+    def read_client(self, client_socket):
+        node = self.node
+        client_info = node.connected_clients.get(client_socket)
+        if not client_info:
+            self.unregister(client_socket)
+            return
+
+        try:
+            try:
+                messages = client_info['connection'].receive()
+            except (BlockingIOError, InterruptedError):
+                return # risveglio spurio: nessun dato disponibile
+            if messages is None: # il client ha chiuso la connessione
+                node.disconnect_client(client_socket)
+                return
+            for message_data in messages:
+                node.handle_client_message(client_socket, client_info['username'], message_data)
+        except Exception as e:
+            if not isinstance(e, OSError):
+                print(f"Errore nel parsing messaggio da {client_info['username']}: {e}")
+            node.disconnect_client(client_socket)
+
+    # Scrive senza bloccare quanto possibile della coda in uscita di un client.
+    # Quando la coda è vuota smette di chiedere eventi di scrittura per quel socket.
+    def write_client(self, client_socket):
+        node = self.node
+        client_info = node.connected_clients.get(client_socket)
+        if not client_info:
+            self.unregister(client_socket)
+            return
+
+        outbound = client_info['connection'].outbound
+        try:
+            outbound.write_available(client_socket)
+        except OSError:
+            node.disconnect_client(client_socket)
+            return
+
+        # il controllo sulla coda e la modifica del selettore avvengono sotto lo stesso lock usato da want_write,
+        # così un frame accodato nel frattempo da un altro thread non resta mai senza evento di scrittura
+        with self.lock:
+            if not outbound.has_pending():
+                self._modify(client_socket, selectors.EVENT_READ)
+
+    # Chiamata (anche da altri thread) quando la coda in uscita di un client passa da vuota a non vuota.
+    # Dal loop, con coalesce > 0, la scrittura viene solo programmata; da altri thread si chiede subito,
+    # perché il loop potrebbe restare fermo nella select fino al timeout
+    def want_write(self, client_socket):
+        if self.coalesce and threading.get_ident() == self.thread_id:
+            self.deferred.setdefault(client_socket, time.monotonic() + self.coalesce)
+            return
+        with self.lock:
+            self._modify(client_socket, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    # Chiede la scrittura per i client la cui finestra di unione è scaduta
+    def start_deferred_writes(self):
+        now = time.monotonic()
+        with self.lock:
+            for client_socket, due in list(self.deferred.items()):
+                if due <= now:
+                    del self.deferred[client_socket]
+                    self._modify(client_socket, selectors.EVENT_READ | selectors.EVENT_WRITE)
+
+    def _modify(self, sock, events):
+        try:
+            key = self.selector.get_key(sock)
+            if key.events != events:
+                self.selector.modify(sock, events, key.data)
+        except (KeyError, ValueError, OSError):
+            pass # socket non (più) registrato: verrà registrato con gli eventi corretti
+
+    # Chiude le connessioni che non hanno completato l'handshake entro il tempo limite
+    def expire_handshakes(self):
+        if not self.handshakes:
+            return
+        now = time.monotonic()
+        for client_socket, (_, _, deadline) in list(self.handshakes.items()):
+            if deadline < now:
+                self.drop_handshake(client_socket)
+
+    def drop_handshake(self, client_socket):
+        self.handshakes.pop(client_socket, None)
+        self.unregister(client_socket)
+        try:
+            client_socket.close()
+        except:
+            pass
+
+    # Registra un socket per la lettura; se la sua coda in uscita contiene già dati chiede anche la scrittura
+    def register(self, sock, callback, outbound=None):
+        with self.lock:
+            events = selectors.EVENT_READ
+            if outbound is not None and outbound.has_pending():
+                events |= selectors.EVENT_WRITE
+            self.selector.register(sock, events, callback)
+
+    # Rimuove un socket dal selettore; può essere chiamata da qualsiasi thread prima della chiusura del socket
+    def unregister(self, sock):
+        with self.lock:
+            self.deferred.pop(sock, None)
+            try:
+                self.selector.unregister(sock)
+            except (KeyError, ValueError, OSError):
+                pass
+
+    def close(self):
+        for client_socket in list(self.handshakes):
+            self.drop_handshake(client_socket)
+        with self.lock:
+            try:
+                self.selector.close()
+            except:
+                pass
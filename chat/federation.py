@@ -0,0 +1,295 @@
+import os
+import socket
+import threading
+from collections import deque
+from chat.connection import Connection
+from chat.outbound import OutboundQueue
+from chat.outbound import POLICY_DISCONNECT
+from constants.constants import FEDERATION_HIGH_WATERMARK
+from constants.constants import FEDERATION_RETRY_INTERVAL
+from constants.constants import FEDERATION_SEEN_SIZE
+
+# Federazione di più server in un'unica chat logica.
+# Ogni server gestisce i propri client e si collega agli altri server con connessioni dedicate (link):
+# gli eventi dei propri client (messaggi, ingressi, uscite, messaggi privati) vengono pubblicati su tutti i link
+# dentro una busta con il server di origine, un identificativo progressivo e il percorso già seguito.
+# Chi riceve una busta la consegna ai propri client e la inoltra agli altri link tranne quelli già nel percorso;
+# le buste già viste (origine, avvio, identificativo) vengono scartate, così anche una maglia con cicli non crea
+# duplicati. L'avvio è un numero casuale scelto da ogni processo: un server riavviato (o un successore promosso con
+# lo stesso nome) riparte da identificativo 1 senza che le sue buste vengano scambiate per quelle già viste.
+# Ogni server numera con le proprie sequenze gli eventi che consegna ai propri client, quindi i campi validi
+# solo sul server di origine (sequenza, cid, dati di membership) non vengono inoltrati.
+# Gli stessi link, aperti su socket Unix (bus), collegano i processi worker di un server multi-processo:
+# gli eventi riservati al gruppo (es. il successore designato) viaggiano solo sui link del bus.
+
+LOCAL_KEYS = ('seq', 'cid', 'member', 'membership', 'successor', 'peer_list') # validi solo sul server di origine
+
+# Link verso un altro server della federazione, con la sua coda in uscita svuotata da un thread dedicato
+class FederationLink:
+    def __init__(self, connection, server_id, endpoint, bus=False):
+        self.connection = connection
+        self.server_id = server_id
+        self.endpoint = endpoint    # (host, porta) su cui il server remoto accetta connessioni, o percorso del bus
+        self.bus = bus              # link verso un altro processo dello stesso server (worker)
+        connection.outbound = OutboundQueue(FEDERATION_HIGH_WATERMARK, FEDERATION_HIGH_WATERMARK // 2, POLICY_DISCONNECT)
+
+    def send(self, message_data):
+        self.connection.send(message_data)
+
+    def close(self):
+        self.connection.outbound.close()
+        try:
+            self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.connection.close()
+
+class Federation:
+    def __init__(self, node, seen_size=FEDERATION_SEEN_SIZE):
+        self.node = node
+        self.links = {}             # id del server remoto -> FederationLink
+        self.endpoints = set()      # server a cui questo nodo si collega attivamente (e si ricollega dopo una caduta)
+        self.remote_members = {}    # username -> id del server a cui è collegato l'utente remoto
+        self.seen = set()           # buste già ricevute: (origine, avvio, identificativo)
+        self.seen_order = deque()   # ordine di arrivo delle buste viste, per scartare le più vecchie
+        self.seen_size = seen_size
+        self.next_mid = 1
+        # avvio di questo processo: distingue le sue buste da quelle di un'istanza precedente con lo stesso nome
+        self.boot_id = int.from_bytes(os.urandom(8), 'big') >> 1
+        self.lock = threading.RLock()
+        self.bus_socket = None      # socket Unix su cui i worker dello stesso server aprono i link del bus
+
+    @property
+    def server_id(self):
+        return self.node.username
+
+    # Endpoint di tutti i server collegati, comunicati ai client perché un successore possa ricollegarsi
+    def known_endpoints(self):
+        with self.lock:
+            endpoints = {endpoint for endpoint in self.endpoints if isinstance(endpoint, tuple)}
+            endpoints.update(link.endpoint for link in self.links.values() if link.endpoint and not link.bus)
+            return sorted(endpoints)
+
+    # Messaggio di presentazione scambiato all'apertura di un link.
+    # Verso un altro server si annunciano anche gli utenti dei worker dello stesso gruppo
+    def hello(self, message_type, bus=False):
+        members = self.node.local_usernames()
+        if not bus:
+            with self.lock:
+                members += [username for username, server_id in self.remote_members.items()
+                            if server_id in self.links and self.links[server_id].bus]
+        return {
+            'type': message_type,
+            'server_id': self.server_id,
+            'host': self.node.server_host,
+            'port': self.node.server_port,
+            'members': members,
+            'bus': bus
+        }
+
+    # Si collega (e si ricollega dopo ogni caduta) al server in ascolto su host:port,
+    # oppure al bus di un altro worker se viene indicato solo il percorso del socket Unix
+    def link(self, host, port=None):
+        endpoint = host if port is None else (host, port)
+        with self.lock:
+            if endpoint in self.endpoints:
+                return
+            self.endpoints.add(endpoint)
+        thread = threading.Thread(target=self.dial_loop, args=(endpoint,), name=f"FederationDial-{port or host}")
+        self.node.add_thread(thread)
+        thread.start()
+
+    def dial_loop(self, endpoint):
+        node = self.node
+        bus = isinstance(endpoint, str)
+        while node.server_running and not node.shutdown_event.is_set() and endpoint in self.endpoints:
+            try:
+                if bus:
+                    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    sock.settimeout(5.0)
+                    sock.connect(endpoint)
+                else:
+                    sock = socket.create_connection(endpoint, timeout=5.0)
+                    node.transport.apply(sock)
+                connection = Connection(sock)
+                connection.send(self.hello('federation_hello', bus))
+                welcome = connection.receive_one()
+                sock.settimeout(1.0)
+                if welcome['type'] != 'federation_welcome':
+                    raise ConnectionError(welcome.get('message', 'link rifiutato'))
+            except (OSError, ConnectionError, ValueError):
+                node.shutdown_event.wait(FEDERATION_RETRY_INTERVAL)
+                continue
+
+            link = FederationLink(connection, welcome['server_id'], endpoint, bus)
+            self.register(link, welcome.get('members', ()))
+            self.run_link(link) # ritorna quando il link cade
+            node.shutdown_event.wait(FEDERATION_RETRY_INTERVAL)
+
+    # Accetta un link aperto da un altro server (chiamata dal server durante l'handshake o dal bus)
+    def accept(self, connection, hello):
+        connection.sock.settimeout(1.0)
+        bus = bool(hello.get('bus'))
+        if not bus:
+            self.node.transport.apply(connection.sock)
+        endpoint = (hello['host'], hello['port']) if hello.get('port') and not bus else None
+        link = FederationLink(connection, hello['server_id'], endpoint, bus)
+        connection.send(self.hello('federation_welcome', bus))
+        self.register(link, hello.get('members', ()))
+        thread = threading.Thread(target=self.run_link, args=(link,), name=f"Federation-{link.server_id}")
+        self.node.add_thread(thread)
+        thread.start()
+
+    # Apre il socket Unix del bus su cui gli altri worker dello stesso server si collegano
+    def listen_bus(self, path):
+        self.bus_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.bus_socket.bind(path)
+        self.bus_socket.listen(16)
+        self.bus_socket.settimeout(1.0)
+        thread = threading.Thread(target=self.accept_bus, name="FederationBus")
+        self.node.add_thread(thread)
+        thread.start()
+
+    def accept_bus(self):
+        node = self.node
+        while node.server_running and not node.shutdown_event.is_set() and self.bus_socket is not None:
+            try:
+                sock, _ = self.bus_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            connection = Connection(sock)
+            try:
+                sock.settimeout(5.0)
+                hello = connection.receive_one()
+                if hello['type'] != 'federation_hello':
+                    raise ConnectionError("link non valido")
+                self.accept(connection, hello)
+            except (OSError, ConnectionError, ValueError):
+                connection.close()
+
+    def register(self, link, members):
+        with self.lock:
+            previous = self.links.get(link.server_id)
+            self.links[link.server_id] = link
+            for username in members:
+                self.remote_members[username] = link.server_id
+        if previous is not None:
+            previous.close() # link duplicato (es. collegamento contemporaneo nelle due direzioni)
+        print(f">>> Collegato al server {link.server_id} ({len(members)} utenti)")
+
+    # Legge le buste dal link finché resta attivo; un thread dedicato svuota la sua coda in uscita
+    def run_link(self, link):
+        writer = threading.Thread(target=self.write_link, args=(link,), name=f"FederationWriter-{link.server_id}")
+        self.node.add_thread(writer)
+        writer.start()
+        node = self.node
+        try:
+            while node.server_running and not node.shutdown_event.is_set() and self.links.get(link.server_id) is link:
+                try:
+                    messages = link.connection.receive()
+                except socket.timeout:
+                    continue
+                if messages is None:
+                    break
+                for message_data in messages:
+                    if message_data['type'] == 'federation_event':
+                        self.receive(link, message_data)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.unregister(link)
+
+    def write_link(self, link):
+        outbound = link.connection.outbound
+        try:
+            while self.node.server_running and not outbound.closed:
+                outbound.write_blocking(link.connection.sock)
+        except Exception:
+            pass
+        finally:
+            link.close()
+
+    # Rimuove un link caduto insieme agli utenti del server remoto
+    def unregister(self, link):
+        with self.lock:
+            if self.links.get(link.server_id) is not link:
+                return
+            del self.links[link.server_id]
+            for username, server_id in list(self.remote_members.items()):
+                if server_id == link.server_id:
+                    del self.remote_members[username]
+        link.close()
+        if not self.node.shutdown_event.is_set():
+            print(f">>> Collegamento con il server {link.server_id} interrotto")
+
+    # Registra una busta come vista; restituisce False se era già stata ricevuta
+    def mark_seen(self, key):
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.seen_order.append(key)
+        if len(self.seen_order) > self.seen_size:
+            self.seen.discard(self.seen_order.popleft())
+        return True
+
+    # Pubblica su tutti i link un evento generato da questo server (solo sul bus se bus_only)
+    def publish(self, event, bus_only=False):
+        if not self.links:
+            return
+        with self.lock:
+            mid = self.next_mid
+            self.next_mid += 1
+            self.mark_seen((self.server_id, self.boot_id, mid))
+            envelope = {
+                'type': 'federation_event',
+                'origin': self.server_id,
+                'boot': self.boot_id,
+                'mid': mid,
+                'path': [self.server_id],
+                'event': {key: value for key, value in event.items() if key not in LOCAL_KEYS}
+            }
+            if bus_only:
+                envelope['bus_only'] = True
+            self.send_to_links(envelope)
+
+    # Busta ricevuta da un link: scarta i duplicati, consegna ai client locali e inoltra agli altri server
+    def receive(self, link, envelope):
+        with self.lock:
+            if not self.mark_seen((envelope['origin'], envelope.get('boot'), envelope['mid'])):
+                return
+            event = envelope['event']
+            if event['type'] == 'user_joined':
+                self.remote_members[event['username']] = envelope['origin']
+            elif event['type'] == 'user_left' and self.remote_members.get(event['username']) == envelope['origin']:
+                del self.remote_members[event['username']]
+
+        # un messaggio privato consegnato a un client locale non deve proseguire
+        if self.node.deliver_remote_event(event):
+            return
+
+        with self.lock:
+            envelope['path'] = envelope['path'] + [self.server_id]
+            self.send_to_links(envelope, exclude=link, path=envelope['path'])
+
+    # Accoda la busta su tutti i link tranne quello di provenienza e quelli dei server già attraversati
+    def send_to_links(self, envelope, exclude=None, path=()):
+        bus_only = envelope.get('bus_only')
+        for link in list(self.links.values()):
+            if link is exclude or link.server_id in path or (bus_only and not link.bus):
+                continue
+            try:
+                link.send(envelope)
+            except Exception:
+                link.close() # link troppo lento o caduto: verrà rimosso dal suo thread di lettura
+
+    def close(self):
+        with self.lock:
+            self.endpoints.clear()
+            links = list(self.links.values())
+        for link in links:
+            link.close()
+        if self.bus_socket is not None:
+            bus_socket, self.bus_socket = self.bus_socket, None
+            bus_socket.close()
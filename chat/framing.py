@@ -0,0 +1,141 @@
+import struct
+from constants.constants import BUFFER_SIZE
+from constants.constants import MAX_FRAME_SIZE
+
+# Ogni frame sul socket è composto da un header di 4 byte (lunghezza del payload, big-endian)
+# seguito dal payload vero e proprio. In questo modo il ricevente può ricostruire i confini
+# dei messaggi anche quando TCP li unisce in un'unica lettura o li spezza su più letture.
+FRAME_HEADER = struct.Struct('!I')
+HEADER_SIZE = FRAME_HEADER.size
+
+# Frame di dati (es. blocchi di un file): il bit più alto della lunghezza è impostato e il payload viene
+# consegnato così com'è, senza codec né compressione. Inizia con l'identificativo del trasferimento
+# e la posizione del blocco nel file (CHUNK_HEADER), seguiti dai byte del file.
+DATA_FRAME_FLAG = 0x80000000
+CHUNK_HEADER = struct.Struct('!QQ')
+
+# Payload di un frame di dati restituito dal decoder (si distingue dai payload dei messaggi per il tipo)
+class DataPayload(bytes):
+    pass
+
+# Errore sollevato quando lo stream contiene un frame non valido (es. lunghezza oltre il limite)
+class FrameError(Exception):
+    pass
+
+# Funzione che costruisce il frame completo (header + payload) pronto per essere inviato con sendall
+def encode_frame(payload):
+    return b''.join(encode_frame_parts(payload))
+
+# Funzione che costruisce il frame come coppia immutabile (header, payload) senza copiare il payload.
+# La stessa coppia può essere condivisa tra tutti i destinatari di un broadcast e inviata con una scrittura vettoriale.
+def encode_frame_parts(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame di {len(payload)} byte oltre il limite di {MAX_FRAME_SIZE}")
+    return (FRAME_HEADER.pack(len(payload)), payload)
+
+# Frame di dati come coppia (header, payload) condivisibile tra più destinatari, come encode_frame_parts
+def encode_data_frame_parts(payload):
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame di {len(payload)} byte oltre il limite di {MAX_FRAME_SIZE}")
+    return (FRAME_HEADER.pack(len(payload) | DATA_FRAME_FLAG), payload)
+
+# Header di un frame di dati da length byte del file, da inviare prima dei byte stessi (es. con sendfile)
+def encode_data_frame_header(transfer_id, offset, length):
+    return FRAME_HEADER.pack((CHUNK_HEADER.size + length) | DATA_FRAME_FLAG) + CHUNK_HEADER.pack(transfer_id, offset)
+
+# Dimensione totale in byte di un frame, sia in forma di bytes che di tupla di parti
+def frame_length(frame):
+    if isinstance(frame, tuple):
+        return len(frame[0]) + len(frame[1]) if len(frame) == 2 else sum(map(len, frame))
+    return len(frame)
+
+# Decoder incrementale dei frame.
+# Mantiene un unico buffer riutilizzabile in cui il socket scrive direttamente con recv_into:
+# una sola lettura può produrre molti messaggi, e un messaggio grande viene accumulato
+# su più letture finché non è completo. Il buffer viene compattato o ingrandito solo quando serve.
+class FrameDecoder:
+    def __init__(self, initial_size=BUFFER_SIZE, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self.buffer = bytearray(initial_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0      # inizio dei dati non ancora consumati
+        self.end = 0        # fine dei dati validi nel buffer
+        self.needed = 0     # dimensione totale del frame incompleto in attesa (0 se sconosciuta)
+
+    # Numero di byte ricevuti ma non ancora restituiti come frame
+    def pending_bytes(self):
+        return self.end - self.start
+
+    # Garantisce che in coda al buffer ci sia spazio libero per la prossima lettura.
+    # Prima prova a compattare spostando i dati pendenti all'inizio, poi ingrandisce
+    # il buffer se il frame in attesa non ci starebbe comunque.
+    def _ensure_space(self):
+        capacity = len(self.buffer)
+        if self.end < capacity and (self.needed == 0 or self.start + self.needed <= capacity):
+            return
+
+        pending = self.end - self.start
+        required = max(self.needed, pending + 1)
+
+        # il frame in attesa non entra nel buffer attuale: alloca un buffer più grande
+        if required > capacity:
+            new_capacity = capacity
+            while new_capacity < required:
+                new_capacity *= 2
+            new_buffer = bytearray(new_capacity)
+            new_buffer[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer = new_buffer
+            self.view = memoryview(self.buffer)
+        # altrimenti basta spostare i dati pendenti in testa al buffer
+        elif self.start > 0:
+            self.view[:pending] = self.view[self.start:self.end]
+
+        self.start = 0
+        self.end = pending
+
+    # Legge dal socket direttamente nello spazio libero del buffer.
+    # Restituisce il numero di byte letti: 0 indica che il peer ha chiuso la connessione.
+    def read_from(self, sock):
+        self._ensure_space()
+        received = sock.recv_into(self.view[self.end:])
+        self.end += received
+        return received
+
+    # Aggiunge dati già ricevuti al buffer (usato quando i byte non arrivano da un socket)
+    def feed(self, data):
+        data = memoryview(data)
+        while data:
+            self._ensure_space()
+            chunk = min(len(data), len(self.buffer) - self.end)
+            self.view[self.end:self.end + chunk] = data[:chunk]
+            self.end += chunk
+            data = data[chunk:]
+
+    # Estrae tutti i frame completi presenti nel buffer e restituisce la lista dei payload
+    # (DataPayload per i frame di dati).
+    # I byte di un eventuale frame incompleto restano nel buffer in attesa della prossima lettura.
+    def frames(self):
+        payloads = []
+        while self.end - self.start >= HEADER_SIZE:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, self.start)
+            data = length & DATA_FRAME_FLAG
+            if data:
+                length ^= DATA_FRAME_FLAG
+            if length > self.max_frame_size:
+                raise FrameError(f"Frame di {length} byte oltre il limite di {self.max_frame_size}")
+
+            total = HEADER_SIZE + length
+            if self.end - self.start < total:
+                self.needed = total # frame incompleto: ricorda quanto spazio servirà
+                break
+
+            payload = self.view[self.start + HEADER_SIZE:self.start + total]
+            payloads.append(DataPayload(payload) if data else bytes(payload))
+            self.start += total
+            self.needed = 0
+
+        # se tutto il buffer è stato consumato riparte dall'inizio senza copie
+        if self.start == self.end:
+            self.start = self.end = 0
+        return payloads
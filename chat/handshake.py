@@ -0,0 +1,135 @@
+import selectors
+import socket
+import threading
+import time
+from collections import deque
+from chat.connection import Connection
+from constants.constants import HANDSHAKE_TIMEOUT
+from constants.constants import HANDSHAKE_MAX_PENDING
+
+# Fase di handshake del motore a thread.
+# Il thread di accept si limita ad accettare le connessioni e a consegnarle a questa fase, in cui un solo thread
+# attende con un selettore le richieste di join di tutti i client in handshake: un client lento o muto non blocca
+# gli altri e viene chiuso alla propria scadenza (HANDSHAKE_TIMEOUT secondi dall'accept).
+# Quando la richiesta di join è completa il client viene passato al nodo (handle_new_client).
+# La fase è limitata a max_pending handshake contemporanei: oltre, il thread di accept attende che si liberi un posto
+# e le nuove connessioni restano nella coda di ascolto del sistema operativo.
+class HandshakeStage:
+    def __init__(self, node, max_pending=HANDSHAKE_MAX_PENDING, timeout=HANDSHAKE_TIMEOUT):
+        self.node = node
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.selector = selectors.DefaultSelector()
+        self.handshakes = {}    # socket -> (connessione, indirizzo, scadenza) dei client in attesa di join
+        self.incoming = deque() # connessioni accettate non ancora registrate nel selettore
+        self.count = 0          # handshake in corso, compresi quelli non ancora registrati
+        self.count_lock = threading.Lock()
+        # il thread di accept risveglia il selettore scrivendo un byte su questa coppia di socket
+        self.wakeup_reader, self.wakeup_writer = socket.socketpair()
+        self.wakeup_reader.setblocking(False)
+        self.selector.register(self.wakeup_reader, selectors.EVENT_READ)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name="HandshakeThread")
+        self.node.add_thread(thread)
+        thread.start()
+
+    # Handshake in corso (usato per il limite di connessioni del server)
+    def pending(self):
+        return self.count
+
+    # Riserva un posto per il prossimo handshake; False se non si libera entro timeout secondi
+    def reserve(self, timeout):
+        return self.slots.acquire(timeout=timeout)
+
+    def release(self):
+        self.slots.release()
+
+    # Consegna alla fase una connessione appena accettata (con un posto già riservato)
+    def submit(self, client_socket, client_address):
+        with self.count_lock:
+            self.count += 1
+        self.incoming.append((client_socket, client_address, time.monotonic() + self.timeout))
+        try:
+            self.wakeup_writer.send(b'\0')
+        except OSError:
+            pass
+
+    def run(self):
+        node = self.node
+        try:
+            while node.server_running and node.running and not node.shutdown_event.is_set():
+                timeout = 1.0
+                if self.handshakes:
+                    timeout = max(0.0, min(timeout, min(entry[2] for entry in self.handshakes.values()) - time.monotonic()))
+                for key, _ in self.selector.select(timeout=timeout):
+                    if key.fileobj is self.wakeup_reader:
+                        self.register_incoming()
+                    else:
+                        self.read_handshake(key.fileobj)
+                self.expire_handshakes()
+        except Exception as e:
+            if not node.shutdown_event.is_set():
+                print(f"Errore nella fase di handshake: {e}")
+        finally:
+            self.close()
+
+    def register_incoming(self):
+        try:
+            while self.wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self.incoming:
+            client_socket, client_address, deadline = self.incoming.popleft()
+            client_socket.setblocking(False)
+            self.handshakes[client_socket] = (Connection(client_socket), client_address, deadline)
+            self.selector.register(client_socket, selectors.EVENT_READ)
+
+    # Legge la richiesta di join di un client; appena completa lo toglie dalla fase e lo consegna al nodo
+    def read_handshake(self, client_socket):
+        connection, client_address, _ = self.handshakes[client_socket]
+        try:
+            join_request = connection.try_receive_one()
+        except (BlockingIOError, InterruptedError):
+            return # risveglio spurio
+        except Exception:
+            self.drop_handshake(client_socket)
+            return
+        if join_request is None:
+            return # frame di join non ancora completo
+
+        self.finish(client_socket)
+        client_socket.setblocking(True)
+        self.node.handle_new_client(connection, client_address, join_request)
+
+    def expire_handshakes(self):
+        if not self.handshakes:
+            return
+        now = time.monotonic()
+        for client_socket, (_, _, deadline) in list(self.handshakes.items()):
+            if deadline < now:
+                self.drop_handshake(client_socket)
+
+    # Toglie un client dalla fase e ne libera il posto
+    def finish(self, client_socket):
+        self.handshakes.pop(client_socket)
+        self.selector.unregister(client_socket)
+        with self.count_lock:
+            self.count -= 1
+        self.release()
+
+    def drop_handshake(self, client_socket):
+        self.finish(client_socket)
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+
+    def close(self):
+        self.register_incoming()
+        for client_socket in list(self.handshakes):
+            self.drop_handshake(client_socket)
+        self.selector.close()
+        self.wakeup_reader.close()
+        self.wakeup_writer.close()
@@ -0,0 +1,74 @@
+import math
+import time
+from collections import deque
+from constants.constants import HEARTBEAT_ACCEPTABLE_PAUSE
+from constants.constants import HEARTBEAT_MAX_SILENCE
+from constants.constants import HEARTBEAT_MIN_STD
+from constants.constants import HEARTBEAT_WINDOW
+from constants.constants import PHI_THRESHOLD
+
+LN10 = math.log(10)
+
+# Rilevatore di guasti "phi accrual" (Hayashibara et al.), come quello usato da Akka e Cassandra.
+# Invece di un timeout fisso stima la distribuzione degli intervalli tra heartbeat consecutivi
+# (media e deviazione standard sugli ultimi HEARTBEAT_WINDOW campioni) e calcola phi, cioè quanto
+# è improbabile non aver ancora ricevuto un heartbeat dopo il tempo trascorso: phi = 8 corrisponde
+# a una probabilità di errore di 1 su 10^8. Il peer è considerato guasto oltre PHI_THRESHOLD
+# oppure, in ogni caso, dopo HEARTBEAT_MAX_SILENCE secondi di silenzio.
+class PhiAccrualDetector:
+    def __init__(self, expected_interval, threshold=PHI_THRESHOLD, window=HEARTBEAT_WINDOW,
+                 min_std=HEARTBEAT_MIN_STD, acceptable_pause=HEARTBEAT_ACCEPTABLE_PAUSE,
+                 max_silence=HEARTBEAT_MAX_SILENCE):
+        self.threshold = threshold
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.max_silence = max_silence
+        self.intervals = deque()
+        self.window = window
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.last = time.monotonic()
+
+        # stima iniziale: intervallo atteso con una deviazione di un quarto, finché non arrivano campioni reali
+        for interval in (expected_interval * 0.75, expected_interval * 1.25):
+            self.add_interval(interval)
+
+    def add_interval(self, interval):
+        self.intervals.append(interval)
+        self.total += interval
+        self.total_squares += interval * interval
+        if len(self.intervals) > self.window:
+            old = self.intervals.popleft()
+            self.total -= old
+            self.total_squares -= old * old
+
+    # Registra l'arrivo di un heartbeat
+    def heartbeat(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.add_interval(now - self.last)
+        self.last = now
+
+    # Livello di sospetto per il tempo trascorso dall'ultimo heartbeat
+    def phi(self, now=None):
+        now = time.monotonic() if now is None else now
+        elapsed = now - self.last
+        count = len(self.intervals)
+        mean = self.total / count
+        variance = max(0.0, self.total_squares / count - mean * mean)
+        std = max(math.sqrt(variance), self.min_std)
+
+        # approssimazione logistica della CDF normale, la stessa di Akka: phi = log10(1 + e^z),
+        # calcolata in modo stabile anche quando z è molto grande o molto negativo
+        y = (elapsed - mean - self.acceptable_pause) / std
+        z = y * (1.5976 + 0.070566 * y * y)
+        if z > 0:
+            return (z + math.log1p(math.exp(-z))) / LN10
+        return math.log1p(math.exp(z)) / LN10
+
+    def is_available(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self.last < self.max_silence and self.phi(now) < self.threshold
+
+    def silence(self, now=None):
+        now = time.monotonic() if now is None else now
+        return now - self.last
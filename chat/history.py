@@ -0,0 +1,428 @@
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from constants.constants import HISTORY_PAGE_SIZE
+from constants.constants import HISTORY_TOKEN_BUCKETS
+from constants.constants import HISTORY_TOKEN_INDEX
+
+# Archivio su disco della cronologia della chat, alimentato con le stesse voci di add_to_log.
+# Ogni nodo ha una directory chat_history/<utente>/ con file append-only:
+#   - messages.dat  record binari: header (timestamp, tipo, lunghezze) + username + messaggio in UTF-8;
+#                   nei messaggi privati il campo username contiene mittente e destinatario separati da "\0"
+#   - messages.idx  indice per numero di sequenza: l'offset (uint64) del record n si trova in posizione n * 8
+#   - users.json    nome utente -> identificativo, e user_<id>.idx con i numeri di sequenza dei suoi messaggi
+#                   (i messaggi privati compaiono nell'indice sia del mittente sia del destinatario)
+#   - tokens_<n>.idx (opzionale) coppie (crc32 della parola, sequenza) ripartite in bucket per hash
+#   - indexed.seq   numero di messaggi (uint64) fino al quale gli indici secondari sono completi
+# I file vengono letti tramite mmap, quindi una pagina di risultati costa solo i record restituiti,
+# indipendentemente dal numero di messaggi archiviati. La scrittura avviene a gruppi dal thread del log:
+# prima i record, poi l'indice per sequenza e infine gli indici secondari, così un lettore
+# non vede mai una sequenza il cui record non sia già su disco.
+# indexed.seq viene aggiornato solo dopo gli indici secondari: alla riapertura, se un crash li ha lasciati
+# a metà, le voci oltre quel punto vengono scartate e i messaggi mancanti reindicizzati dai record.
+
+RECIPIENT_SEPARATOR = "\0"                # tra mittente e destinatario nel campo username dei messaggi privati
+RECORD_HEADER = struct.Struct('!dBHI')   # timestamp, tipo, lunghezza username, lunghezza messaggio
+OFFSET = struct.Struct('!Q')
+SEQ = struct.Struct('!Q')
+TOKEN_ENTRY = struct.Struct('!IQ')        # crc32 della parola, sequenza
+
+TYPE_CODES = {'chat_message': 1, 'server_message': 2, 'system': 3, 'direct_message': 4}
+TYPE_NAMES = {code: message_type for message_type, code in TYPE_CODES.items()}
+
+TOKEN_PATTERN = re.compile(r'\w+')
+SCAN_CHUNK = 256                          # voci dell'indice delle parole lette al primo passo della scansione
+MAX_SCAN_CHUNK = 65536                    # il blocco raddoppia a ogni passo fino a questo limite
+REINDEX_CHUNK = 65536                     # messaggi reindicizzati per gruppo durante la riparazione
+
+# Parole indicizzate di un messaggio (minuscole, senza ripetizioni)
+def tokenize(text):
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+def token_hash(token):
+    return zlib.crc32(token.encode('utf-8'))
+
+# Serializza un array di interi senza segno a 64 bit in big-endian, come il resto del formato
+def big_endian(values):
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values.tobytes()
+
+# File in sola lettura mappato in memoria; la mappa viene rifatta quando il file cresce
+class MappedFile:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.size = 0
+
+    # Restituisce la mappa aggiornata del file (None se il file è vuoto o non esiste)
+    def view(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return None
+        if size != self.size or self.map is None:
+            self.close()
+            if size == 0:
+                return None
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+            self.size = size
+        return self.map
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.size = 0
+
+class HistoryStore:
+    def __init__(self, directory, token_index=HISTORY_TOKEN_INDEX, token_buckets=HISTORY_TOKEN_BUCKETS):
+        self.directory = directory
+        self.token_index = token_index
+        self.token_buckets = token_buckets
+        self.data_path = os.path.join(directory, "messages.dat")
+        self.index_path = os.path.join(directory, "messages.idx")
+        self.users_path = os.path.join(directory, "users.json")
+        self.indexed_path = os.path.join(directory, "indexed.seq")
+
+        self.users = {}             # username -> identificativo del file di indice
+        self.known_users = {}       # copia di users.json usata dalle query
+        self.users_mtime = None
+        self.count = None           # numero di messaggi archiviati (None finché il writer non ha aperto l'archivio)
+        self.data_file = None
+        self.index_file = None
+        self.indexed_file = None
+        self.data_size = 0
+
+        self.read_lock = threading.Lock()
+        self.maps = {}              # path -> MappedFile, usati dalle query
+
+    # ------------------------------------------------------------------ scrittura
+
+    # Apre l'archivio in scrittura. Un eventuale record scritto solo a metà (crash durante un gruppo)
+    # viene scartato troncando i file all'ultimo record indicizzato, poi si riparano gli indici secondari.
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.users = self.load_users()
+        self.index_file = open(self.index_path, 'ab')
+        index_size = self.index_file.tell()
+        self.count = index_size // OFFSET.size
+        if index_size % OFFSET.size:
+            self.index_file.truncate(self.count * OFFSET.size)
+
+        self.data_file = open(self.data_path, 'ab')
+        self.data_size = self.data_file.tell()
+        end = 0
+        if self.count:
+            with open(self.index_path, 'rb') as f:
+                f.seek((self.count - 1) * OFFSET.size)
+                (last,) = OFFSET.unpack(f.read(OFFSET.size))
+            with open(self.data_path, 'rb') as f:
+                f.seek(last)
+                _, _, user_length, message_length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            end = last + RECORD_HEADER.size + user_length + message_length
+        if self.data_size != end:
+            self.data_file.truncate(end)
+            self.data_file.seek(end)
+            self.data_size = end
+
+        exists = os.path.exists(self.indexed_path)
+        self.indexed_file = open(self.indexed_path, 'r+b' if exists else 'w+b')
+        indexed = self.indexed_file.read(SEQ.size)
+        indexed = SEQ.unpack(indexed)[0] if len(indexed) == SEQ.size else 0 # archivi senza il file: si ricostruisce tutto
+        known = {f"user_{user_id}.idx" for user_id in self.users.values()}
+        if any(name.startswith("user_") and name.endswith(".idx") and name not in known
+               and os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)):
+            indexed = 0 # users.json non corrisponde agli indici per utente: identificativi riassegnati da capo
+        if indexed == 0:
+            self.users = {}
+        if indexed != self.count:
+            self.repair_secondary(min(indexed, self.count))
+
+    # Riporta gli indici secondari allo stato dei primi indexed messaggi (voci intere, sequenze minori di indexed)
+    # e indicizza di nuovo i messaggi successivi leggendoli dall'archivio
+    def repair_secondary(self, indexed):
+        with self.read_lock:
+            for name in os.listdir(self.directory):
+                if name.startswith("user_") and name.endswith(".idx"):
+                    self.truncate_entries(os.path.join(self.directory, name), SEQ, indexed)
+                elif name.startswith("tokens_") and name.endswith(".idx"):
+                    self.truncate_entries(os.path.join(self.directory, name), TOKEN_ENTRY, indexed)
+
+        if indexed < self.count:
+            with open(self.index_path, 'rb') as index_file, open(self.data_path, 'rb') as data_file, \
+                    mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index, \
+                    mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for start in range(indexed, self.count, REINDEX_CHUNK):
+                    records = [self.read_record(data, index, seq)
+                               for seq in range(start, min(start + REINDEX_CHUNK, self.count))]
+                    self.append_secondary(start, [(self.record_users(record), record['message']) for record in records])
+        else:
+            self.save_indexed(self.count)
+
+    # Tronca un indice secondario alle voci con sequenza minore di limit (le sequenze nel file sono crescenti)
+    def truncate_entries(self, path, entry, limit):
+        size = os.path.getsize(path)
+        count = size // entry.size
+        if count:
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), count * entry.size, access=mmap.ACCESS_READ) as entries:
+                low, high = 0, count
+                while low < high:
+                    middle = (low + high) // 2
+                    if entry.unpack_from(entries, middle * entry.size)[-1] < limit:
+                        low = middle + 1
+                    else:
+                        high = middle
+            count = low
+        if count * entry.size != size:
+            os.truncate(path, count * entry.size)
+
+    # Aggiunge un gruppo di voci (timestamp, tipo, username, messaggio) con una write per file
+    def append_batch(self, batch):
+        if self.count is None:
+            self.open()
+
+        data = bytearray()
+        offsets = array('Q')
+        seq = self.count
+        offset = self.data_size
+
+        indexed = []
+        for timestamp, msg_type, username, message in batch:
+            if not isinstance(timestamp, (int, float)):
+                timestamp = time.time() # orari in formato testo (peer JSON): si usa l'istante di archiviazione
+            if msg_type == 'direct_message':
+                indexed.append((username, message)) # (mittente, destinatario)
+                username = RECIPIENT_SEPARATOR.join(username)
+            else:
+                indexed.append(((username,), message))
+            user_bytes = username.encode('utf-8')
+            message_bytes = message.encode('utf-8')
+            data += RECORD_HEADER.pack(timestamp, TYPE_CODES.get(msg_type, 0), len(user_bytes), len(message_bytes))
+            data += user_bytes
+            data += message_bytes
+            offsets.append(offset)
+            offset += RECORD_HEADER.size + len(user_bytes) + len(message_bytes)
+            seq += 1
+
+        # i record e l'indice per sequenza sono scritti prima degli indici secondari
+        start = self.count
+        self.data_file.write(data)
+        self.data_file.flush()
+        self.index_file.write(big_endian(offsets))
+        self.index_file.flush()
+        self.data_size = offset
+        self.count = seq
+        self.append_secondary(start, indexed)
+
+    # Aggiunge agli indici per utente e per parola le coppie (utenti, messaggio) con sequenze da seq in poi,
+    # poi registra in indexed.seq fin dove gli indici secondari sono completi
+    def append_secondary(self, seq, entries):
+        by_user = {}
+        by_bucket = {}
+        new_users = False
+        for usernames, message in entries:
+            for username in usernames:
+                user_id = self.users.get(username)
+                if user_id is None:
+                    user_id = self.users[username] = len(self.users)
+                    new_users = True
+                by_user.setdefault(user_id, array('Q')).append(seq)
+
+            if self.token_index:
+                for token in tokenize(message):
+                    crc = token_hash(token)
+                    by_bucket.setdefault(crc % self.token_buckets, bytearray()).extend(TOKEN_ENTRY.pack(crc, seq))
+            seq += 1
+
+        if new_users:
+            self.save_users()
+        for user_id, seqs in by_user.items():
+            self.append_file(self.user_path(user_id), seqs)
+        for bucket, entries in by_bucket.items():
+            self.append_file(self.bucket_path(bucket), entries)
+        self.save_indexed(seq)
+
+    def append_file(self, path, values):
+        if isinstance(values, array):
+            values = big_endian(values)
+        with open(path, 'ab') as f:
+            f.write(values)
+
+    def save_indexed(self, count):
+        self.indexed_file.seek(0)
+        self.indexed_file.write(SEQ.pack(count))
+        self.indexed_file.flush()
+
+    def save_users(self):
+        temp_path = self.users_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.users, f)
+        os.replace(temp_path, self.users_path)
+
+    def load_users(self):
+        try:
+            with open(self.users_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def user_path(self, user_id):
+        return os.path.join(self.directory, f"user_{user_id}.idx")
+
+    def bucket_path(self, bucket):
+        return os.path.join(self.directory, f"tokens_{bucket}.idx")
+
+    def close(self):
+        for f in (self.data_file, self.index_file, self.indexed_file):
+            if f is not None:
+                f.close()
+        self.data_file = self.index_file = self.indexed_file = None
+        self.count = None
+        with self.read_lock:
+            for mapped in self.maps.values():
+                mapped.close()
+            self.maps.clear()
+
+    # ------------------------------------------------------------------ lettura
+
+    def mapped(self, path):
+        mapped = self.maps.get(path)
+        if mapped is None:
+            mapped = self.maps[path] = MappedFile(path)
+        return mapped.view()
+
+    # Identificativo dell'utente letto da users.json (ricaricato solo se il file è cambiato)
+    def user_id(self, username):
+        try:
+            mtime = os.path.getmtime(self.users_path)
+        except OSError:
+            return None
+        if mtime != self.users_mtime:
+            self.users_mtime = mtime
+            self.known_users = self.load_users()
+        return self.known_users.get(username)
+
+    # Record con sequenza seq; i messaggi privati hanno anche 'recipient'
+    def read_record(self, data, index, seq):
+        (offset,) = OFFSET.unpack_from(index, seq * OFFSET.size)
+        timestamp, code, user_length, message_length = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        record = {
+            'seq': seq,
+            'timestamp': timestamp,
+            'type': TYPE_NAMES.get(code, 'system'),
+            'username': data[start:start + user_length].decode('utf-8'),
+            'message': data[start + user_length:start + user_length + message_length].decode('utf-8'),
+        }
+        if record['type'] == 'direct_message':
+            # gli archivi precedenti hanno "mittente -> destinatario" come username e nessun destinatario separato
+            username, _, recipient = record['username'].partition(RECIPIENT_SEPARATOR)
+            record['username'] = username
+            record['recipient'] = recipient or None
+        return record
+
+    # Utenti nei cui indici compare il record: l'autore e, per i messaggi privati, il destinatario
+    def record_users(self, record):
+        if record.get('recipient') is not None:
+            return (record['username'], record['recipient'])
+        return (record['username'],)
+
+    # Numero di messaggi visibili ai lettori (quelli con l'indice per sequenza già su disco)
+    def __len__(self):
+        with self.read_lock:
+            index = self.mapped(self.index_path)
+            return len(index) // OFFSET.size if index is not None else 0
+
+    # Restituisce una pagina di messaggi in ordine cronologico, partendo dai più recenti.
+    #   before:   restituisce solo messaggi con sequenza minore (cursore della pagina precedente)
+    #   username: solo i messaggi di questo utente (compresi i privati che ha scritto o ricevuto)
+    #   contains: solo i messaggi che contengono questa parola
+    # Il risultato contiene 'messages' e 'next_before', da passare come before per la pagina successiva
+    # (None quando non ci sono messaggi più vecchi).
+    def query(self, limit=HISTORY_PAGE_SIZE, before=None, username=None, contains=None):
+        with self.read_lock:
+            index = self.mapped(self.index_path)
+            data = self.mapped(self.data_path)
+            if index is None or data is None or limit <= 0:
+                return {'messages': [], 'next_before': None}
+            count = len(index) // OFFSET.size
+            end = count if before is None else max(0, min(before, count))
+
+            token = None
+            if contains is not None:
+                tokens = tokenize(contains)
+                if len(tokens) != 1:
+                    raise ValueError("La ricerca per parola accetta una sola parola")
+                token = tokens.pop()
+
+            if username is not None:
+                candidates = self.user_candidates(username, end)
+            elif token is not None and self.token_index:
+                candidates = self.token_candidates(token, end)
+            else:
+                candidates = range(end - 1, -1, -1)
+
+            messages = []
+            for seq in candidates:
+                record = self.read_record(data, index, seq)
+                if username is not None and username not in self.record_users(record):
+                    continue
+                if token is not None and token not in tokenize(record['message']):
+                    continue
+                messages.append(record)
+                if len(messages) == limit:
+                    break
+
+            next_before = messages[-1]['seq'] if len(messages) == limit and messages[-1]['seq'] > 0 else None
+            messages.reverse()
+            return {'messages': messages, 'next_before': next_before}
+
+    # Sequenze dei messaggi dell'utente minori di end, dalla più recente, lette dal suo indice
+    def user_candidates(self, username, end):
+        user_id = self.user_id(username)
+        if user_id is None:
+            return
+        seqs = self.mapped(self.user_path(user_id))
+        if seqs is None:
+            return
+        # le sequenze sono crescenti: ricerca binaria della prima posizione con sequenza >= end
+        low, high = 0, len(seqs) // SEQ.size
+        while low < high:
+            middle = (low + high) // 2
+            if SEQ.unpack_from(seqs, middle * SEQ.size)[0] < end:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low - 1, -1, -1):
+            yield SEQ.unpack_from(seqs, position * SEQ.size)[0]
+
+    # Sequenze candidate per la parola, dalla più recente: il bucket viene scandito a ritroso a blocchi crescenti
+    # e i falsi positivi dovuti a collisioni del crc32 vengono scartati controllando il messaggio
+    def token_candidates(self, token, end):
+        crc = token_hash(token)
+        entries = self.mapped(self.bucket_path(crc % self.token_buckets))
+        if entries is None:
+            return
+        position = len(entries) // TOKEN_ENTRY.size
+        chunk_size = SCAN_CHUNK
+        while position > 0:
+            start = max(0, position - chunk_size)
+            chunk_size = min(chunk_size * 2, MAX_SCAN_CHUNK)
+            chunk = list(TOKEN_ENTRY.iter_unpack(entries[start * TOKEN_ENTRY.size:position * TOKEN_ENTRY.size]))
+            for entry_crc, seq in reversed(chunk):
+                if entry_crc == crc and seq < end:
+                    yield seq
+            position = start
@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from utils.helpers import format_timestamp
+from constants.constants import LOG_BATCH_SIZE
+from constants.constants import LOG_FLUSH_INTERVAL
+from constants.constants import LOG_FSYNC_INTERVAL
+from constants.constants import LOG_FSYNC_POLICY
+from constants.constants import LOG_QUEUE_SIZE
+from constants.constants import LOG_ROTATE_BYTES
+from constants.constants import LOG_ROTATE_SECONDS
+
+# Scrittura in streaming del log della chat.
+# Le voci vengono accodate (coda limitata, quindi memoria costante) e un thread in background
+# le scrive su disco a gruppi ogni LOG_FLUSH_INTERVAL secondi: una sola write per gruppo, seguita dal flush.
+# Il file mantiene il formato leggibile dei .log: durante la scrittura si chiama
+# chat_log_<utente>_<inizio>.log e alla chiusura (o alla rotazione) viene completato con l'orario
+# di fine nell'intestazione e rinominato in chat_log_<utente>_<inizio>_to_<fine>.log.
+
+FSYNC_NEVER = "never"         # solo flush verso il sistema operativo
+FSYNC_INTERVAL = "interval"   # fsync al più ogni LOG_FSYNC_INTERVAL secondi
+FSYNC_ALWAYS = "always"       # fsync dopo ogni scrittura su disco
+
+SEPARATOR = "=" * 80
+SESSION_END_PLACEHOLDER = "in corso".ljust(19) # stessa larghezza di un orario completo, sovrascritto alla chiusura
+
+# Formatta una voce di log (timestamp, tipo, username, messaggio) come riga del file
+def format_entry(timestamp, msg_type, username, message):
+    timestamp = format_timestamp(timestamp)
+    if msg_type == 'chat_message':
+        return f"[{timestamp}] {username}: {message}\n"  # messaggio di un client
+    if msg_type == 'server_message':
+        return f"[{timestamp}] {username} (SERVER): {message}\n" # messaggio del server con identificazione specifica
+    if msg_type == 'direct_message':
+        sender, recipient = username # per i messaggi privati username è la coppia (mittente, destinatario)
+        return f"[{timestamp}] {sender} -> {recipient} (privato): {message}\n"
+    if msg_type == 'system':
+        return f"[{timestamp}] >>> {message}\n" # messaggio di sistema (connessioni, disconnessioni, etc.)
+    return ""
+
+class ChatLogWriter:
+    # header_lines è una funzione che restituisce le righe descrittive (modalità, server, ...)
+    # da scrivere nell'intestazione di ogni nuovo file; history è l'eventuale archivio indicizzato
+    # che riceve gli stessi gruppi di voci
+    def __init__(self, directory, username, header_lines=None, history=None,
+                 batch_size=LOG_BATCH_SIZE, queue_size=LOG_QUEUE_SIZE, flush_interval=LOG_FLUSH_INTERVAL,
+                 fsync_policy=LOG_FSYNC_POLICY, fsync_interval=LOG_FSYNC_INTERVAL,
+                 rotate_bytes=LOG_ROTATE_BYTES, rotate_seconds=LOG_ROTATE_SECONDS):
+        self.directory = directory
+        self.username = username
+        self.header_lines = header_lines or (lambda: [])
+        self.history = history
+        self.batch_size = batch_size
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+
+        self.entries = deque()      # voci in attesa: append/popleft sono atomici, nessun lock sul percorso caldo
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()  # risveglia il writer prima della scadenza quando la coda si riempie
+        self.thread = None
+        self.closed = False
+        self.dropped = 0            # voci scartate perché la coda era piena (disco troppo lento)
+        self.unreported = 0         # voci scartate non ancora segnalate nel file
+        self.written = 0            # voci scritte su disco
+        self.saved_files = []       # file completati (chiusi o ruotati)
+
+        # stato del file corrente, usato solo dal thread di scrittura
+        self.file = None
+        self.path = None
+        self.started = None
+        self.size = 0
+        self.end_offset = 0         # posizione dell'orario di fine nell'intestazione
+        self.last_write = 0.0
+        self.last_fsync = 0.0
+        self.cached_second = None
+        self.cached_time = ""
+
+    # Accoda una voce senza mai bloccare il chiamante; il thread di scrittura parte alla prima voce
+    def append(self, timestamp, msg_type, username, message):
+        if self.closed:
+            return
+        if self.thread is None:
+            self.start()
+        if len(self.entries) >= self.queue_size:
+            with self.lock:
+                self.dropped += 1
+                self.unreported += 1
+            return
+        self.entries.append((timestamp, msg_type, username, message))
+        if len(self.entries) == self.queue_size // 2:
+            self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None and not self.closed:
+                self.thread = threading.Thread(target=self.run, daemon=True, name="LogWriterThread")
+                self.thread.start()
+
+    # Ciclo del thread di scrittura: ogni flush_interval scrive tutte le voci arrivate nel frattempo
+    def run(self):
+        while not self.closed:
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            self.drain()
+        self.drain()
+        try:
+            self.close_file()
+            if self.history is not None:
+                self.history.close()
+        except OSError as e:
+            print(f"Errore nella scrittura del log: {e}")
+
+    # Svuota la coda a gruppi di al più batch_size voci (una write ciascuno), poi esegue fsync e rotazione a tempo.
+    # Con la politica "always" l'fsync avviene a ogni risveglio, dopo tutte le voci arrivate nel frattempo.
+    def drain(self):
+        try:
+            while self.entries:
+                batch = []
+                popleft = self.entries.popleft
+                while self.entries and len(batch) < self.batch_size:
+                    batch.append(popleft())
+                self.write_batch(batch)
+            if self.fsync_policy == FSYNC_ALWAYS and self.file is not None and self.last_fsync < self.last_write:
+                self.sync()
+            self.maintain()
+        except OSError as e:
+            print(f"Errore nella scrittura del log: {e}")
+
+    # Operazioni periodiche: fsync in sospeso e rotazione a tempo
+    def maintain(self):
+        if self.file is None:
+            return
+        if self.rotate_seconds and time.time() - self.started >= self.rotate_seconds:
+            self.close_file()
+        elif self.fsync_policy == FSYNC_INTERVAL and self.last_fsync < self.last_write \
+                and time.time() - self.last_fsync >= self.fsync_interval:
+            self.sync()
+
+    def write_batch(self, batch):
+        if self.file is None:
+            self.open_file()
+
+        with self.lock:
+            dropped, self.unreported = self.unreported, 0
+        format_time = self.format_time
+        lines = [format_entry(format_time(timestamp), msg_type, username, message)
+                 for timestamp, msg_type, username, message in batch]
+        if dropped:
+            lines.append(f"[{format_timestamp(time.time())}] >>> {dropped} messaggi non registrati (log sovraccarico)\n")
+
+        data = "".join(lines).encode('utf-8')
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+        self.written += len(batch)
+        self.last_write = time.time()
+        if self.history is not None:
+            self.history.append_batch(batch)
+
+        # rotazione per dimensione o per durata del file corrente
+        if (self.rotate_bytes and self.size >= self.rotate_bytes) or (
+                self.rotate_seconds and self.last_write - self.started >= self.rotate_seconds):
+            self.close_file()
+
+    # Formatta l'orario della voce riusando il testo già calcolato per lo stesso secondo
+    def format_time(self, timestamp):
+        if isinstance(timestamp, str):
+            return timestamp
+        second = int(timestamp)
+        if second != self.cached_second:
+            self.cached_second = second
+            self.cached_time = format_timestamp(second)
+        return self.cached_time
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.last_fsync = time.time()
+
+    # Apre un nuovo file scrivendo l'intestazione; l'orario di fine resta un segnaposto fino alla chiusura
+    def open_file(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.started = time.time()
+        session_start = datetime.fromtimestamp(self.started)
+        self.path = os.path.join(self.directory, f"chat_log_{self.username}_{session_start.strftime('%Y%m%d_%H%M%S')}.log")
+        self.file = open(self.path, 'wb')
+
+        header = f"{SEPARATOR}\nCHAT LOG - Utente: {self.username}\nSessione: {session_start.strftime('%Y-%m-%d %H:%M:%S')} - "
+        self.end_offset = len(header.encode('utf-8'))
+        header += SESSION_END_PLACEHOLDER + "\n"
+        for line in self.header_lines():
+            header += line + "\n"
+        header += SEPARATOR + "\n\n"
+
+        data = header.encode('utf-8')
+        self.file.write(data)
+        self.size = len(data)
+        self.last_write = self.last_fsync = self.started
+
+    # Chiude il file corrente: scrive il footer, completa l'orario di fine e rinomina il file con l'intervallo
+    def close_file(self):
+        if self.file is None:
+            return
+        now = datetime.now()
+        try:
+            self.file.write(("\n" + SEPARATOR + "\nFINE LOG\n").encode('utf-8'))
+            self.file.seek(self.end_offset)
+            self.file.write(now.strftime('%Y-%m-%d %H:%M:%S').encode('utf-8'))
+            self.file.flush()
+            if self.fsync_policy != FSYNC_NEVER:
+                os.fsync(self.file.fileno())
+        finally:
+            self.file.close()
+            self.file = None
+
+        # più rotazioni nello stesso secondo producono lo stesso intervallo: si aggiunge un progressivo
+        base = f"{self.path[:-len('.log')]}_to_{now.strftime('%Y%m%d_%H%M%S')}"
+        final_path = f"{base}.log"
+        counter = 1
+        while os.path.exists(final_path):
+            final_path = f"{base}_{counter}.log"
+            counter += 1
+        os.replace(self.path, final_path)
+        self.saved_files.append(final_path)
+
+    # Scrive le voci ancora in coda, chiude il file corrente e ferma il thread. Restituisce i file completati.
+    def close(self, timeout=5.0):
+        with self.lock:
+            if self.closed:
+                return self.saved_files
+            self.closed = True
+            thread = self.thread
+        if thread is not None:
+            self.wakeup.set()
+            thread.join(timeout)
+        return self.saved_files
@@ -0,0 +1,86 @@
+from types import MappingProxyType
+
+# Istantanea immutabile dei client connessi a un server, con gli indici per nome e per stanza.
+# Ogni join, uscita o cambio di iscrizione crea una nuova istantanea (copy-on-write) che il nodo pubblica con un
+# solo assegnamento: broadcast, controlli dei nomi e peer list leggono una versione stabile senza lock e senza
+# copiarla, anche mentre un altro thread la sostituisce. Le modifiche passano tutte dai metodi di ChatNode
+# (add_client, remove_client, ...), serializzate da un unico lock.
+# I dizionari info dei singoli client, e gli indici che una variazione non tocca, restano condivisi tra le versioni.
+class ClientSnapshot:
+    def __init__(self, clients=None, by_name=None, rooms=None, version=0, successor=None):
+        clients = {} if clients is None else clients
+        self.version = version
+        self.clients = read_only(clients)                           # socket -> info
+        self.by_name = read_only(by_name or {})                     # username -> socket
+        self.rooms = read_only(rooms or {})                         # stanza -> frozenset dei socket iscritti
+        self.entries = tuple(clients.items())                       # coppie (socket, info) per i broadcast
+        # client più anziano, cioè il successore designato (ricalcolato solo se non è noto)
+        if successor is None and clients:
+            successor = min(clients.values(), key=lambda info: info['connection_time'])
+        self.successor = successor
+        self.peer_list = None   # peer list di questa versione, costruita al primo uso (get_peer_list_for_client)
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Nuova versione con un client in più, iscritto alle stanze del suo info['rooms']
+    def with_client(self, client_socket, client_info):
+        clients = dict(self.clients)
+        clients[client_socket] = client_info
+        by_name = dict(self.by_name)
+        by_name[client_info['username']] = client_socket
+        rooms = dict(self.rooms)
+        for room in client_info['rooms']:
+            rooms[room] = rooms.get(room, frozenset()) | {client_socket}
+        successor = self.successor
+        if successor is None or client_info['connection_time'] < successor['connection_time']:
+            successor = client_info
+        return ClientSnapshot(clients, by_name, rooms, self.version + 1, successor)
+
+    # Nuova versione senza il client (e le sue iscrizioni); la stessa istantanea se il client non c'è
+    def without_client(self, client_socket):
+        client_info = self.clients.get(client_socket)
+        if client_info is None:
+            return self
+        clients = dict(self.clients)
+        del clients[client_socket]
+        by_name = dict(self.by_name)
+        if by_name.get(client_info['username']) is client_socket:
+            del by_name[client_info['username']]
+        # le iscrizioni si ricavano dall'indice di questa versione, non da info['rooms'] che altri thread modificano
+        rooms = dict(self.rooms)
+        for room, members in self.rooms.items():
+            if client_socket in members:
+                discard_member(rooms, room, client_socket)
+        successor = self.successor if self.successor is not client_info else None
+        return ClientSnapshot(clients, by_name, rooms, self.version + 1, successor)
+
+    def with_room_member(self, room, client_socket):
+        rooms = dict(self.rooms)
+        rooms[room] = rooms.get(room, frozenset()) | {client_socket}
+        return ClientSnapshot(self.clients, self.by_name, rooms, self.version + 1, self.successor)
+
+    def without_room_member(self, room, client_socket):
+        rooms = dict(self.rooms)
+        discard_member(rooms, room, client_socket)
+        return ClientSnapshot(self.clients, self.by_name, rooms, self.version + 1, self.successor)
+
+    # Stessi client con una nuova versione: invalida la peer list quando cambia un dato che vi compare
+    # (es. la porta di riserva del successore o il successore scelto dal processo principale)
+    def refreshed(self):
+        return ClientSnapshot(self.clients, self.by_name, self.rooms, self.version + 1,
+                              self.successor)
+
+# Vista in sola lettura di un dizionario; un indice già condiviso con la versione precedente resta com'è
+def read_only(mapping):
+    return mapping if isinstance(mapping, MappingProxyType) else MappingProxyType(mapping)
+
+# Toglie un socket dagli iscritti di una stanza, eliminando la stanza rimasta vuota
+def discard_member(rooms, room, client_socket):
+    members = rooms.get(room)
+    if members is not None and client_socket in members:
+        members = members - {client_socket}
+        if members:
+            rooms[room] = members
+        else:
+            del rooms[room]
@@ -0,0 +1,220 @@
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from constants.constants import METRICS_LATENCY_BUCKETS
+
+# Registro delle metriche del nodo, senza dipendenze esterne.
+# Contatori e istogrammi vengono aggiornati sui percorsi caldi con un solo lock per metrica e un'operazione su dict;
+# i gauge (backlog dei client, dimensione della membership) non costano nulla finché non vengono letti,
+# perché sono calcolati solo al momento della lettura da una funzione.
+# Il registro si legge in formato testo Prometheus (endpoint HTTP locale) o come riepilogo a console (comando stats).
+
+# Valore di un'etichetta nel formato testo Prometheus
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, description, label=None):
+        self.name = name
+        self.description = description
+        self.label = label                          # nome dell'unica etichetta (es. type), None per un valore singolo
+        self.values = {} if label else {None: 0}    # valore dell'etichetta -> totale
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, label=None):
+        with self.lock:
+            self.values[label] = self.values.get(label, 0) + amount
+
+    def get(self, label=None):
+        return self.values.get(label, 0)
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items(), key=lambda item: str(item[0]))
+        for label, value in values:
+            yield self.name, {self.label: label} if self.label else {}, value
+
+# Gauge calcolato alla lettura: function restituisce un numero oppure un dizionario etichetta -> valore
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, description, function, label=None):
+        self.name = name
+        self.description = description
+        self.function = function
+        self.label = label
+
+    def samples(self):
+        value = self.function()
+        if self.label is None:
+            yield self.name, {}, value
+            return
+        for label, item in sorted(value.items(), key=lambda item: str(item[0])):
+            yield self.name, {self.label: label}, item
+
+# Istogramma a intervalli fissi (limiti superiori in secondi): osservare un valore costa una ricerca binaria
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, description, buckets=METRICS_LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # l'ultimo intervallo raccoglie i valori oltre l'ultimo limite
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    # Stima del quantile q (0-1): limite superiore dell'intervallo che lo contiene
+    def quantile(self, q):
+        with self.lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return 0.0
+        target = q * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            yield f"{self.name}_bucket", {'le': format_value(float(bound))}, cumulative
+        yield f"{self.name}_bucket", {'le': "+Inf"}, count
+        yield f"{self.name}_sum", {}, total
+        yield f"{self.name}_count", {}, count
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.server = None # endpoint HTTP, se avviato
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, description, label=None):
+        return self.register(Counter(name, description, label))
+
+    def gauge(self, name, description, function, label=None):
+        return self.register(Gauge(name, description, function, label))
+
+    def histogram(self, name, description, buckets=METRICS_LATENCY_BUCKETS):
+        return self.register(Histogram(name, description, buckets))
+
+    # Tutte le metriche nel formato testo di Prometheus (versione 0.0.4)
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                if labels:
+                    rendered = ",".join(f'{key}="{escape_label(item)}"' for key, item in labels.items())
+                    lines.append(f"{name}{{{rendered}}} {format_value(value)}")
+                else:
+                    lines.append(f"{name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    # Riepilogo leggibile per la console: una riga per metrica, gli istogrammi con conteggio, media e p50/p99
+    def summary(self):
+        lines = []
+        for metric in self.metrics:
+            if isinstance(metric, Histogram):
+                mean = metric.sum / metric.count if metric.count else 0.0
+                lines.append(f"{metric.name}: {metric.count} osservazioni, media {mean * 1000:.3f} ms, "
+                             f"p50 <= {metric.quantile(0.5) * 1000:g} ms, p99 <= {metric.quantile(0.99) * 1000:g} ms")
+                continue
+            samples = list(metric.samples())
+            if len(samples) == 1 and not samples[0][1]:
+                lines.append(f"{metric.name}: {format_value(samples[0][2])}")
+            elif samples:
+                values = ", ".join(f"{next(iter(labels.values()))}={format_value(value)}" for _, labels, value in samples)
+                lines.append(f"{metric.name}: {values}")
+            else:
+                lines.append(f"{metric.name}: -")
+        return lines
+
+    # Avvia l'endpoint HTTP in un thread: GET /metrics restituisce il testo Prometheus.
+    # Restituisce la porta effettiva (utile con port=0)
+    def serve(self, host, port):
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass # nessuna riga a console per ogni lettura
+
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="MetricsEndpoint", daemon=True).start()
+        return self.server.server_address[1]
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# Metriche di un nodo della chat. I gauge leggono lo stato del nodo solo quando il registro viene letto
+class ChatMetrics(MetricsRegistry):
+    def __init__(self, node):
+        super().__init__()
+        self.messages_received = self.counter("chat_messages_received_total", "Messaggi ricevuti per tipo", "type")
+        self.bytes_received = self.counter("chat_bytes_received_total",
+                                           "Byte dei frame ricevuti per tipo (payload non compresso e header)", "type")
+        self.messages_sent = self.counter("chat_messages_sent_total",
+                                          "Messaggi inviati per tipo (un broadcast conta una volta per destinatario)", "type")
+        self.bytes_sent = self.counter("chat_bytes_sent_total",
+                                       "Byte dei frame inviati per tipo (payload non compresso e header)", "type")
+        self.broadcast_duration = self.histogram("chat_broadcast_duration_seconds",
+                                                 "Durata di un broadcast: numerazione, codifica e accodamento verso tutti i destinatari")
+        self.relay_latency = self.histogram("chat_relay_latency_seconds",
+                                            "Tempo dalla ricezione di un messaggio di chat al suo inoltro a client e server federati")
+        self.elections_started = self.counter("chat_elections_started_total", "Elezioni avviate da questo nodo")
+        self.elections_won = self.counter("chat_elections_won_total", "Elezioni vinte da questo nodo")
+        self.reconnect_attempts = self.counter("chat_reconnect_attempts_total",
+                                               "Tentativi di riconnessione a un nuovo server")
+        self.gauge("chat_membership_size", "Utenti nella chat, compresi il server e gli utenti dei server federati",
+                   node.membership_size)
+        self.gauge("chat_client_outbound_backlog_bytes", "Byte in coda verso ciascun client", node.outbound_backlog,
+                   "client")
+
+    def received(self, message_type, size):
+        self.messages_received.inc(1, message_type)
+        self.bytes_received.inc(size, message_type)
+
+    def sent(self, message_type, size, count=1):
+        self.messages_sent.inc(count, message_type)
+        self.bytes_sent.inc(size, message_type)
@@ -0,0 +1,191 @@
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+from chat.framing import frame_length
+from constants.constants import OUTBOUND_HIGH_WATERMARK
+from constants.constants import OUTBOUND_LOW_WATERMARK
+from constants.constants import SLOW_CONSUMER_POLICY
+
+# Politiche applicate a un client che supera la soglia alta della propria coda in uscita
+POLICY_DROP_OLDEST = "drop_oldest"  # scarta i frame più vecchi ancora in coda fino a tornare sotto la soglia bassa
+POLICY_DISCONNECT = "disconnect"    # il client viene disconnesso tramite disconnect_client
+
+# Numero massimo di buffer passati a una singola sendmsg
+IOV_MAX = min(os.sysconf('SC_IOV_MAX'), 1024) if hasattr(os, 'sysconf') else 16
+
+# Errore sollevato quando un client lento deve essere disconnesso secondo la politica configurata
+class SlowConsumerError(ConnectionError):
+    pass
+
+# Coda in uscita limitata associata a una singola connessione.
+# Chi invia (broadcast, risposte del server) accoda i frame senza mai bloccarsi sul socket;
+# i frame accodati per lo stesso socket vengono poi scritti insieme con una sola sendmsg vettoriale;
+# la coda viene svuotata in modo indipendente da un thread scrittore dedicato (motore a thread)
+# oppure dall'event loop quando il socket è scrivibile (motore "selector").
+# Le soglie alta e bassa sono espresse in byte: superata la soglia alta si applica la politica
+# per i client lenti, e il client torna "sano" solo quando la coda scende sotto la soglia bassa.
+# Con coalesce > 0 (profilo di trasporto "throughput") il thread scrittore attende coalesce secondi dall'arrivo
+# del primo frame prima di scrivere, così i frame accodati nel frattempo partono con la stessa sendmsg.
+# I frame di dati dei file (put_bulk) hanno una corsia separata a priorità inferiore: ne viene prelevato uno alla
+# volta e solo quando non restano messaggi da scrivere, così un messaggio di chat attende al più un blocco.
+# La corsia non è soggetta alle soglie: la sua dimensione è limitata dal controllo di flusso dei trasferimenti.
+class OutboundQueue:
+    def __init__(self, high_watermark=OUTBOUND_HIGH_WATERMARK, low_watermark=OUTBOUND_LOW_WATERMARK,
+                 policy=SLOW_CONSUMER_POLICY, on_data=None, coalesce=0.0):
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.policy = policy
+        self.on_data = on_data              # callback invocata quando la coda passa da vuota a non vuota
+        self.coalesce = coalesce            # secondi di attesa per unire i frame prima di una scrittura bloccante
+        self.first_at = 0.0                 # istante (monotonic) in cui la coda è passata da vuota a non vuota
+        self.frames = deque()
+        self.queued_bytes = 0
+        self.bulk = deque()                 # frame di dati dei file, scritti dopo i messaggi
+        self.bulk_bytes = 0
+        self.partial = []                   # buffer prelevati dalla coda e non ancora scritti (il primo può essere parziale)
+        self.congested = False              # True da quando si supera la soglia alta finché non si scende sotto quella bassa
+        self.dropped_frames = 0
+        self.syscalls = 0                   # numero di chiamate sendmsg eseguite
+        self.bytes_sent = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()  # serializza chi scrive sul socket (scrittore, event loop, flush finale)
+
+    # Accoda un frame (bytes oppure tupla immutabile di parti condivisa tra più destinatari).
+    # Restituisce False se il client va disconnesso perché troppo lento.
+    def put(self, frame):
+        if not isinstance(frame, tuple):
+            frame = (frame,)
+        size = frame_length(frame)
+
+        with self.condition:
+            if self.closed:
+                return True
+            was_empty = not self.frames and not self.partial and not self.bulk
+            self.frames.append(frame)
+            self.queued_bytes += size
+
+            if self.queued_bytes > self.high_watermark:
+                self.congested = True
+                if self.policy == POLICY_DISCONNECT:
+                    return False
+                # scarta i frame più vecchi (mai quello appena accodato) fino alla soglia bassa
+                while self.queued_bytes > self.low_watermark and len(self.frames) > 1:
+                    self.queued_bytes -= frame_length(self.frames.popleft())
+                    self.dropped_frames += 1
+
+            if was_empty:
+                self.first_at = time.monotonic()
+                self.condition.notify() # il thread scrittore attende solo quando la coda è vuota
+
+        if was_empty and self.on_data:
+            self.on_data()
+        return True
+
+    # Accoda un frame di dati nella corsia a bassa priorità
+    def put_bulk(self, frame):
+        with self.condition:
+            if self.closed:
+                return
+            was_empty = not self.frames and not self.partial and not self.bulk
+            self.bulk.append(frame)
+            self.bulk_bytes += frame_length(frame)
+            if was_empty:
+                self.condition.notify()
+        if was_empty and self.on_data:
+            self.on_data()
+
+    # Indica se ci sono ancora dati da scrivere
+    def has_pending(self):
+        with self.condition:
+            return bool(self.frames) or bool(self.partial) or bool(self.bulk)
+
+    # Sposta i frame accodati nella lista dei buffer da scrivere (da chiamare con il lock acquisito).
+    # I buffer vengono solo referenziati: nessun payload viene copiato.
+    # Un frame di dati viene aggiunto solo se non c'è altro da scrivere.
+    def _take_all(self):
+        for frame in self.frames:
+            self.partial.extend(frame)
+        self.frames.clear()
+        self.queued_bytes = 0
+        self.congested = False
+        if not self.partial and self.bulk:
+            frame = self.bulk.popleft()
+            self.bulk_bytes -= frame_length(frame)
+            self.partial.extend(frame)
+
+    # Scrive i buffer in attesa con una singola sendmsg (fino a IOV_MAX buffer per chiamata)
+    # e scarta quelli inviati completamente. Restituisce True quando non resta nulla da scrivere.
+    def _write_vectored(self, sock):
+        sent = sock.sendmsg(self.partial[:IOV_MAX])
+        self.syscalls += 1
+        self.bytes_sent += sent
+        index = 0
+        while index < len(self.partial) and sent >= len(self.partial[index]):
+            sent -= len(self.partial[index])
+            index += 1
+        del self.partial[:index]
+        if sent:
+            self.partial[0] = memoryview(self.partial[0])[sent:] # buffer inviato solo in parte
+        return not self.partial
+
+    # Usata dal thread scrittore: attende fino a timeout secondi che ci siano frame e li scrive
+    # in modo bloccante. Solo il thread scrittore di questo client resta bloccato sul socket.
+    def write_blocking(self, sock, timeout=1.0):
+        with self.condition:
+            if not self.frames and not self.bulk and not self.closed:
+                self.condition.wait(timeout)
+            if self.coalesce and self.frames:
+                # attende che scada la finestra di unione (i nuovi frame non risvegliano lo scrittore)
+                delay = self.first_at + self.coalesce - time.monotonic()
+                while delay > 0 and not self.closed:
+                    self.condition.wait(delay)
+                    delay = self.first_at + self.coalesce - time.monotonic()
+        with self.write_lock:
+            with self.condition:
+                self._take_all()
+            self._write_all(sock)
+
+    # Usata dall'event loop quando il socket è scrivibile: scrive quanto possibile senza bloccare.
+    # Restituisce True se la coda è stata svuotata completamente.
+    def write_available(self, sock):
+        with self.write_lock:
+            while True:
+                with self.condition:
+                    self._take_all()
+                    if not self.partial:
+                        return True
+                try:
+                    self._write_vectored(sock)
+                except (BlockingIOError, InterruptedError):
+                    return False
+
+    # Scrive in modo bloccante tutto ciò che resta in coda entro il tempo indicato (usata allo shutdown)
+    def flush(self, sock, timeout=1.0):
+        with self.write_lock:
+            with self.condition:
+                self._take_all()
+            self._write_all(sock, time.monotonic() + timeout)
+
+    # Scrive tutti i buffer in attesa. A differenza di sendall sopravvive ai timeout del socket
+    # (impostati dal thread di ricezione) senza perdere traccia dei byte già inviati.
+    def _write_all(self, sock, deadline=None):
+        while self.partial:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise socket.timeout("Tempo scaduto durante lo svuotamento della coda")
+            try:
+                self._write_vectored(sock)
+            except socket.timeout:
+                if self.closed and deadline is None:
+                    raise ConnectionError("Coda in uscita chiusa")
+            except (BlockingIOError, InterruptedError):
+                select.select([], [sock], [], 0.05) # socket non bloccante: attende che torni scrivibile
+
+    # Chiude la coda e risveglia l'eventuale thread scrittore in attesa
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,123 @@
+import threading
+from collections import deque
+from constants.constants import REPLAY_BUFFER_SIZE
+
+# Numerazione degli eventi e buffer di replay per un failover senza perdite.
+# Il server assegna a ogni evento inoltrato (messaggi e cambi di membership) un numero di sequenza
+# monotono; ogni nodo conserva gli ultimi eventi visti in un buffer circolare limitato.
+# Alla riconnessione il client comunica l'ultima sequenza vista e riceve in un unico batch
+# solo gli eventi mancanti. La sequenza è composta da epoca (32 bit alti) e contatore (32 bit bassi):
+# un nodo promosso a server passa all'epoca successiva, così i suoi numeri restano sempre
+# maggiori di quelli assegnati dal server precedente anche se non li ha visti tutti.
+
+EPOCH_SHIFT = 32
+REPLAYED_TYPES = ('chat_message', 'server_message', 'user_joined', 'user_left') # eventi numerati dal server
+MEMBERSHIP_KEYS = ('peer_list', 'member', 'membership', 'successor') # valide solo al momento dell'invio, escluse dal buffer
+
+def sequence_epoch(seq):
+    return seq >> EPOCH_SHIFT
+
+class ReplayBuffer:
+    def __init__(self, capacity=REPLAY_BUFFER_SIZE):
+        self.capacity = capacity
+        self.events = deque()       # coppie (seq, evento) ordinate per sequenza
+        self.seqs = set()           # sequenze presenti nel buffer, per scartare i duplicati
+        self.origins = {}           # username -> {cid: seq} dei messaggi dei client, per riconoscere i reinvii
+        self.last_seq = 0           # sequenza più alta vista o assegnata
+        self.evicted_seq = 0        # sequenza più alta scartata dal buffer perché troppo vecchia
+        self.next_seq = None        # prossima sequenza da assegnare (solo in modalità server)
+        self.lock = threading.Lock()
+
+    # Inizia a numerare come server: si riparte dall'epoca successiva all'ultima sequenza vista
+    def start_epoch(self):
+        with self.lock:
+            self.next_seq = ((sequence_epoch(self.last_seq) + 1) << EPOCH_SHIFT) + 1
+
+    # Assegna la sequenza all'evento e lo conserva nel buffer (lato server).
+    # origin è il nome da registrare per gli eventi che non lo riportano (es. messaggi del server).
+    def stamp(self, event, origin=None):
+        with self.lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            event['seq'] = seq
+            self._insert(seq, event, origin)
+            return seq
+
+    # Conserva un evento già numerato; restituisce False se era già presente (duplicato)
+    def add(self, event, origin=None):
+        with self.lock:
+            seq = event['seq']
+            if seq in self.seqs:
+                return False
+            self._insert(seq, event, origin)
+            if self.next_seq is not None and seq >= self.next_seq:
+                self.next_seq = seq + 1
+            return True
+
+    # Inserisce nel buffer una copia dell'evento senza i dati di membership (validi solo al momento dell'invio
+    # e riferiti alla versione della peer list del server che li ha inviati).
+    # Gli eventi arrivano quasi sempre in ordine, quindi la posizione si cerca partendo dalla fine.
+    def _insert(self, seq, event, origin=None):
+        entry = {key: value for key, value in event.items() if key not in MEMBERSHIP_KEYS}
+        if origin is not None:
+            entry.setdefault('username', origin)
+        if not self.events or seq > self.events[-1][0]:
+            self.events.append((seq, entry))
+        else:
+            position = len(self.events)
+            while position > 0 and self.events[position - 1][0] > seq:
+                position -= 1
+            self.events.insert(position, (seq, entry))
+        self.seqs.add(seq)
+        if 'cid' in entry:
+            self.origins.setdefault(entry.get('username'), {})[entry['cid']] = seq
+        elif entry.get('fresh') and entry['type'] == 'user_joined':
+            # nuova sessione dell'utente (join senza last_seq): i suoi cid ripartono da 1, quelli delle sessioni
+            # precedenti ancora nel buffer non devono far scambiare i nuovi messaggi per reinvii già numerati
+            self.origins.pop(entry['username'], None)
+        self.last_seq = max(self.last_seq, seq)
+
+        # buffer pieno: si scartano gli eventi più vecchi
+        while len(self.events) > self.capacity:
+            old_seq, old_entry = self.events.popleft()
+            self.seqs.discard(old_seq)
+            self.evicted_seq = max(self.evicted_seq, old_seq)
+            if 'cid' in old_entry:
+                cids = self.origins.get(old_entry.get('username'))
+                if cids is not None and cids.get(old_entry['cid']) == old_seq: # non un cid riusato da una sessione successiva
+                    del cids[old_entry['cid']]
+                    if not cids:
+                        del self.origins[old_entry.get('username')]
+
+    def contains(self, seq):
+        with self.lock:
+            return seq in self.seqs
+
+    # Prima connessione a un server: gli eventi precedenti non vanno recuperati
+    def set_baseline(self, seq):
+        with self.lock:
+            self.last_seq = max(self.last_seq, seq)
+
+    # Sequenza già assegnata al messaggio con questo identificativo del client, se presente
+    def find_origin(self, username, cid):
+        with self.lock:
+            cids = self.origins.get(username)
+            return cids.get(cid) if cids is not None else None
+
+    # Eventi con sequenza maggiore di seq, in ordine, escludendo quelli inviati da exclude_username
+    # e, se rooms è indicato, quelli delle stanze che non vi compaiono.
+    # Il secondo valore indica se mancano eventi perché più vecchi di quelli ancora nel buffer.
+    def since(self, seq, exclude_username=None, rooms=None):
+        with self.lock:
+            truncated = self.evicted_seq > seq
+            events = []
+            for event_seq, event in reversed(self.events):
+                if event_seq <= seq:
+                    break
+                if exclude_username is not None and event.get('username') == exclude_username:
+                    continue
+                if rooms is not None and event.get('room') is not None and event['room'] not in rooms:
+                    continue
+                events.append(event)
+            events.reverse()
+            return events, truncated
@@ -0,0 +1,90 @@
+import contextlib
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+from constants.constants import TRACE_BUFFER_SIZE
+from constants.constants import TRACE_SAMPLE_RATE
+
+# Tracciamento a span in formato Chrome trace (apribile con Perfetto o chrome://tracing).
+# Ogni span è un evento completo (fase "X") con inizio e durata in microsecondi, il nodo come processo
+# e il thread che lo ha eseguito. Gli eventi restano in un buffer circolare di TRACE_BUFFER_SIZE voci
+# e vengono scritti su file allo shutdown (o con il comando trace): il tracciamento può restare sempre attivo.
+#   - messaggi: solo una frazione (sample_rate) viene tracciata. Il nodo che origina il messaggio sceglie se
+#     tracciarlo e gli assegna un trace id nel campo 'trace', che viaggia con il messaggio attraverso server,
+#     federazione e replay: ogni nodo registra i propri span con lo stesso id, così un messaggio si segue tra i nodi
+#   - elezioni, promozioni, riconnessioni e handshake sono rari e vengono sempre registrati
+# Gli istanti sono in tempo epoch, così le tracce di nodi diversi sulla stessa macchina si possono unire
+# (vedi utils/merge_traces.py) e allineare.
+
+class Tracer:
+    def __init__(self, name, path, sample_rate=TRACE_SAMPLE_RATE, buffer_size=TRACE_BUFFER_SIZE):
+        self.name = name
+        self.path = path
+        self.sample_rate = sample_rate
+        self.events = deque(maxlen=buffer_size)
+        self.pid = zlib.crc32(name.encode('utf-8')) % 1000000 # identificativo stabile del nodo nella traccia
+        self.offset = time.time() - time.perf_counter()      # converte gli istanti di perf_counter in tempo epoch
+        self.threads = set() # thread già descritti con un evento di metadati
+        self.lock = threading.Lock()
+
+    # Decide se tracciare un nuovo messaggio: restituisce un trace id oppure None
+    def sample(self):
+        if self.sample_rate >= 1.0 or random.random() < self.sample_rate:
+            return f"{random.getrandbits(64):016x}"
+        return None
+
+    def timestamp(self, instant):
+        return round((instant + self.offset) * 1000000, 1)
+
+    def thread_id(self):
+        tid = threading.get_native_id()
+        if tid not in self.threads:
+            with self.lock:
+                if tid not in self.threads:
+                    self.threads.add(tid)
+                    self.events.append({'ph': "M", 'name': "thread_name", 'pid': self.pid, 'tid': tid,
+                                        'args': {'name': threading.current_thread().name}})
+        return tid
+
+    # Registra uno span già misurato; start ed end sono istanti di time.perf_counter()
+    def record(self, name, category, start, end, trace_id=None, **args):
+        if trace_id is not None:
+            args['trace'] = trace_id
+        event = {'ph': "X", 'name': name, 'cat': category, 'pid': self.pid, 'tid': self.thread_id(),
+                 'ts': self.timestamp(start), 'dur': round((end - start) * 1000000, 1)}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    # Evento istantaneo (es. l'avvio di un'elezione)
+    def instant(self, name, category, **args):
+        event = {'ph': "i", 's': "p", 'name': name, 'cat': category, 'pid': self.pid, 'tid': self.thread_id(),
+                 'ts': self.timestamp(time.perf_counter())}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    # Span misurato sul blocco with; gli argomenti possono essere completati dentro il blocco tramite il dizionario restituito
+    @contextlib.contextmanager
+    def span(self, name, category, trace_id=None, **args):
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.record(name, category, start, time.perf_counter(), trace_id, **args)
+
+    # Scrive la traccia (oggetto JSON con traceEvents) e restituisce il percorso del file
+    def export(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        events = [{'ph': "M", 'name': "process_name", 'pid': self.pid, 'args': {'name': self.name}}]
+        events.extend(list(self.events))
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': "ms"}, f)
+        return path
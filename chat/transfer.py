@@ -0,0 +1,561 @@
+import hashlib
+import os
+import threading
+from chat.framing import CHUNK_HEADER
+from utils.helpers import format_size
+from constants.constants import FILE_CHUNK_SIZE
+from constants.constants import FILE_WINDOW
+from constants.constants import FILE_OFFER_TIMEOUT
+
+# Trasferimento di file (comando /send) ai partecipanti della stanza corrente o a tutta la chat.
+#   - il mittente offre il file al server (file_offer: nome, dimensione, impronta SHA-256) e, una volta accettato
+#     (file_accept), ne invia i blocchi come frame di dati: da client con sendfile, senza leggere il file in memoria
+#   - il server inoltra ogni blocco ai destinatari (i client che dichiarano 'files' nel join, più il server stesso se
+#     partecipa alla stanza) nella corsia a bassa priorità delle loro code in uscita, così la chat passa sempre avanti
+#   - ogni destinatario scrive i blocchi su disco man mano (file .part), ne calcola l'impronta e al termine lo rinomina
+#     solo se coincide; conferma l'avanzamento al server (file_progress)
+#   - il server riscontra al mittente (file_ack) la posizione raggiunta dal destinatario più lento: il mittente non
+#     supera di più di window blocchi quella posizione, così né il server né le code tengono in memoria più di
+#     window blocchi per trasferimento, qualunque sia la dimensione del file. A consegna finita il server invia file_done
+#   - l'uscita del mittente o del server annulla il trasferimento (file_cancel); un destinatario che esce viene scartato
+# I file non attraversano la federazione né il bus dei worker: arrivano ai soli client dello stesso processo server.
+
+FILE_MESSAGE_TYPES = frozenset(('file_offer', 'file_accept', 'file_data', 'file_progress', 'file_ack', 'file_done',
+                                'file_cancel'))
+
+# Identificativo casuale di un trasferimento (63 bit, così resta un intero positivo in tutti i codec)
+def new_transfer_id():
+    return int.from_bytes(os.urandom(8), 'big') >> 1
+
+# Impronta SHA-256 di un file, letto a blocchi senza caricarlo in memoria
+def file_digest(path, chunk_size=FILE_CHUNK_SIZE):
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb') as file:
+        while True:
+            read = file.readinto(buffer)
+            if not read:
+                return digest.hexdigest()
+            digest.update(view[:read])
+
+# Nome con cui salvare un file ricevuto: solo l'ultima parte del percorso indicato dal mittente
+def safe_name(name, transfer_id):
+    name = os.path.basename(str(name).replace('\\', '/')).strip()
+    return name if name not in ('', '.', '..') else f"file-{transfer_id}"
+
+# Percorso libero nella cartella: "nome (1).ext", "nome (2).ext", ... se il nome è già usato
+def unique_path(directory, name):
+    base, extension = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    counter = 1
+    while os.path.exists(path) or os.path.exists(path + ".part"):
+        path = os.path.join(directory, f"{base} ({counter}){extension}")
+        counter += 1
+    return path
+
+# File inviato da questo nodo: il thread di invio attende l'accettazione del server e poi i suoi riscontri
+class OutgoingFile:
+    def __init__(self, transfer_id, path, size, sha256, room):
+        self.transfer_id = transfer_id
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = size
+        self.sha256 = sha256
+        self.room = room
+        self.recipients = 0
+        self.accepted = False
+        self.acked = 0              # byte ricevuti da tutti i destinatari
+        self.cancelled = False
+        self.condition = threading.Condition()
+
+    def offer(self):
+        offer = {'type': 'file_offer', 'transfer': self.transfer_id, 'name': self.name, 'size': self.size,
+                 'sha256': self.sha256}
+        if self.room is not None:
+            offer['room'] = self.room
+        return offer
+
+    def accept(self, recipients):
+        with self.condition:
+            self.accepted = True
+            self.recipients = recipients
+            self.condition.notify_all()
+
+    def advance(self, offset):
+        with self.condition:
+            if offset > self.acked:
+                self.acked = offset
+                self.condition.notify_all()
+
+    # Ferma il thread di invio (annullamento, consegna conclusa o shutdown)
+    def cancel(self):
+        with self.condition:
+            self.cancelled = True
+            self.condition.notify_all()
+
+    # Attende l'accettazione dell'offerta; False se annullata o scaduta
+    def wait_accepted(self, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.accepted or self.cancelled, timeout)
+            return self.accepted and not self.cancelled
+
+    # Attende che il blocco a offset rientri nella finestra dei byte non ancora riscontrati; False se annullato
+    def wait_window(self, offset, window):
+        with self.condition:
+            self.condition.wait_for(lambda: offset - self.acked < window or self.cancelled)
+            return not self.cancelled
+
+# File in arrivo: scritto su disco man mano in un file .part, con l'impronta calcolata durante la scrittura;
+# al termine viene rinominato solo se l'impronta coincide con quella annunciata dal mittente
+class IncomingFile:
+    def __init__(self, directory, offer):
+        self.transfer_id = offer['transfer']
+        self.username = offer['username']
+        self.size = offer['size']
+        self.sha256 = offer['sha256']
+        os.makedirs(directory, exist_ok=True)
+        self.name = safe_name(offer['name'], self.transfer_id)
+        self.path = unique_path(directory, self.name)
+        self.part_path = self.path + ".part"
+        self.file = open(self.part_path, 'wb')
+        self.digest = hashlib.sha256()
+        self.received = 0
+
+    # Scrive un blocco; i blocchi arrivano in ordine (un solo stream TCP dal server)
+    def write(self, offset, data):
+        if offset != self.received or offset + len(data) > self.size:
+            raise ValueError(f"Blocco inatteso a {offset} ({len(data)} byte) dopo {self.received} byte")
+        self.file.write(data)
+        self.digest.update(data)
+        self.received += len(data)
+
+    def complete(self):
+        return self.received >= self.size
+
+    # Chiude il file e lo conserva solo se integro; restituisce True se il file è stato salvato
+    def finish(self):
+        self.file.close()
+        if self.digest.hexdigest() == self.sha256:
+            os.replace(self.part_path, self.path)
+            return True
+        self.discard()
+        return False
+
+    def cancel(self):
+        self.file.close()
+        self.discard()
+
+    def discard(self):
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+# Trasferimento inoltrato dal server: avanzamento di ciascun destinatario ancora attivo
+class RelayedFile:
+    def __init__(self, transfer_id, origin, offer, recipients, outgoing=None):
+        self.transfer_id = transfer_id
+        self.origin = origin        # socket del client mittente (None se il mittente è il server)
+        self.outgoing = outgoing    # OutgoingFile del server mittente
+        self.username = offer['username']
+        self.name = offer['name']
+        self.size = offer['size']
+        self.progress = dict.fromkeys(recipients, 0) # socket (None per il server stesso) -> byte confermati
+        self.local = None           # IncomingFile del server come destinatario
+        self.recipients = 0         # destinatari a cui il file è stato annunciato
+        self.relayed = 0            # byte inoltrati finora
+        self.acked = 0              # byte riscontrati al mittente
+        self.delivered = 0
+        self.failed = 0
+        self.finished = False
+
+class FileTransfers:
+    def __init__(self, node, directory, chunk_size=FILE_CHUNK_SIZE, window=FILE_WINDOW):
+        self.node = node
+        self.directory = directory  # cartella dei file ricevuti
+        self.chunk_size = chunk_size
+        self.window = window        # blocchi non riscontrati che il mittente può avere in volo
+        self.outgoing = {}          # id -> OutgoingFile inviati da questo nodo
+        self.incoming = {}          # id -> IncomingFile ricevuti da questo nodo come client
+        self.relays = {}            # id -> RelayedFile inoltrati da questo nodo come server
+        self.lock = threading.Lock()
+
+    # Avvia in background l'invio di un file ai partecipanti della stanza indicata (None per tutta la chat)
+    def send(self, path, room=None):
+        if not os.path.isfile(path):
+            print(f"File non trovato: {path}")
+            return False
+        if not self.node.is_server and not (self.node.is_client and self.node.connected_to_server):
+            print("Non connesso a nessuna chat!")
+            return False
+        thread = threading.Thread(target=self.run_sender, args=(path, room), name="FileSender")
+        self.node.add_thread(thread)
+        thread.start()
+        return True
+
+    # Thread di invio: calcola l'impronta, offre il file e ne invia i blocchi rispettando la finestra
+    def run_sender(self, path, room):
+        try:
+            outgoing = OutgoingFile(new_transfer_id(), path, os.path.getsize(path), file_digest(path), room)
+        except OSError as e:
+            print(f"Impossibile leggere {path}: {e}")
+            return
+        with self.lock:
+            self.outgoing[outgoing.transfer_id] = outgoing
+        try:
+            if self.node.is_server:
+                self.stream_as_server(outgoing)
+            else:
+                self.stream_as_client(outgoing)
+        except (OSError, ConnectionError) as e:
+            if not outgoing.cancelled:
+                print(f"Invio di {outgoing.name} interrotto: {e}")
+                self.forget_outgoing(outgoing)
+
+    # Da client: i blocchi passano dal file al socket del server con sendfile
+    def stream_as_client(self, outgoing):
+        connection = self.node.server_connection
+        connection.send(outgoing.offer())
+        if not outgoing.wait_accepted(FILE_OFFER_TIMEOUT):
+            if not outgoing.cancelled:
+                print(f"Invio di {outgoing.name} annullato: il server non ha accettato il file")
+                self.forget_outgoing(outgoing)
+            return
+        self.show_sending(outgoing)
+        window = self.window * self.chunk_size
+        with open(outgoing.path, 'rb') as file:
+            for offset in range(0, outgoing.size, self.chunk_size):
+                if not outgoing.wait_window(offset, window):
+                    return
+                connection.send_file_chunk(file, outgoing.transfer_id, offset,
+                                           min(self.chunk_size, outgoing.size - offset))
+
+    # Da server: ogni blocco viene letto una sola volta e condiviso tra le code di tutti i destinatari
+    def stream_as_server(self, outgoing):
+        relay = self.start_relay(None, dict(outgoing.offer(), username=self.node.username), outgoing)
+        if relay is None:
+            print(f"Invio di {outgoing.name} annullato: nessun destinatario può ricevere file")
+            self.forget_outgoing(outgoing)
+            return
+        outgoing.accept(relay.recipients)
+        self.show_sending(outgoing)
+        self.update_relay(relay) # file vuoto: la consegna è già conclusa
+        window = self.window * self.chunk_size
+        with open(outgoing.path, 'rb') as file:
+            for offset in range(0, outgoing.size, self.chunk_size):
+                if not outgoing.wait_window(offset, window):
+                    return
+                length = min(self.chunk_size, outgoing.size - offset)
+                payload = bytearray(CHUNK_HEADER.size + length) # un file accorciato lascia zeri, scartati dai destinatari
+                CHUNK_HEADER.pack_into(payload, 0, outgoing.transfer_id, offset)
+                file.readinto(memoryview(payload)[CHUNK_HEADER.size:])
+                self.relay_chunk(relay, offset, payload)
+
+    def show_sending(self, outgoing):
+        room = f" in #{outgoing.room}" if outgoing.room else ""
+        self.node.display(f">>> Invio di {outgoing.name} ({format_size(outgoing.size)}) a {outgoing.recipients} utenti{room}")
+
+    def forget_outgoing(self, outgoing):
+        outgoing.cancel()
+        with self.lock:
+            self.outgoing.pop(outgoing.transfer_id, None)
+
+    # Consegna conclusa di un file inviato da questo nodo
+    def finish_outgoing(self, transfer_id, delivered, failed):
+        with self.lock:
+            outgoing = self.outgoing.pop(transfer_id, None)
+        if outgoing is None:
+            return
+        outgoing.cancel()
+        message = f">>> {outgoing.name} consegnato a {delivered} utenti"
+        if failed:
+            message += f", non consegnato a {failed}"
+        self.node.display(message)
+
+    # --- lato server ---
+
+    # Messaggi dei trasferimenti ricevuti da un client
+    def handle_client_message(self, client_socket, client_username, message_data):
+        message_type = message_data['type']
+        if message_type == 'file_data':
+            relay = self.relays.get(message_data['transfer'])
+            if relay is not None and relay.origin is client_socket:
+                self.relay_chunk(relay, message_data['offset'], message_data['payload'])
+        elif message_type == 'file_progress':
+            relay = self.relays.get(message_data['transfer'])
+            if relay is not None:
+                self.record_progress(relay, client_socket, message_data['offset'], message_data.get('ok'))
+        elif message_type == 'file_offer':
+            self.accept_offer(client_socket, client_username, message_data)
+        elif message_type == 'file_cancel':
+            relay = self.relays.get(message_data['transfer'])
+            if relay is not None and relay.origin is client_socket:
+                self.cancel_relay(relay)
+
+    # Offerta di un client: il file viene annunciato ai destinatari e il mittente riceve il via libera
+    def accept_offer(self, client_socket, client_username, offer):
+        transfer_id = offer['transfer']
+        room = offer.get('room')
+        reason = None
+        if room is not None and client_socket not in self.node.rooms.get(room, ()):
+            reason = f"Non partecipi a #{room}: usa /join {room}"
+        elif transfer_id in self.relays or not isinstance(offer.get('size'), int) or offer['size'] < 0:
+            reason = "Offerta non valida"
+        else:
+            relay = self.start_relay(client_socket, dict(offer, username=client_username))
+            if relay is None:
+                reason = "Nessun destinatario può ricevere file"
+        if reason is not None:
+            self.node.send_to_client(client_socket, {'type': 'file_cancel', 'transfer': transfer_id, 'message': reason})
+            return
+        self.node.send_to_client(client_socket, {'type': 'file_accept', 'transfer': transfer_id,
+                                                 'recipients': relay.recipients})
+        self.node.display(f">>> {client_username} invia {relay.name} ({format_size(relay.size)}) "
+                          f"a {relay.recipients} utenti")
+        self.update_relay(relay) # file vuoto: la consegna è già conclusa
+
+    # Registra un trasferimento con i destinatari attuali e annuncia loro il file; None se non ce ne sono.
+    # L'annuncio precede nelle code i blocchi, che arrivano solo dopo il via libera al mittente
+    def start_relay(self, origin, offer, outgoing=None):
+        node = self.node
+        room = offer.get('room')
+        snapshot = node.clients
+        members = snapshot.entries if room is None else [(client_socket, snapshot.clients[client_socket])
+                                                         for client_socket in snapshot.rooms.get(room, ())
+                                                         if client_socket in snapshot.clients]
+        recipients = [client_socket for client_socket, client_info in members
+                      if client_socket is not origin and client_info.get('files')]
+        event = {key: offer[key] for key in ('transfer', 'username', 'name', 'size', 'sha256')}
+        event['type'] = 'file_offer'
+        if room is not None:
+            event['room'] = room
+
+        relay = RelayedFile(offer['transfer'], origin, event, recipients, outgoing)
+        if origin is not None and node.is_room_visible(room):
+            relay.local = self.open_incoming(event)
+            if relay.local is not None:
+                relay.progress[None] = 0
+        relay.recipients = len(relay.progress)
+        if not relay.recipients:
+            return None
+        with self.lock:
+            self.relays[relay.transfer_id] = relay
+        for client_socket in recipients:
+            node.send_to_client(client_socket, event)
+        if relay.local is not None and relay.local.complete():
+            self.finish_local(relay)
+        return relay
+
+    # Inoltra un blocco ai destinatari ancora attivi e lo scrive su disco se il server è tra loro
+    def relay_chunk(self, relay, offset, payload):
+        with self.lock:
+            recipients = tuple(relay.progress)
+        for client_socket in recipients:
+            if client_socket is None:
+                continue
+            client_info = self.node.connected_clients.get(client_socket)
+            if client_info is not None:
+                client_info['connection'].send_data(payload)
+        end = offset + len(payload) - CHUNK_HEADER.size
+        if None in recipients:
+            try:
+                relay.local.write(offset, memoryview(payload)[CHUNK_HEADER.size:])
+            except (OSError, ValueError) as e:
+                print(f"Errore nella scrittura di {relay.local.name}: {e}")
+                relay.local.cancel()
+                self.record_progress(relay, None, relay.size, False)
+            else:
+                if relay.local.complete():
+                    self.finish_local(relay)
+                else:
+                    self.record_progress(relay, None, end)
+        relay.relayed = max(relay.relayed, end)
+        self.update_relay(relay)
+
+    def finish_local(self, relay):
+        ok = relay.local.finish()
+        self.show_received(relay.local, ok)
+        self.record_progress(relay, None, relay.size, ok)
+
+    # Avanzamento di un destinatario; con ok (True o False) il destinatario ha concluso e smette di ricevere blocchi
+    def record_progress(self, relay, recipient, offset, ok=None):
+        with self.lock:
+            if recipient not in relay.progress:
+                return
+            if ok is None:
+                relay.progress[recipient] = max(relay.progress[recipient], offset)
+            else:
+                del relay.progress[recipient]
+                if ok:
+                    relay.delivered += 1
+                else:
+                    relay.failed += 1
+        self.update_relay(relay)
+
+    # Riscontra al mittente il destinatario più lento e chiude il trasferimento quando tutti hanno concluso
+    def update_relay(self, relay):
+        with self.lock:
+            if relay.finished:
+                return
+            acked = min(relay.progress.values()) if relay.progress else relay.relayed
+            advanced = acked > relay.acked
+            relay.acked = max(relay.acked, acked)
+            done = not relay.progress and relay.relayed >= relay.size
+            if done:
+                relay.finished = True
+                self.relays.pop(relay.transfer_id, None)
+        if relay.outgoing is not None:
+            if done:
+                self.finish_outgoing(relay.transfer_id, relay.delivered, relay.failed)
+            elif advanced:
+                relay.outgoing.advance(acked)
+        elif done:
+            self.node.send_to_client(relay.origin, {'type': 'file_done', 'transfer': relay.transfer_id,
+                                                    'delivered': relay.delivered, 'failed': relay.failed})
+        elif advanced:
+            self.node.send_to_client(relay.origin, {'type': 'file_ack', 'transfer': relay.transfer_id, 'offset': acked})
+
+    # Annulla un trasferimento inoltrato, avvisando i destinatari che non hanno ancora concluso
+    def cancel_relay(self, relay, notify=True):
+        with self.lock:
+            if relay.finished:
+                return
+            relay.finished = True
+            self.relays.pop(relay.transfer_id, None)
+            recipients = tuple(relay.progress)
+        for client_socket in recipients:
+            if client_socket is None:
+                relay.local.cancel()
+            elif notify:
+                self.node.send_to_client(client_socket, {'type': 'file_cancel', 'transfer': relay.transfer_id})
+        if relay.outgoing is not None:
+            self.forget_outgoing(relay.outgoing)
+        if notify:
+            self.node.display(f">>> Trasferimento di {relay.name} da {relay.username} annullato")
+
+    # Un client si è disconnesso: i suoi invii vengono annullati, le sue ricezioni contano come non consegnate
+    def client_disconnected(self, client_socket):
+        with self.lock:
+            relays = list(self.relays.values())
+        for relay in relays:
+            if relay.origin is client_socket:
+                self.cancel_relay(relay)
+            else:
+                self.record_progress(relay, client_socket, relay.size, False)
+
+    # --- lato client ---
+
+    # Messaggi dei trasferimenti ricevuti dal server
+    def handle_server_message(self, message_data):
+        message_type = message_data['type']
+        transfer_id = message_data['transfer']
+        if message_type == 'file_data':
+            self.receive_chunk(transfer_id, message_data['offset'], message_data['payload'])
+        elif message_type == 'file_ack':
+            outgoing = self.outgoing.get(transfer_id)
+            if outgoing is not None:
+                outgoing.advance(message_data['offset'])
+        elif message_type == 'file_offer':
+            self.receive_offer(message_data)
+        elif message_type == 'file_accept':
+            outgoing = self.outgoing.get(transfer_id)
+            if outgoing is not None:
+                outgoing.accept(message_data['recipients'])
+        elif message_type == 'file_done':
+            self.finish_outgoing(transfer_id, message_data['delivered'], message_data['failed'])
+        elif message_type == 'file_cancel':
+            with self.lock:
+                outgoing = self.outgoing.pop(transfer_id, None)
+                incoming = self.incoming.pop(transfer_id, None)
+            if outgoing is not None:
+                outgoing.cancel()
+                print(f"Invio di {outgoing.name} annullato: {message_data.get('message', 'annullato dal server')}")
+            if incoming is not None:
+                incoming.cancel()
+                self.node.display(f">>> Trasferimento di {incoming.name} da {incoming.username} annullato")
+
+    def receive_offer(self, offer):
+        incoming = self.open_incoming(offer)
+        if incoming is None:
+            self.report_progress(offer['transfer'], offer['size'], False)
+            return
+        with self.lock:
+            self.incoming[incoming.transfer_id] = incoming
+        self.node.display(f">>> {incoming.username} ti sta inviando {incoming.name} ({format_size(incoming.size)})")
+        if incoming.complete():
+            self.finish_incoming(incoming)
+
+    def receive_chunk(self, transfer_id, offset, payload):
+        incoming = self.incoming.get(transfer_id)
+        if incoming is None:
+            return # trasferimento già annullato o concluso con un errore
+        try:
+            incoming.write(offset, memoryview(payload)[CHUNK_HEADER.size:])
+        except (OSError, ValueError) as e:
+            print(f"Errore nella scrittura di {incoming.name}: {e}")
+            with self.lock:
+                self.incoming.pop(transfer_id, None)
+            incoming.cancel()
+            self.report_progress(transfer_id, incoming.size, False)
+            return
+        if incoming.complete():
+            self.finish_incoming(incoming)
+        else:
+            self.report_progress(transfer_id, incoming.received)
+
+    def finish_incoming(self, incoming):
+        with self.lock:
+            self.incoming.pop(incoming.transfer_id, None)
+        ok = incoming.finish()
+        self.show_received(incoming, ok)
+        self.report_progress(incoming.transfer_id, incoming.size, ok)
+
+    def report_progress(self, transfer_id, offset, ok=None):
+        message_data = {'type': 'file_progress', 'transfer': transfer_id, 'offset': offset}
+        if ok is not None:
+            message_data['ok'] = ok
+        try:
+            self.node.server_connection.send(message_data)
+        except (OSError, ConnectionError, AttributeError):
+            pass # server caduto: il trasferimento viene annullato da connection_lost
+
+    # La connessione al server è caduta: i trasferimenti in corso non possono proseguire con un altro server
+    def connection_lost(self):
+        with self.lock:
+            outgoing = list(self.outgoing.values())
+            incoming = list(self.incoming.values())
+            self.outgoing.clear()
+            self.incoming.clear()
+        for transfer in outgoing:
+            transfer.cancel()
+            self.node.display(f">>> Invio di {transfer.name} interrotto")
+        for transfer in incoming:
+            transfer.cancel()
+            self.node.display(f">>> Ricezione di {transfer.name} da {transfer.username} interrotta")
+
+    # --- comuni ---
+
+    # File in arrivo nella cartella del nodo; None se non può essere creato
+    def open_incoming(self, offer):
+        try:
+            return IncomingFile(self.directory, offer)
+        except OSError as e:
+            print(f"Impossibile salvare {offer['name']}: {e}")
+            return None
+
+    def show_received(self, incoming, ok):
+        if ok:
+            self.node.add_to_log('system', 'SYSTEM', f"{incoming.username} ha inviato il file {incoming.name}")
+            self.node.display(f">>> {incoming.name} ricevuto da {incoming.username}: salvato in {incoming.path}")
+        else:
+            self.node.display(f">>> {incoming.name} da {incoming.username} scartato: il contenuto non corrisponde "
+                              f"all'impronta SHA-256")
+
+    # Shutdown del nodo: ferma gli invii ed elimina i file ricevuti solo in parte
+    def close(self):
+        with self.lock:
+            relays = list(self.relays.values())
+        for relay in relays:
+            self.cancel_relay(relay, notify=False)
+        self.connection_lost()
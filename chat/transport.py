@@ -0,0 +1,56 @@
+import socket
+from constants.constants import TRANSPORT_COALESCE_WINDOW
+from constants.constants import TRANSPORT_SOCKET_BUFFER
+from constants.constants import KEEPALIVE_IDLE
+from constants.constants import KEEPALIVE_INTERVAL
+from constants.constants import KEEPALIVE_COUNT
+
+# Profili di trasporto scelti all'avvio del nodo e applicati a tutti i suoi socket TCP: socket di ascolto del server
+# (e di riserva del successore), client accettati, connessione del client al server e link della federazione.
+#   - "low-latency": TCP_NODELAY, ogni frame parte appena accodato (es. chat interattiva)
+#   - "throughput": Nagle attivo, buffer del socket più grandi e scritture unite: la coda in uscita di un client
+#     attende coalesce secondi dal primo frame prima di scrivere, così più messaggi partono con una sola sendmsg
+#   - "system": opzioni predefinite del sistema operativo, come prima dei profili
+# I profili con keepalive fanno chiudere dal sistema operativo le connessioni rimaste mute, anche senza heartbeat.
+class TransportProfile:
+    def __init__(self, name, nodelay=False, buffer_size=None, keepalive=False, coalesce=0.0):
+        self.name = name
+        self.nodelay = nodelay
+        self.buffer_size = buffer_size  # byte di SO_SNDBUF e SO_RCVBUF (None per quelli del sistema operativo)
+        self.keepalive = keepalive
+        self.coalesce = coalesce        # secondi per cui si attendono altri frame prima di scrivere (0 per scrivere subito)
+
+    # Opzioni di un socket connesso (o da connettere: i buffer impostati prima della connect valgono anche
+    # per la finestra TCP negoziata)
+    def apply(self, sock):
+        try:
+            if self.nodelay:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.apply_buffers(sock)
+            if self.keepalive:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                if hasattr(socket, 'TCP_KEEPIDLE'): # opzioni di regolazione non disponibili su tutti i sistemi
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+        except OSError:
+            pass # socket già chiuso dal peer: l'errore emergerà al primo invio o lettura
+
+    # Opzioni di un socket in ascolto: i buffer vengono ereditati dai socket accettati
+    def apply_listener(self, sock):
+        try:
+            self.apply_buffers(sock)
+        except OSError:
+            pass
+
+    def apply_buffers(self, sock):
+        if self.buffer_size:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.buffer_size)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.buffer_size)
+
+TRANSPORT_PROFILES = {
+    "low-latency": TransportProfile("low-latency", nodelay=True, keepalive=True),
+    "throughput": TransportProfile("throughput", buffer_size=TRANSPORT_SOCKET_BUFFER, keepalive=True,
+                                   coalesce=TRANSPORT_COALESCE_WINDOW),
+    "system": TransportProfile("system")
+}
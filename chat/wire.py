@@ -0,0 +1,199 @@
+import json
+import struct
+from utils.helpers import format_timestamp
+
+# Formati di codifica dei messaggi sul socket.
+# L'handshake (join_request / join_accepted / join_rejected / error) viaggia sempre in JSON:
+# nella join_request il client elenca i formati che supporta e nella join_accepted il server
+# indica quello scelto, che da quel momento vale in entrambe le direzioni della connessione.
+# Così i peer che conoscono solo il JSON continuano a interoperare con quelli più recenti.
+
+# Formato JSON testuale: il timestamp numerico viene convertito nel formato orario atteso dai peer JSON
+class JsonCodec:
+    name = "json"
+
+    def encode(self, message_data):
+        timestamp = message_data.get('timestamp')
+        if timestamp is not None and not isinstance(timestamp, str):
+            message_data = dict(message_data, timestamp=format_timestamp(timestamp))
+        return json.dumps(message_data).encode('utf-8')
+
+    def decode(self, payload):
+        return json.loads(payload)
+
+# Tabella di interning dei nomi utente: ogni username riceve un identificativo numerico assegnato dal server.
+# Il server comunica gli identificativi nella peer list (campo 'uid'), quindi i messaggi binari
+# possono riportare solo il numero invece della stringa.
+class InternTable:
+    def __init__(self):
+        self.ids = {}       # username -> uid
+        self.names = {}     # uid -> username
+        self.next_id = 0
+
+    # Assegna (lato server) un identificativo al nome, riusando quello esistente se già presente
+    def add(self, username):
+        uid = self.ids.get(username)
+        if uid is None:
+            uid = self.next_id
+            self.next_id += 1
+            self.ids[username] = uid
+            self.names[uid] = username
+        return uid
+
+    # Impara (lato client) gli identificativi contenuti in una peer list
+    def learn(self, peer_list):
+        for peer in peer_list:
+            if 'uid' in peer:
+                self.ids[peer['username']] = peer['uid']
+                self.names[peer['uid']] = peer['username']
+
+    def clear(self):
+        self.ids.clear()
+        self.names.clear()
+        self.next_id = 0
+
+# Formato binario compatto "bin1".
+# Ogni messaggio è: tag del tipo (1 byte) + flag dei campi presenti (1 byte) + campi opzionali + testo.
+#   - uid dell'utente (uint32) al posto della stringa 'username' nei messaggi di chat
+#   - timestamp numerico (double, epoch in secondi) al posto della stringa formattata
+#   - numero di sequenza dell'evento (uint64) e identificativo del messaggio assegnato dal client (uint32)
+#   - eventuali altri campi (es. peer_list) in un blocco JSON con lunghezza prefissata
+#   - il campo 'message' in UTF-8 occupa il resto del payload, senza lunghezza né escape
+# I tipi senza tag dedicato vengono trasportati interamente in JSON con il tag 0.
+class BinaryCodec:
+    name = "bin1"
+
+    TAG_JSON = 0
+    TYPE_TAGS = {
+        'chat_message': 1,
+        'server_message': 2,
+        'user_joined': 3,
+        'user_left': 4,
+        'server_shutdown': 5,
+        'ack': 6,
+        'heartbeat': 7,
+        'direct_message': 8,
+    }
+    TAG_TYPES = {tag: message_type for message_type, tag in TYPE_TAGS.items()}
+
+    FLAG_UID = 0x01
+    FLAG_TIMESTAMP = 0x02
+    FLAG_EXTRA = 0x04
+    FLAG_MESSAGE = 0x08
+    FLAG_SEQ = 0x10
+    FLAG_CID = 0x20
+
+    INLINE_KEYS = ('type', 'message')
+    INTERNED_TYPES = ('chat_message', 'direct_message')  # negli eventi di membership il nome viaggia in chiaro insieme alla peer list
+
+    HEAD = struct.Struct('!BB')
+    UID = struct.Struct('!I')
+    TIMESTAMP = struct.Struct('!d')
+    SEQ = struct.Struct('!Q')
+    CID = struct.Struct('!I')
+    LENGTH = struct.Struct('!I')
+
+    def __init__(self, intern=None):
+        self.intern = intern if intern is not None else InternTable()
+
+    def encode(self, message_data):
+        tag = self.TYPE_TAGS.get(message_data.get('type'))
+        if tag is None:
+            return bytes((self.TAG_JSON,)) + json.dumps(message_data).encode('utf-8')
+
+        flags = 0
+        parts = []
+        inline = 1 # campi già rappresentati senza JSON: il tipo è sempre incluso
+        uid = None
+        username = message_data.get('username')
+        if username is not None and message_data['type'] in self.INTERNED_TYPES:
+            uid = self.intern.ids.get(username)
+        timestamp = message_data.get('timestamp')
+
+        seq = message_data.get('seq')
+        cid = message_data.get('cid')
+
+        # i campi vanno scritti in ordine fisso: uid, timestamp, seq, cid, extra, messaggio
+        if uid is not None:
+            flags |= self.FLAG_UID
+            parts.append(self.UID.pack(uid))
+            inline += 1
+        if isinstance(timestamp, float):
+            flags |= self.FLAG_TIMESTAMP
+            parts.append(self.TIMESTAMP.pack(timestamp))
+            inline += 1
+        if seq is not None:
+            flags |= self.FLAG_SEQ
+            parts.append(self.SEQ.pack(seq))
+            inline += 1
+        if cid is not None:
+            flags |= self.FLAG_CID
+            parts.append(self.CID.pack(cid))
+            inline += 1
+        message = message_data.get('message')
+        if message is not None:
+            inline += 1
+
+        # solo se restano altri campi (es. peer_list) si costruisce il blocco JSON aggiuntivo
+        if len(message_data) > inline:
+            extra = {key: value for key, value in message_data.items()
+                     if key not in self.INLINE_KEYS
+                     and not (key == 'username' and flags & self.FLAG_UID)
+                     and not (key == 'timestamp' and flags & self.FLAG_TIMESTAMP)
+                     and not (key == 'seq' and flags & self.FLAG_SEQ)
+                     and not (key == 'cid' and flags & self.FLAG_CID)}
+            flags |= self.FLAG_EXTRA
+            extra_bytes = json.dumps(extra).encode('utf-8')
+            parts.append(self.LENGTH.pack(len(extra_bytes)))
+            parts.append(extra_bytes)
+        if message is not None:
+            flags |= self.FLAG_MESSAGE
+            parts.append(message.encode('utf-8'))
+
+        return self.HEAD.pack(tag, flags) + b''.join(parts)
+
+    def decode(self, payload):
+        tag = payload[0]
+        if tag == self.TAG_JSON:
+            return json.loads(payload[1:])
+
+        _, flags = self.HEAD.unpack_from(payload)
+        offset = self.HEAD.size
+        message_data = {'type': self.TAG_TYPES[tag]}
+
+        if flags & self.FLAG_UID:
+            (uid,) = self.UID.unpack_from(payload, offset)
+            offset += self.UID.size
+            message_data['username'] = self.intern.names.get(uid, f"utente#{uid}")
+        if flags & self.FLAG_TIMESTAMP:
+            (message_data['timestamp'],) = self.TIMESTAMP.unpack_from(payload, offset)
+            offset += self.TIMESTAMP.size
+        if flags & self.FLAG_SEQ:
+            (message_data['seq'],) = self.SEQ.unpack_from(payload, offset)
+            offset += self.SEQ.size
+        if flags & self.FLAG_CID:
+            (message_data['cid'],) = self.CID.unpack_from(payload, offset)
+            offset += self.CID.size
+        if flags & self.FLAG_EXTRA:
+            (length,) = self.LENGTH.unpack_from(payload, offset)
+            offset += self.LENGTH.size
+            message_data.update(json.loads(payload[offset:offset + length]))
+            offset += length
+        if flags & self.FLAG_MESSAGE:
+            message_data['message'] = payload[offset:].decode('utf-8')
+        return message_data
+
+JSON_CODEC = JsonCodec()
+
+# Restituisce il codec con il nome indicato; i codec binari usano la tabella di interning passata
+def make_codec(name, intern=None):
+    if name == BinaryCodec.name:
+        return BinaryCodec(intern)
+    return JSON_CODEC
+
+# Sceglie (lato server) il primo formato proposto dal client che anche il server supporta
+def negotiate_codec(offered, supported):
+    for name in offered or ():
+        if name in supported:
+            return name
+    return JsonCodec.name
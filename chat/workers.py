@@ -0,0 +1,176 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from constants.constants import WORKER_CHECK_INTERVAL
+from constants.constants import LISTEN_BACKLOG
+
+# Server multi-processo: un solo interprete Python esegue decodifica, log e broadcast su un unico core (GIL),
+# quindi il server può avviare altri processi worker che condividono la stessa porta con SO_REUSEPORT.
+# Il kernel distribuisce le nuove connessioni tra i processi in ascolto; ogni worker gestisce i propri client
+# e scambia gli eventi con gli altri tramite i link della federazione su socket Unix (bus), così ogni client
+# continua a ricevere tutti i messaggi. Il processo principale (worker 0) è quello dell'utente del server.
+# Per i client il gruppo si comporta come un unico server:
+#   - il successore designato è scelto dal processo principale tra i propri client e annunciato agli altri worker,
+#     che lo inseriscono nelle proprie peer list: al failover tutti i client convergono sullo stesso nuovo server
+#   - se il processo principale cade i worker terminano subito, se cade un worker il principale chiude il gruppo:
+#     in entrambi i casi i client vedono la caduta del server e avviano il failover
+#   - lo shutdown del processo principale chiude in modo ordinato anche i worker, che avvisano i propri client
+
+# Socket di ascolto condiviso tra più processi sulla stessa porta
+def reuseport_socket(host, port, backlog):
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    listen_socket.bind((host, port))
+    listen_socket.listen(backlog)
+    return listen_socket
+
+def bus_path(directory, index):
+    return os.path.join(directory, f"worker{index}.sock")
+
+# Corpo di un processo worker: server sulla porta condivisa, collegato al bus degli altri processi
+def run_worker(index, username, host, port, directory, options, stop_event):
+    from chat.chat_node import ChatNode
+    sys.stdout = open(os.devnull, 'w') # la console appartiene al processo principale
+
+    node = ChatNode(f"{username}#{index}", **options)
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # il Ctrl+C del terminale viene gestito dal processo principale
+    node.worker_index = index
+    if not node.start_as_server(listen_socket=reuseport_socket(host, port, max(node.max_connections, LISTEN_BACKLOG))):
+        os._exit(1)
+    node.federation.listen_bus(bus_path(directory, index))
+    for other in range(index):
+        node.federation.link(bus_path(directory, other))
+
+    # il processo principale è caduto: il worker termina subito senza avvisare i client, che avviano il failover.
+    # Il sentinel del processo padre diventa pronto appena questo termina, l'arresto ordinato si controlla periodicamente
+    parent = multiprocessing.parent_process()
+    while not stop_event.is_set():
+        if parent is not None and multiprocessing.connection.wait([parent.sentinel], WORKER_CHECK_INTERVAL):
+            os._exit(1)
+    node.shutdown()
+
+# Gruppo di worker avviato dal processo principale del server
+class WorkerGroup:
+    def __init__(self, node, workers):
+        self.node = node
+        self.workers = workers
+        self.directory = None
+        self.processes = []
+        self.stop_event = None
+        self.stopping = False
+        self.successor = None   # ultimo successore annunciato ai worker
+
+    def start(self):
+        node = self.node
+        self.directory = tempfile.mkdtemp(prefix="chat-bus-")
+        node.federation.listen_bus(bus_path(self.directory, 0))
+
+        # "spawn": il processo principale ha già thread attivi, che un fork non duplicherebbe in modo sicuro
+        context = multiprocessing.get_context("spawn")
+        self.stop_event = context.Event()
+        options = {
+            'max_connections': node.max_connections,
+            'server_engine': node.server_engine,
+            'slow_consumer_policy': node.slow_consumer_policy,
+            'outbound_high_watermark': node.outbound_high_watermark,
+            'outbound_low_watermark': node.outbound_low_watermark,
+            'wire_codecs': node.wire_codecs,
+            'compression': node.compression,
+            'compression_threshold': node.compression_threshold,
+            'heartbeat_interval': node.heartbeat_interval,
+            'hot_standby': node.hot_standby,
+            'metrics': node.metrics is not None,
+            'transport': node.transport.name,
+            'console': "quiet" # l'output dei worker non viene mostrato: i messaggi non vengono nemmeno formattati
+        }
+        if node.tracer is not None: # ogni worker scrive la propria traccia accanto a quella del processo principale
+            root, extension = os.path.splitext(node.tracer.path)
+            options['trace_sample_rate'] = node.tracer.sample_rate
+        for index in range(1, self.workers):
+            if node.tracer is not None:
+                options['trace_file'] = f"{root}.{index}{extension}"
+            process = context.Process(target=run_worker, name=f"Worker-{index}", daemon=True,
+                                      args=(index, node.username, node.server_host, node.server_port,
+                                            self.directory, dict(options), self.stop_event))
+            process.start()
+            self.processes.append(process)
+
+        monitor_thread = threading.Thread(target=self.monitor, name="WorkerMonitor")
+        node.add_thread(monitor_thread)
+        monitor_thread.start()
+
+    def bus_links(self):
+        return sum(1 for link in list(self.node.federation.links.values()) if link.bus)
+
+    # Attende che tutti i worker siano collegati al bus del processo principale
+    def wait_ready(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self.bus_links() < len(self.processes):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # La caduta di un worker equivale alla caduta del server: il gruppo viene chiuso senza avvisare i client.
+    # Un worker appena collegato al bus riceve subito il successore già designato
+    def monitor(self):
+        node = self.node
+        links = 0
+        while not node.shutdown_event.wait(WORKER_CHECK_INTERVAL):
+            if self.stopping:
+                return
+            if self.bus_links() != links:
+                links = self.bus_links()
+                self.announce_successor(force=True)
+            for process in self.processes:
+                if not process.is_alive():
+                    print(f"\n>>> Il processo {process.name} è terminato: chiusura del server")
+                    self.crash()
+                    return
+
+    def crash(self):
+        self.stopping = True
+        for process in self.processes:
+            process.kill()
+        self.node.abort_server()
+        self.cleanup()
+
+    # Comunica ai worker il successore designato dal processo principale (se ha già il socket di riserva)
+    def announce_successor(self, force=False):
+        info = self.node.current_successor()
+        successor = None
+        if info is not None and info.get('standby_port'):
+            successor = {
+                'username': info['username'],
+                'connection_time': info['connection_time'],
+                'standby_host': info['address'][0],
+                'standby_port': info['standby_port']
+            }
+        if successor == self.successor and not force:
+            return
+        self.successor = successor
+        self.node.federation.publish({'type': 'successor', 'designated': successor}, bus_only=True)
+
+    # Shutdown ordinato: ogni worker avvisa i propri client e termina
+    def stop(self):
+        self.stopping = True
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for process in self.processes:
+            process.join(5.0)
+            if process.is_alive():
+                process.kill()
+        self.cleanup()
+
+    def cleanup(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
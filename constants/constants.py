@@ -1,3 +1,65 @@
-BUFFER_SIZE = 1024
+BUFFER_SIZE = 64 * 1024              # dimensione iniziale del buffer di ricezione riutilizzabile
+MAX_FRAME_SIZE = 16 * 1024 * 1024   # dimensione massima accettata per un singolo frame
 DEFAULT_PORT = 12345
-DEFAULT_HOST = "localhost"
\ No newline at end of file
+DEFAULT_HOST = "localhost"
+DEFAULT_SERVER_ENGINE = "threaded"  # motore del server: "threaded" (un thread per client) o "selector" (event loop)
+OUTBOUND_HIGH_WATERMARK = 1024 * 1024   # byte in coda verso un client oltre i quali il client è considerato lento
+OUTBOUND_LOW_WATERMARK = 256 * 1024     # byte in coda sotto i quali un client lento torna a essere considerato sano
+SLOW_CONSUMER_POLICY = "disconnect"     # politica per i client lenti: "disconnect" oppure "drop_oldest" (le connessioni compresse usano sempre "disconnect")
+WIRE_CODECS = ("bin1", "json")          # formati di codifica dei messaggi supportati, in ordine di preferenza
+COMPRESSION = None                      # compressione per connessione offerta/accettata: None (disattiva) oppure "zlib"
+COMPRESSION_THRESHOLD = 128             # i payload più corti di questa soglia (byte) non vengono compressi
+COMPRESSION_LEVEL = 6                   # livello di compressione zlib
+LOG_DIRECTORY = "chat_logs"             # directory dei file di log della chat
+LOG_QUEUE_SIZE = 10000                  # voci di log in attesa di scrittura; oltre vengono scartate e conteggiate
+LOG_BATCH_SIZE = 512                    # numero massimo di voci scritte con una sola write
+LOG_FLUSH_INTERVAL = 0.05               # secondi massimi tra l'arrivo di una voce di log e la sua scrittura su disco
+LOG_FSYNC_POLICY = "interval"           # "never", "interval" (al più ogni LOG_FSYNC_INTERVAL secondi) o "always" (a ogni scrittura)
+LOG_FSYNC_INTERVAL = 1.0                # secondi tra due fsync con la politica "interval"
+LOG_ROTATE_BYTES = 16 * 1024 * 1024     # dimensione oltre la quale il file di log viene chiuso e ne viene aperto uno nuovo (None per disattivare)
+LOG_ROTATE_SECONDS = None               # durata massima di un file di log in secondi (None per disattivare)
+HISTORY_DIRECTORY = "chat_history"      # directory dell'archivio della cronologia (una sottodirectory per utente)
+HISTORY_PAGE_SIZE = 50                  # messaggi restituiti per pagina dalle query sulla cronologia
+HISTORY_TOKEN_INDEX = True              # indicizza anche le parole dei messaggi per le ricerche per contenuto
+HISTORY_TOKEN_BUCKETS = 256             # numero di file in cui è ripartito l'indice delle parole
+REPLAY_BUFFER_SIZE = 1024               # eventi conservati per il replay dopo una riconnessione
+HEARTBEAT_INTERVAL = 1.0                # secondi tra due heartbeat in entrambe le direzioni (None per disattivarli)
+PHI_THRESHOLD = 8.0                     # soglia del rilevatore phi accrual oltre la quale il peer è considerato guasto
+HEARTBEAT_WINDOW = 100                  # intervalli tra heartbeat usati per stimarne la distribuzione
+HEARTBEAT_MIN_STD = 0.1                 # deviazione standard minima (secondi), evita sospetti per piccoli ritardi
+HEARTBEAT_ACCEPTABLE_PAUSE = 1.0        # ritardo (secondi) tollerato oltre l'intervallo medio, es. pause del GC o rete lenta
+HEARTBEAT_MAX_SILENCE = 10.0            # limite assoluto di silenzio (secondi) oltre il quale il peer è considerato guasto
+HOT_STANDBY = True                      # il successore designato tiene pronto il socket del server per un failover immediato
+STANDBY_RECONNECT_TIMEOUT = 5.0         # secondi in cui i client provano a collegarsi al successore prima di avviare un'elezione
+STANDBY_RETRY_INTERVAL = 0.05           # pausa (secondi) tra due tentativi di connessione al successore
+RECONNECT_STAGGER = 0.05                # secondi tra l'avvio di due tentativi di connessione paralleli verso endpoint diversi
+RECONNECT_ATTEMPT_TIMEOUT = 1.0         # secondi dopo cui un singolo tentativo senza risposta viene abbandonato
+RECONNECT_TIMEOUT = 30.0                # secondi complessivi di ricerca del nuovo server dopo un'elezione
+RECONNECT_MAX_BACKOFF = 1.0             # attesa massima (secondi) tra due giri di tentativi
+FEDERATION_SEEN_SIZE = 65536            # buste federate ricordate per scartare i duplicati arrivati da percorsi diversi
+FEDERATION_HIGH_WATERMARK = 16 * 1024 * 1024 # byte in coda verso un altro server oltre i quali il link viene chiuso
+FEDERATION_RETRY_INTERVAL = 1.0         # secondi tra due tentativi di ricollegarsi a un server della federazione
+SERVER_WORKERS = 1                      # processi server che condividono la porta con SO_REUSEPORT (1 per un solo processo)
+WORKER_CHECK_INTERVAL = 0.5             # secondi tra due controlli sullo stato degli altri processi del server
+METRICS_ENABLED = True                  # registro delle metriche del nodo (contatori e istogrammi sui percorsi caldi)
+METRICS_HOST = "127.0.0.1"              # indirizzo dell'endpoint delle metriche: solo locale
+METRICS_PORT = None                     # porta dell'endpoint delle metriche in formato Prometheus (None per non avviarlo)
+METRICS_LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0) # limiti (secondi) degli istogrammi di durata
+TRACE_FILE = None                       # file della traccia Chrome/Perfetto scritto allo shutdown (None per non tracciare)
+TRACE_SAMPLE_RATE = 0.01                # frazione dei messaggi di chat tracciati; elezioni, promozioni e riconnessioni sempre
+TRACE_BUFFER_SIZE = 100000              # eventi di traccia conservati in memoria (i più vecchi vengono scartati)
+CONSOLE_MODE = "async"                  # console della chat: "async" (thread dedicato), "sync" (scrittura diretta) o "quiet" (nessuna)
+CONSOLE_QUEUE_SIZE = 10000              # righe in attesa di essere mostrate; oltre vengono scartate e riassunte
+LISTEN_BACKLOG = 1024                   # coda di ascolto minima del server: assorbe le riconnessioni simultanee dopo un failover
+HANDSHAKE_TIMEOUT = 10.0                # secondi concessi a un client, dall'accept, per completare la richiesta di join
+HANDSHAKE_MAX_PENDING = 256             # handshake contemporanei nel motore a thread; oltre, le connessioni restano in coda
+TRANSPORT_PROFILE = "low-latency"       # profilo di trasporto dei socket: "low-latency", "throughput" o "system" (opzioni del sistema operativo)
+TRANSPORT_COALESCE_WINDOW = 0.002       # secondi per cui il profilo "throughput" attende altri frame prima di scrivere su un socket
+TRANSPORT_SOCKET_BUFFER = 1024 * 1024   # byte dei buffer di invio e ricezione con il profilo "throughput" (su Linux un valore fisso disattiva l'autotuning)
+KEEPALIVE_IDLE = 30                     # secondi di inattività di una connessione prima delle sonde TCP keepalive
+KEEPALIVE_INTERVAL = 10                 # secondi tra due sonde keepalive senza risposta
+KEEPALIVE_COUNT = 3                     # sonde senza risposta dopo cui il sistema operativo chiude la connessione
+FILE_DIRECTORY = "chat_files"           # cartella in cui vengono salvati i file ricevuti (una sottocartella per utente)
+FILE_CHUNK_SIZE = 64 * 1024             # byte di file per frame di dati inviato con /send
+FILE_WINDOW = 16                        # blocchi di un trasferimento in volo non ancora confermati da tutti i destinatari
+FILE_OFFER_TIMEOUT = 10.0               # secondi entro cui il server deve accettare l'offerta di un file prima che l'invio venga annullato
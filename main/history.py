@@ -0,0 +1,52 @@
+import argparse
+import os
+from chat.history import HistoryStore
+from utils.helpers import format_timestamp
+from constants.constants import HISTORY_DIRECTORY, HISTORY_PAGE_SIZE
+
+# Consultazione della cronologia archiviata da un nodo, senza avviare la chat.
+# Esempi (dalla root del progetto):
+#   python -m main.history alice                       ultimi messaggi ricevuti da alice
+#   python -m main.history alice --user bob            ultimi messaggi scritti da bob (e privati ricevuti da bob)
+#   python -m main.history alice --contains partita    ultimi messaggi che contengono "partita"
+#   python -m main.history alice --before 1200         pagina precedente (cursore mostrato in fondo)
+
+# Funzione che legge le opzioni della riga di comando
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Cronologia della chat")
+    parser.add_argument("node", help="nome utente del nodo di cui leggere l'archivio")
+    parser.add_argument("--limit", type=int, default=HISTORY_PAGE_SIZE, help="messaggi per pagina")
+    parser.add_argument("--before", type=int, default=None, help="mostra solo messaggi con sequenza minore")
+    parser.add_argument("--user", default=None, help="solo i messaggi di questo utente (e i privati ricevuti)")
+    parser.add_argument("--contains", default=None, help="solo i messaggi che contengono questa parola")
+    parser.add_argument("--directory", default=HISTORY_DIRECTORY, help="directory degli archivi")
+    return parser.parse_args()
+
+def main() -> None:
+    args = parse_args()
+    store = HistoryStore(os.path.join(args.directory, args.node))
+    try:
+        page = store.query(limit=args.limit, before=args.before, username=args.user, contains=args.contains)
+    except ValueError as e:
+        print(f"Errore: {e}")
+        return
+
+    if not page['messages']:
+        print("Nessun messaggio trovato.")
+    for entry in page['messages']:
+        timestamp = format_timestamp(entry['timestamp'])
+        if entry['type'] == 'system':
+            print(f"#{entry['seq']} [{timestamp}] >>> {entry['message']}")
+        elif entry['type'] == 'server_message':
+            print(f"#{entry['seq']} [{timestamp}] {entry['username']} (SERVER): {entry['message']}")
+        elif entry.get('recipient') is not None:
+            print(f"#{entry['seq']} [{timestamp}] {entry['username']} -> {entry['recipient']} (privato): {entry['message']}")
+        else:
+            print(f"#{entry['seq']} [{timestamp}] {entry['username']}: {entry['message']}")
+
+    if page['next_before'] is not None:
+        print(f"\nPagina precedente: --before {page['next_before']}")
+    store.close()
+
+if __name__ == "__main__":
+    main()
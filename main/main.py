@@ -1,10 +1,48 @@
+import argparse
+import os
 from main.modes.server_mode import server_flow
+from main.modes.server_mode import headless_server_flow
 from main.modes.client_mode import client_flow
 from main.banner import print_banner
-from constants.constants import DEFAULT_PORT, DEFAULT_HOST
+from constants.constants import DEFAULT_PORT, DEFAULT_HOST, DEFAULT_SERVER_ENGINE, COMPRESSION, SERVER_WORKERS, METRICS_PORT
+from constants.constants import TRACE_FILE, TRACE_SAMPLE_RATE, CONSOLE_MODE, TRANSPORT_PROFILE
+from chat.transport import TRANSPORT_PROFILES
+
+# Funzione che legge le opzioni di avvio dalla riga di comando
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Chat peer-to-peer")
+    parser.add_argument("--engine", choices=("threaded", "selector"), default=DEFAULT_SERVER_ENGINE,
+                        help="motore del server: un thread per client oppure un unico event loop")
+    parser.add_argument("--compression", choices=("none", "zlib"), default=COMPRESSION or "none",
+                        help="compressione a flusso delle connessioni, usata solo se anche il peer la abilita")
+    parser.add_argument("--link", action="append", default=[], metavar="HOST:PORTA",
+                        help="da server, collega questa chat a quella di un altro server (ripetibile)")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS,
+                        help="da server, numero di processi che condividono la porta (uno per core)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="porta locale su cui esporre le metriche in formato Prometheus (/metrics)")
+    parser.add_argument("--trace", default=TRACE_FILE, metavar="FILE",
+                        help="registra una traccia Chrome/Perfetto di messaggi, elezioni e riconnessioni in FILE")
+    parser.add_argument("--trace-sample", type=float, default=TRACE_SAMPLE_RATE, metavar="FRAZIONE",
+                        help="frazione dei messaggi di chat tracciati (0-1)")
+    parser.add_argument("--console", choices=("async", "sync", "quiet"), default=CONSOLE_MODE,
+                        help="console della chat: scritta da un thread dedicato, direttamente, oppure nascosta")
+    parser.add_argument("--transport", choices=tuple(TRANSPORT_PROFILES), default=TRANSPORT_PROFILE,
+                        help="profilo dei socket: bassa latenza (TCP_NODELAY), throughput (scritture unite e buffer "
+                             "più grandi) oppure opzioni del sistema operativo")
+    parser.add_argument("--headless", action="store_true",
+                        help="avvia subito un server senza console interattiva (usa --username e --port)")
+    parser.add_argument("--username", default="server", help="con --headless, nome utente del server")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="con --headless, porta di ascolto")
+    return parser.parse_args()
 
 # Funzione principale che gestisce l'avvio dell'applicazione
 def main() -> None:
+    args = parse_args()
+    compression = None if args.compression == "none" else args.compression
+    if args.headless:
+        run_headless(args, compression)
+        return
     print_banner() # Mostra il banner iniziale
 
     username = input("Il tuo nome utente: ").strip()
@@ -24,14 +62,20 @@ def main() -> None:
 
     # Avvia il flusso server o client in base alla scelta   
     if choice == "1":
-        node, ok = server_flow(username, host=DEFAULT_HOST, default_port=DEFAULT_PORT)
+        node, ok = server_flow(username, host=DEFAULT_HOST, default_port=DEFAULT_PORT, server_engine=args.engine, compression=compression,
+                               workers=args.workers, trace_file=args.trace, trace_sample_rate=args.trace_sample,
+                               console=args.console, transport=args.transport)
     else:
-        node, ok = client_flow(username, default_port=DEFAULT_PORT)
+        node, ok = client_flow(username, default_port=DEFAULT_PORT, server_engine=args.engine, compression=compression,
+                               trace_file=args.trace, trace_sample_rate=args.trace_sample, console=args.console,
+                               transport=args.transport)
 
     if not ok:
         print("Impossibile avviare / connettersi alla chat.")
         return
 
+    start_services(node, args)
+
     # mostra comandi a seconda del tipo di nodo
     print("\nComandi disponibili:")
     if node.is_server:
@@ -39,6 +83,13 @@ def main() -> None:
         print("  quit    - Chiudi server")
     else:
         print("  quit    - Disconnetti")
+    print("  stats   - Mostra le metriche del nodo")
+    if node.tracer is not None:
+        print("  trace   - Salva la traccia raccolta finora")
+    print("  /msg <utente> <testo> - Messaggio privato a un solo utente")
+    print("  /join <stanza> - Entra in una stanza e scrivi solo ai suoi partecipanti")
+    print("  /leave [stanza] - Esci da una stanza (per default quella corrente)")
+    print("  /send <percorso> - Invia un file ai partecipanti della stanza corrente (o a tutti)")
     print("  <testo> - Invia messaggio a tutti")
 
     # ciclo di input di inserimento messaggi
@@ -51,6 +102,23 @@ def main() -> None:
                 break
             if text.lower() == "list" and node.is_server:
                 node.list_connected_users()
+            elif text.lower() == "stats":
+                node.show_stats()
+            elif text.lower() == "trace" and node.tracer is not None:
+                node.export_trace()
+            elif text.startswith("/join "):
+                node.join_room(text.split(maxsplit=1)[1])
+            elif text == "/leave" or text.startswith("/leave "):
+                parts = text.split(maxsplit=1)
+                node.leave_room(parts[1] if len(parts) > 1 else None)
+            elif text.startswith("/send "):
+                node.send_file(os.path.expanduser(text.split(maxsplit=1)[1].strip('"')))
+            elif text.startswith("/msg "):
+                parts = text.split(maxsplit=2)
+                if len(parts) < 3:
+                    print("Uso: /msg <utente> <testo>")
+                else:
+                    node.send_direct_message(parts[1], parts[2])
             else:
                 node.send_message(text)
     except KeyboardInterrupt:
@@ -58,6 +126,35 @@ def main() -> None:
     finally:
         node.shutdown()
 
+# Federazione con altri server indicati da riga di comando ed endpoint delle metriche
+def start_services(node, args) -> None:
+    if node.is_server:
+        for link in args.link:
+            host, _, port = link.rpartition(":")
+            node.federation.link(host or DEFAULT_HOST, int(port))
+
+    if args.metrics_port is not None:
+        node.serve_metrics(args.metrics_port)
+
+# Server senza console: resta attivo finché non riceve Ctrl+C o SIGTERM
+def run_headless(args, compression) -> None:
+    node, ok = headless_server_flow(args.username, host=DEFAULT_HOST, port=args.port, server_engine=args.engine,
+                                    compression=compression, workers=args.workers, trace_file=args.trace,
+                                    trace_sample_rate=args.trace_sample, transport=args.transport)
+    if not ok:
+        print(f"Impossibile avviare il server sulla porta {args.port}.")
+        return
+    start_services(node, args)
+    print(f"Server {args.username} in ascolto sulla porta {node.server_port} senza console (Ctrl+C per chiudere)")
+    try:
+        while node.running:
+            node.shutdown_event.wait(1.0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if node.running:
+            node.shutdown()
+
 # Avvia l'applicazione
 if __name__ == "__main__":
     main()
\ No newline at end of file
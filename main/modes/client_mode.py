@@ -1,10 +1,17 @@
 from chat.chat_node import ChatNode
-from constants.constants import DEFAULT_PORT
+from constants.constants import DEFAULT_PORT, DEFAULT_SERVER_ENGINE, COMPRESSION, TRACE_FILE, TRACE_SAMPLE_RATE, CONSOLE_MODE
+from constants.constants import TRANSPORT_PROFILE
 
 # Funzione che gestisce il flusso per connettersi come client a un server esistente.
 # Richiede all’utente indirizzo e porta, tenta la connessione, gestisce eventuali errori e permette il retry.
-def client_flow(username: str, default_port: int = DEFAULT_PORT):
-    node = ChatNode(username) # Istanzia il nodo della chat con il nome utente fornit
+# Il motore del server viene usato se il nodo viene promosso a server dopo un'elezione.
+def client_flow(username: str, default_port: int = DEFAULT_PORT, server_engine: str = DEFAULT_SERVER_ENGINE,
+                compression: str = COMPRESSION, trace_file: str = TRACE_FILE, trace_sample_rate: float = TRACE_SAMPLE_RATE,
+                console: str = CONSOLE_MODE, transport: str = TRANSPORT_PROFILE):
+    # opzioni del nodo, riusate anche se si riprova con un altro nome utente
+    options = dict(server_engine=server_engine, compression=compression, trace_file=trace_file,
+                   trace_sample_rate=trace_sample_rate, console=console, transport=transport)
+    node = ChatNode(username, **options) # Istanzia il nodo della chat con il nome utente fornito
 
     while True:
         # ottenimento dell'indirizzo del server e della porta
@@ -33,7 +40,7 @@ def client_flow(username: str, default_port: int = DEFAULT_PORT):
             while not new_user:
                 new_user = input("Nome utente (obbligatorio): ").strip()
             node.shutdown()
-            node = ChatNode(new_user)
+            node = ChatNode(new_user, **options)
 
         # caso in cui la connessione fallisca
         elif result == "connection_failed":
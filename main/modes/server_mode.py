@@ -1,10 +1,15 @@
 from chat.chat_node import ChatNode
-from constants.constants import DEFAULT_HOST, DEFAULT_PORT
+from constants.constants import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_SERVER_ENGINE, COMPRESSION, SERVER_WORKERS
+from constants.constants import TRACE_FILE, TRACE_SAMPLE_RATE, CONSOLE_MODE, TRANSPORT_PROFILE
 
 # Funzione che gestisce il flusso per avviare un server di chat.
 # Chiede la porta, avvia il server e restituisce (node, success).
-def server_flow(username: str, host: str = DEFAULT_HOST, default_port: int = DEFAULT_PORT):
-    node = ChatNode(username)
+def server_flow(username: str, host: str = DEFAULT_HOST, default_port: int = DEFAULT_PORT,
+                server_engine: str = DEFAULT_SERVER_ENGINE, compression: str = COMPRESSION,
+                workers: int = SERVER_WORKERS, trace_file: str = TRACE_FILE, trace_sample_rate: float = TRACE_SAMPLE_RATE,
+                console: str = CONSOLE_MODE, transport: str = TRANSPORT_PROFILE):
+    node = ChatNode(username, server_engine=server_engine, compression=compression, workers=workers,
+                    trace_file=trace_file, trace_sample_rate=trace_sample_rate, console=console, transport=transport)
 
     while True:
         try:
@@ -21,3 +26,16 @@ def server_flow(username: str, host: str = DEFAULT_HOST, default_port: int = DEF
         if retry != "s":
             node.shutdown()
             return node, False
+
+# Server senza console interattiva (es. come servizio): nessuna domanda all'utente e nessuna riga per i messaggi,
+# che vengono solo registrati nel log. Restituisce (node, success) come server_flow
+def headless_server_flow(username: str, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                         server_engine: str = DEFAULT_SERVER_ENGINE, compression: str = COMPRESSION,
+                         workers: int = SERVER_WORKERS, trace_file: str = TRACE_FILE,
+                         trace_sample_rate: float = TRACE_SAMPLE_RATE, transport: str = TRANSPORT_PROFILE):
+    node = ChatNode(username, server_engine=server_engine, compression=compression, workers=workers,
+                    trace_file=trace_file, trace_sample_rate=trace_sample_rate, console="quiet", transport=transport)
+    if node.start_as_server(host, port):
+        return node, True
+    node.shutdown()
+    return node, False
@@ -1,4 +1,20 @@
 from datetime import datetime
 
 def get_timestamp():
-    return datetime.now().strftime('%H:%M:%S')
\ No newline at end of file
+    return datetime.now().strftime('%H:%M:%S')
+
+# Converte un timestamp numerico (epoch in secondi) nel formato orario mostrato a video e nei log.
+# I timestamp già in formato testo (es. ricevuti da peer che usano JSON) vengono restituiti invariati.
+def format_timestamp(timestamp):
+    if isinstance(timestamp, str):
+        return timestamp
+    return datetime.fromtimestamp(timestamp).strftime('%H:%M:%S')
+
+# Dimensione in byte in forma leggibile (es. "1.5 MB"), usata nei messaggi dei trasferimenti di file
+def format_size(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
@@ -0,0 +1,21 @@
+import json
+import sys
+
+# Unisce le tracce scritte da più nodi (opzione --trace) in un unico file da aprire con Perfetto o chrome://tracing:
+# ogni nodo compare come un processo distinto e gli span di uno stesso messaggio condividono l'argomento 'trace'.
+# Eseguire dalla root del progetto con: python -m utils.merge_traces uscita.json traccia1.json traccia2.json ...
+
+def merge_traces(output, paths):
+    events = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            events.extend(json.load(f)['traceEvents'])
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': "ms"}, f)
+    return len(events)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python -m utils.merge_traces uscita.json traccia1.json [traccia2.json ...]")
+        sys.exit(1)
+    print(f"{merge_traces(sys.argv[1], sys.argv[2:])} eventi scritti in {sys.argv[1]}")